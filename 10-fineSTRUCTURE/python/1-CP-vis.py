@@ -6,6 +6,8 @@ import ast
 import os
 import sys
 import math
+import time
+import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Force non-interactive backend to avoid Qt dependency
@@ -75,6 +77,54 @@ def read_colors_map(path_or_str: str):
         pass
     raise FileNotFoundError("Colors CSV file not found, and the argument could not be parsed as a dictionary literal.")
 
+RECIPIENT_COLUMN = "Recipient"
+ATTRIBUTE_COLUMN = "Attribute"
+ATTRIBUTE_COLUMN_LEGACY = "\u5c5e\u6027"
+
+
+def read_chunkcounts(path, sep, value_vars, valid_recipients):
+    """
+    Read only the Recipient/Attribute columns and the requested donor columns.
+
+    Donor columns are parsed as numbers by the C parser; non-numeric entries become NaN,
+    as with pd.to_numeric(errors="coerce"). Rows whose Attribute is
+    not in valid_recipients are dropped. Returns (attributes, donors, values) with values an
+    (n_rows x n_donors) float64 matrix whose column j belongs to donors[j].
+    """
+    header = pd.read_csv(path, sep=sep, nrows=0).columns.tolist()
+    attribute_col = ATTRIBUTE_COLUMN
+    if ATTRIBUTE_COLUMN not in header and ATTRIBUTE_COLUMN_LEGACY in header:
+        attribute_col = ATTRIBUTE_COLUMN_LEGACY
+
+    # Validate required columns
+    required_cols = {RECIPIENT_COLUMN, ATTRIBUTE_COLUMN}
+    missing = [c for c in (RECIPIENT_COLUMN, attribute_col) if c not in header]
+    if missing:
+        raise SystemExit(f"The input table is missing required columns: {missing}. Required columns: {sorted(required_cols)}")
+
+    # Validate presence of value_vars
+    missing_vals = [v for v in value_vars if v not in header]
+    if missing_vals:
+        print(f"Warning: the following value_vars columns are missing and will be ignored: {missing_vals}", file=sys.stderr)
+    donors = list(dict.fromkeys(v for v in value_vars if v in header))
+    if not donors:
+        raise SystemExit("No valid value_vars columns were found in the data.")
+
+    df = pd.read_csv(
+        path, sep=sep, usecols=[RECIPIENT_COLUMN, attribute_col] + donors,
+        dtype={RECIPIENT_COLUMN: str, attribute_col: str}, low_memory=False
+    )
+    # Columns with non-numeric entries come back as text; coerce just those entries to NaN
+    text_donors = [d for d in donors if not pd.api.types.is_numeric_dtype(df[d])]
+    if text_donors:
+        df[text_donors] = df[text_donors].apply(pd.to_numeric, errors="coerce")
+
+    keep = df[attribute_col].isin(valid_recipients).to_numpy()
+    attributes = df[attribute_col].to_numpy()[keep]
+    values = df[donors].to_numpy(dtype=np.float64)[keep]
+    return attributes, donors, values
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Make donor-wise horizontal boxplots with global normalization."
@@ -91,12 +141,6 @@ def main():
     parser.add_argument("--out", default="Chromopainter_2.pdf", help="Output PDF path")
     args = parser.parse_args()
 
-    RECIPIENT_COLUMN = "Recipient"
-    ATTRIBUTE_COLUMN = "Attribute"
-    ATTRIBUTE_COLUMN_LEGACY = "\u5c5e\u6027"
-    DONOR_COLUMN = "Donor"
-    VALUE_COLUMN = "Contribution"
-
     # Parse arguments
     value_vars = parse_list(args.value_vars)
     valid_recipients = parse_list(args.valid_recipients)
@@ -104,65 +148,42 @@ def main():
         raise SystemExit("value_vars is empty. Provide at least one donor column name.")
     if not valid_recipients:
         raise SystemExit("valid_recipients is empty. Provide at least one recipient name.")
+    # A literal '\t' from the command line means a tab; a one-character separator keeps pandas on the C parser
+    sep = args.sep.encode().decode('unicode_escape')
 
     colors = read_colors_map(args.colors_csv)
 
-    # Load data
-    df = pd.read_csv(args.input, sep=args.sep, dtype=str)
-    if ATTRIBUTE_COLUMN not in df.columns and ATTRIBUTE_COLUMN_LEGACY in df.columns:
-        df = df.rename(columns={ATTRIBUTE_COLUMN_LEGACY: ATTRIBUTE_COLUMN})
-
-    # Convert numeric columns: only convert value_vars to numeric and keep non-numeric as NaN
-    for c in value_vars:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    # Validate required columns
-    required_cols = {RECIPIENT_COLUMN, ATTRIBUTE_COLUMN}
-    missing = [c for c in required_cols if c not in df.columns]
-    if missing:
-        raise SystemExit(f"The input table is missing required columns: {missing}. Required columns: {sorted(required_cols)}")
-
-    # Validate presence of value_vars
-    missing_vals = [v for v in value_vars if v not in df.columns]
-    if missing_vals:
-        print(f"Warning: the following value_vars columns are missing and will be ignored: {missing_vals}", file=sys.stderr)
-        value_vars = [v for v in value_vars if v in df.columns]
-        if not value_vars:
-            raise SystemExit("No valid value_vars columns were found in the data.")
-
-    # Reshape into long format
-    df_long = df.melt(
-        id_vars=[RECIPIENT_COLUMN, ATTRIBUTE_COLUMN],
-        value_vars=value_vars,
-        var_name=DONOR_COLUMN,
-        value_name=VALUE_COLUMN
-    )
-
-    # Global normalization (min/max computed on valid recipient subset only)
-    global_data = df_long[df_long[ATTRIBUTE_COLUMN].isin(valid_recipients)].copy()
+    # Load data: only the needed columns, numeric donor columns, valid recipients only
+    t0 = time.perf_counter()
+    attributes, donors, values = read_chunkcounts(args.input, sep, value_vars, valid_recipients)
+    t_read = time.perf_counter() - t0
 
     # Abort if subset is empty because normalization would be invalid
-    if global_data.empty:
+    if len(attributes) == 0:
         raise SystemExit("The subset of valid recipients is empty. Ensure valid_recipients matches values in column 'Attribute'.")
 
-    global_min = pd.to_numeric(global_data[VALUE_COLUMN], errors="coerce").min()
-    global_max = pd.to_numeric(global_data[VALUE_COLUMN], errors="coerce").max()
-
-    # Handle the degenerate case where max == min to avoid division by zero
-    denom = (global_max - global_min)
-    if pd.isna(global_min) or pd.isna(global_max):
+    # Global normalization (min/max over the valid recipient subset) in one array operation
+    t1 = time.perf_counter()
+    if np.isnan(values).all():
         raise SystemExit("All contribution values are NaN; normalization is impossible. Check the input data.")
-
+    global_min = np.nanmin(values)
+    global_max = np.nanmax(values)
+    denom = global_max - global_min
     if denom == 0:
         # If all values are equal, assign a constant normalized value
-        df_long["global_normalized"] = 0.5
+        normalized = np.where(np.isnan(values), np.nan, 0.5)
     else:
-        df_long["global_normalized"] = (pd.to_numeric(df_long[VALUE_COLUMN], errors="coerce") - global_min) / denom
+        normalized = (values - global_min) / denom
+
+    # Group once: rows per recipient group (order of first appearance); each donor is a matrix column
+    codes, categories = pd.factorize(attributes)
+    group_rows = [np.flatnonzero(codes == k) for k in range(len(categories))]
+    categories = [str(c) for c in categories]
+    donor_column = {d: j for j, d in enumerate(donors)}
+    t_prep = time.perf_counter() - t1
 
     # Donors to plot: must exist in both the data and the color map
-    donors_in_data = set(df_long[DONOR_COLUMN].dropna().unique().tolist())
-    donor_list = [d for d in colors.keys() if d in donors_in_data]
+    donor_list = [d for d in colors.keys() if d in donor_column]
     if not donor_list:
         raise SystemExit("No donors can be plotted. Verify that donor names in the color map match the data columns.")
 
@@ -185,26 +206,25 @@ def main():
         squeeze=False
     )
 
-    # Plotting loop
+    # Plotting loop: each subplot is a column slice of the normalized matrix
+    t2 = time.perf_counter()
     for i, donor in enumerate(donor_list):
         row = i // n_cols
         col = i % n_cols
         ax = axes[row][col]
 
-        donor_data = df_long[df_long[DONOR_COLUMN] == donor].copy()
-        donor_data = donor_data[donor_data[ATTRIBUTE_COLUMN].isin(valid_recipients)]
-
-        if donor_data.empty:
+        x = normalized[:, donor_column[donor]]
+        present = ~np.isnan(x)
+        if not present.any():
             ax.set_visible(False)
             continue
 
         # Fallback to matplotlib boxplot if seaborn is unavailable
         if _HAS_SEABORN:
-            import seaborn as sns
             sns.boxplot(
-                data=donor_data,
-                x="global_normalized",
-                y=ATTRIBUTE_COLUMN,
+                x=x[present],
+                y=attributes[present],
+                order=[c for c, rows in zip(categories, group_rows) if present[rows].any()],
                 color=colors.get(donor, None),
                 width=0.5,
                 showfliers=True,
@@ -219,13 +239,11 @@ def main():
                 ax=ax
             )
         else:
-            # Matplotlib fallback: draw per attribute
-            ycats = list(donor_data[ATTRIBUTE_COLUMN].dropna().unique())
-            y_index = {v: i+1 for i, v in enumerate(ycats)}
-            positions = [y_index[v] for v in donor_data[ATTRIBUTE_COLUMN]]
-            grouped = donor_data.groupby(ATTRIBUTE_COLUMN)["global_normalized"].apply(list)
+            # Matplotlib fallback: one box per recipient group
+            groups = [(c, x[rows][present[rows]]) for c, rows in zip(categories, group_rows)]
+            groups = [(c, g) for c, g in groups if g.size]
             bp = ax.boxplot(
-                grouped.values,
+                [g for _, g in groups],
                 vert=False,
                 patch_artist=True,
                 showfliers=True
@@ -240,13 +258,14 @@ def main():
                 fl.set_alpha(0.5)
                 fl.set_markerfacecolor(colors.get(donor, "#888888"))
                 fl.set_markeredgecolor(colors.get(donor, "#888888"))
-            ax.set_yticks(range(1, len(ycats)+1))
-            ax.set_yticklabels(ycats)
+            ax.set_yticks(range(1, len(groups) + 1))
+            ax.set_yticklabels([c for c, _ in groups])
 
         ax.set_title(f"Donor: {donor}")
         ax.grid(False)
         ax.set_xlabel("Global normalized contribution")
         ax.set_ylabel("Recipient")
+    t_plot = time.perf_counter() - t2
 
     # Remove unused axes
     total_subplots = n_rows * n_cols
@@ -262,11 +281,15 @@ def main():
         except Exception:
             pass
 
+    t3 = time.perf_counter()
     plt.tight_layout()
     out_path = args.out
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
     plt.savefig(out_path)
+    t_save = time.perf_counter() - t3
     print(f"Saved figure to: {out_path}")
+    print(f"Timing: read {t_read:.2f} s ({values.shape[0]} rows x {values.shape[1]} donors), "
+          f"normalize/group {t_prep:.2f} s, plot {t_plot:.2f} s, save {t_save:.2f} s")
     # Use plt.show() manually if desired
     # plt.show()
 
@@ -2,6 +2,11 @@
 set -e  # Exit immediately if any command fails
 set -o pipefail  # Pipeline fails if any command within fails
 
+# Resumable alternative (recipient batches on a worker pool, manifest of finished batches/stages):
+#   python script/1_fineSTRUCTURE_parallel.py --output_dir OUTPUT/WGS --project WGS_HP \
+#       --idfile WGS_HP.ids --phasefiles WGS_HP.phase --recombfiles WGS_HP.recombfile \
+#       --inds_per_proc 20 --processes 16
+
 # Determine directories relative to this script
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 BASE_DIR="$(cd "${SCRIPT_DIR}/.." && pwd)"
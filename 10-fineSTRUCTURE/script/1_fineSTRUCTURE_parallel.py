@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Resumable, parallel driver for the fs (ChromoPainter + fineSTRUCTURE) pipeline of 1_fineSTRUCTURE.sh.
+#
+# fs is run in HPC mode: `fs <project>.cp -hpc 1 ... -go` writes one command per recipient batch
+# (-indsperproc individuals each) to <project>/commandfiles/commandfile<stage>.txt, and every later
+# `fs <project>.cp -go` combines the outputs of that stage (chromocombine after painting) and
+# writes the next command file. This script runs the commands of each stage on a worker pool and
+# records every finished command and combined stage in <project>.manifest.json. After a crash or
+# a failed batch, run it again with the same arguments; only the unfinished batches are repeated,
+# so the output directory no longer has to start empty.
+#
+# Example:
+# python 1_fineSTRUCTURE_parallel.py \
+#     --output_dir ../OUTPUT/WGS \
+#     --project WGS_HP \
+#     --idfile WGS_HP.ids \
+#     --phasefiles WGS_HP.phase \
+#     --recombfiles WGS_HP.recombfile \
+#     --inds_per_proc 20 \
+#     --processes 16
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+STAGES = (1, 2, 3, 4)
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {"setup": False, "stages": {}}
+
+
+def save_manifest(path, manifest):
+    with open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def command_key(command):
+    """
+    Commands are identified by their text, so a command file rewritten by fs still matches.
+    """
+    return hashlib.sha1(command.encode()).hexdigest()
+
+
+def run_command(command, cwd, log_path):
+    """
+    Run one command-file line through the shell; stdout and stderr go to log_path.
+    """
+    start = time.time()
+    with open(log_path, 'w') as log:
+        proc = subprocess.run(command, shell=True, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.time() - start
+
+
+def run_fs(fs, args, cwd):
+    """
+    Run fs in the foreground; exits on failure.
+    """
+    cmd = [fs] + args
+    print("Running: " + " ".join(cmd))
+    if subprocess.run(cmd, cwd=cwd).returncode != 0:
+        print(f"Error: {' '.join(cmd)} failed")
+        sys.exit(1)
+
+
+def run_stage(stage, commands, state, manifest, manifest_path, output_dir, log_dir, processes):
+    """
+    Run the commands of one stage that are not yet marked done, saving the manifest after each one.
+
+    Returns the number of failed commands.
+    """
+    done = set(state["done"])
+    todo = [(i, c) for i, c in enumerate(commands) if command_key(c) not in done]
+    print(f"=== Stage {stage}: {len(commands) - len(todo)}/{len(commands)} commands already done, "
+          f"{len(todo)} to run on {processes} workers ===")
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, processes)) as pool:
+        futures = {
+            pool.submit(run_command, c, output_dir, os.path.join(log_dir, f"stage{stage}_{i + 1}.log")): (i, c)
+            for i, c in todo
+        }
+        for k, future in enumerate(as_completed(futures), start=1):
+            i, c = futures[future]
+            returncode, seconds = future.result()
+            if returncode != 0:
+                failed += 1
+                print(f"Error: stage {stage} command {i + 1} failed (exit {returncode}); "
+                      f"see {log_dir}/stage{stage}_{i + 1}.log")
+                continue
+            state["done"].append(command_key(c))
+            save_manifest(manifest_path, manifest)
+            print(f"Stage {stage}: command {i + 1} finished in {seconds:.0f} s ({k}/{len(todo)})")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the fs ChromoPainter/fineSTRUCTURE stages in parallel recipient batches with "
+                    "a resumable manifest"
+    )
+    parser.add_argument("--output_dir", required=True, help="Working directory holding the fs inputs")
+    parser.add_argument("--project", default="WGS_HP", help="fs project name (<project>.cp; default: WGS_HP)")
+    parser.add_argument("--idfile", required=True, help="ChromoPainter .ids file")
+    parser.add_argument("--phasefiles", required=True, help="ChromoPainter .phase file(s), comma-separated")
+    parser.add_argument("--recombfiles", required=True, help="Recombination file(s), comma-separated")
+    parser.add_argument("--inds_per_proc", type=int, default=10,
+                        help="Recipients painted per command (fs -indsperproc; default: 10)")
+    parser.add_argument("--s3iters", type=int, default=200000, help="fs -s3iters (default: 200000)")
+    parser.add_argument("--s4iters", type=int, default=50000, help="fs -s4iters (default: 50000)")
+    parser.add_argument("--s1minsnps", type=int, default=1000, help="fs -s1minsnps (default: 1000)")
+    parser.add_argument("--s1indfrac", type=float, default=0.1, help="fs -s1indfrac (default: 0.1)")
+    parser.add_argument("--fs_args", default="", help="Extra fs setup arguments, e.g. '-s2chunksperregion 50'")
+    parser.add_argument("--processes", type=int, default=16, help="Commands run concurrently (default: 16)")
+    parser.add_argument("--fs", default="fs", help="fs executable (default: fs)")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_dir)
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} does not exist")
+        sys.exit(1)
+    cp_file = args.project + ".cp"
+    manifest_path = os.path.join(output_dir, args.project + ".manifest.json")
+    log_dir = os.path.join(output_dir, args.project + "_logs")
+    os.makedirs(log_dir, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+
+    # Setup (writes the stage 1 command file); an existing project file means it already ran
+    if not manifest["setup"]:
+        if os.path.exists(os.path.join(output_dir, cp_file)):
+            print(f"{cp_file} already exists; skipping fs setup")
+        else:
+            run_fs(args.fs, [
+                cp_file, "-hpc", "1",
+                "-idfile", args.idfile,
+                "-phasefiles", *args.phasefiles.split(","),
+                "-recombfiles", *args.recombfiles.split(","),
+                "-indsperproc", str(args.inds_per_proc),
+                "-s3iters", str(args.s3iters),
+                "-s4iters", str(args.s4iters),
+                "-s1minsnps", str(args.s1minsnps),
+                "-s1indfrac", str(args.s1indfrac),
+                *args.fs_args.split(),
+                "-go",
+            ], output_dir)
+        manifest["setup"] = True
+        save_manifest(manifest_path, manifest)
+
+    for stage in STAGES:
+        state = manifest["stages"].setdefault(str(stage), {"done": [], "combined": False})
+        if state["combined"]:
+            print(f"Stage {stage} already combined; skipping")
+            continue
+        cmdfile = os.path.join(output_dir, args.project, "commandfiles", f"commandfile{stage}.txt")
+        if not os.path.exists(cmdfile):
+            print(f"Warning: {cmdfile} does not exist. Skipping Stage {stage}.")
+            continue
+        with open(cmdfile, 'r') as f:
+            commands = [line.strip() for line in f if line.strip()]
+
+        start = time.time()
+        failed = run_stage(stage, commands, state, manifest, manifest_path, output_dir, log_dir, args.processes)
+        if failed:
+            print(f"{failed} commands of stage {stage} failed; fix the cause and rerun to resume.")
+            sys.exit(1)
+
+        # Combine the batch outputs of this stage and write the next command file
+        run_fs(args.fs, [cp_file, "-go"], output_dir)
+        state["combined"] = True
+        save_manifest(manifest_path, manifest)
+        print(f"Stage {stage} completed in {(time.time() - start) / 60:.1f} min")
+
+    print(f"fineSTRUCTURE analysis completed; manifest: {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
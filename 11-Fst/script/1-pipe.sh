@@ -13,6 +13,10 @@ OUTPUT_DIR="${SCRIPT_DIR}/output"
 FST_TXT="${OUTPUT_DIR}/FST.txt"
 PROCESSED_DIR="${OUTPUT_DIR}"
 FST_PNG="${OUTPUT_DIR}/FST_percentile_distribution.png"
+WINDOW_CSV="${OUTPUT_DIR}/Windowed_FST.csv"
+WINDOW_SIZE=10000
+WINDOW_STEP=5000
+PERMUTATIONS=0  # >0 adds permutation p-values (Permutation_FST.csv) and a family-wise threshold
 
 mkdir -p "$WORK_DIR" "$OUTPUT_DIR"
 
@@ -28,4 +32,15 @@ python3 "${SCRIPT_DIR}/2-1-trans.py" \
 
 python3 "${SCRIPT_DIR}/2-1-threshold.py" \
   --input_csv "${PROCESSED_DIR}/Processed_FST.csv" \
-  --output_png "$FST_PNG"
+  --output_png "$FST_PNG" \
+  --permutations "$PERMUTATIONS" \
+  --alignment "$ALIGNMENT_FILE" \
+  --meta_csv "$META_CSV"
+
+# Sliding-window Fst / pi / Tajima's D (plot with 2-2-FST-vis.py --input_csv "$WINDOW_CSV")
+python3 "${SCRIPT_DIR}/2-3-window.py" \
+  --alignment "$ALIGNMENT_FILE" \
+  --meta_csv "$META_CSV" \
+  --window "$WINDOW_SIZE" \
+  --step "$WINDOW_STEP" \
+  --output_csv "$WINDOW_CSV"
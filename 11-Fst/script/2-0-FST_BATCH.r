@@ -15,6 +15,11 @@ dest_alignment_file  <- args[3]
 popgen_working_dir   <- args[4]
 popgen_output_path   <- args[5]
 
+# Shared FASTA concatenation utility (12-GWAS/script/0_cancat.py), located relative to this script
+script_arg <- grep("^--file=", commandArgs(trailingOnly = FALSE), value = TRUE)
+script_dir <- if (length(script_arg) > 0) dirname(normalizePath(sub("^--file=", "", script_arg[1]))) else getwd()
+cancat_script <- file.path(script_dir, "..", "..", "12-GWAS", "script", "0_cancat.py")
+
 # Merge FASTA files listed in the metadata CSV
 mergeFastaFiles <- function(csv_file, src_dir, dest_file, id_column = "strain") {
   # Load the CSV file; it must contain a strain ID column (default: "strain")
@@ -38,12 +43,23 @@ mergeFastaFiles <- function(csv_file, src_dir, dest_file, id_column = "strain")
     file.remove(dest_file)
   }
   
-  # Concatenate files via shell to keep the process simple
-  cmd <- paste("cat", paste(shQuote(existing_files), collapse = " "), ">", shQuote(dest_file))
-  cat("Running command:\n", cmd, "\n")
-  
-  # Execute merge command
-  system(cmd)
+  # Prefer the shared Python concatenation utility (block copies, alignment-length validation);
+  # fall back to cat when it is not available. No .fai index here: PopGenome reads every file in the directory
+  if (file.exists(cancat_script) && nzchar(Sys.which("python3"))) {
+    cmd_args <- c(shQuote(cancat_script), "--meta_csv", shQuote(csv_file), "--id_column", id_column,
+                  shQuote(src_dir), shQuote(dest_file))
+    cat("Running command:\n", "python3", cmd_args, "\n")
+    status <- system2("python3", cmd_args)
+    if (status != 0) {
+      stop("FASTA concatenation failed.")
+    }
+  } else {
+    cmd <- paste("cat", paste(shQuote(existing_files), collapse = " "), ">", shQuote(dest_file))
+    cat("Running command:\n", cmd, "\n")
+
+    # Execute merge command
+    system(cmd)
+  }
 }
 
 # Run PopGenome and compute FST
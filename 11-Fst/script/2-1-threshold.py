@@ -2,14 +2,154 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import importlib.util
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from aquarel import load_theme
 
+
+def load_window_module():
+    """
+    Import 2-3-window.py (alignment streaming helpers) from this directory.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "2-3-window.py")
+    spec = importlib.util.spec_from_file_location("fst_window", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def hudson_fst(c1, c2):
+    """
+    Per-site Hudson Fst from base counts of shape (..., 4, n_sites).
+    Sites with fewer than two calls in either population are NaN.
+    """
+    n1 = c1.sum(axis=-2)
+    n2 = c2.sum(axis=-2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p1 = c1 / n1[..., None, :]
+        p2 = c2 / n2[..., None, :]
+        within = 0.5 * (n1 / (n1 - 1) * (1.0 - (p1 ** 2).sum(axis=-2))
+                        + n2 / (n2 - 1) * (1.0 - (p2 ** 2).sum(axis=-2)))
+        between = 1.0 - (p1 * p2).sum(axis=-2)
+        fst = (between - within) / between
+    return np.where((n1 >= 2) & (n2 >= 2) & (between > 0), fst, np.nan)
+
+
+def extract_segregating(window, alignment, populations, out_path):
+    """
+    Two streaming passes over the alignment: find segregating columns, then append
+    each sample's base codes at those columns to a raw uint8 file for memory mapping.
+
+    Returns (site indices, population label per stored sample).
+    """
+    counts = window.count_alleles(alignment, populations)
+    seg_sites = np.flatnonzero((counts.sum(axis=0) > 0).sum(axis=0) > 1)
+    del counts
+
+    labels = []
+    with open(out_path, "wb") as out_fh:
+        for name, seq in window.iter_fasta(alignment):
+            if name not in populations:
+                continue
+            out_fh.write(window.BASE_CODES[np.frombuffer(seq, dtype=np.uint8)[seg_sites]].tobytes())
+            labels.append(populations[name])
+    return seg_sites, np.asarray(labels, dtype=np.int8)
+
+
+def permutation_worker(task):
+    """
+    Run one batch of label permutations over all sites.
+
+    Sites are processed in chunks; pop-wise base counts for every permutation in the
+    batch come from one (n_perm x n_samples) @ (n_samples x chunk) product per base.
+    Returns (per-site exceedance counts, per-permutation genome-wide max Fst).
+    """
+    codes_path, shape, labels, observed, seed, n_perm, chunk_size = task
+    codes = np.memmap(codes_path, dtype=np.uint8, mode="r", shape=shape)
+    rng = np.random.default_rng(seed)
+    perm = np.stack([rng.permutation(labels) for _ in range(n_perm)])
+    z1 = (perm == 0).astype(np.float32)
+    z2 = (perm == 1).astype(np.float32)
+
+    n_sites = shape[1]
+    exceed = np.zeros(n_sites, dtype=np.int64)
+    max_fst = np.full(n_perm, -np.inf)
+    for lo in range(0, n_sites, chunk_size):
+        block = np.asarray(codes[:, lo:lo + chunk_size])
+        c1 = np.empty((n_perm, 4, block.shape[1]), dtype=np.float32)
+        c2 = np.empty_like(c1)
+        for base in range(4):
+            onehot = (block == base).astype(np.float32)
+            c1[:, base] = z1 @ onehot
+            c2[:, base] = z2 @ onehot
+        fst = hudson_fst(c1.astype(np.float64), c2.astype(np.float64))
+        exceed[lo:lo + chunk_size] += (fst >= observed[lo:lo + chunk_size]).sum(axis=0)
+        max_fst = np.maximum(max_fst, np.where(np.isnan(fst), -np.inf, fst).max(axis=1))
+    return exceed, max_fst
+
+
+def permutation_thresholds(alignment, meta_csv, pop1, pop2, n_perm, alpha, threads, seed,
+                           batch_size=25, chunk_size=20000):
+    """
+    Empirical per-site p-values and a family-wise Fst threshold from permuting
+    population labels n_perm times (max-statistic method).
+
+    Returns (per-site DataFrame, family-wise threshold). Sites are identified by their 0-based
+    alignment column (Alignment_col0); the Location of Processed_FST.csv is PopGenome's index of
+    biallelic sites, so the two tables are not joined on it. Fst_hudson is on its own scale and
+    is only compared with the threshold from the same estimator.
+    """
+    window = load_window_module()
+    populations = window.load_populations(meta_csv, pop1, pop2)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        codes_path = os.path.join(tmp_dir, "segregating_codes.u8")
+        seg_sites, labels = extract_segregating(window, alignment, populations, codes_path)
+        shape = (labels.size, seg_sites.size)
+
+        # Observed statistic with the same estimator used for the permutations
+        codes = np.memmap(codes_path, dtype=np.uint8, mode="r", shape=shape)
+        observed = np.empty(seg_sites.size)
+        for lo in range(0, seg_sites.size, chunk_size):
+            block = np.asarray(codes[:, lo:lo + chunk_size])
+            c1 = np.stack([(block[labels == 0] == b).sum(axis=0) for b in range(4)]).astype(np.float64)
+            c2 = np.stack([(block[labels == 1] == b).sum(axis=0) for b in range(4)]).astype(np.float64)
+            observed[lo:lo + chunk_size] = hudson_fst(c1, c2)
+        del codes
+
+        sizes = [min(batch_size, n_perm - i) for i in range(0, n_perm, batch_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        tasks = [(codes_path, shape, labels, observed, s, n, chunk_size) for s, n in zip(seeds, sizes)]
+
+        exceed = np.zeros(seg_sites.size, dtype=np.int64)
+        max_fst = []
+        with ProcessPoolExecutor(max_workers=threads) as pool:
+            for done, (batch_exceed, batch_max) in enumerate(pool.map(permutation_worker, tasks), start=1):
+                exceed += batch_exceed
+                max_fst.append(batch_max)
+                print(f"Permutation batch {done}/{len(tasks)} finished")
+
+    max_fst = np.concatenate(max_fst)
+    threshold = float(np.quantile(max_fst, 1.0 - alpha))
+    result = pd.DataFrame({
+        "Alignment_col0": seg_sites,
+        "Fst_hudson": observed,
+        "p_empirical": (exceed + 1) / (n_perm + 1),
+    })
+    result.loc[np.isnan(observed), "p_empirical"] = np.nan
+    return result, threshold
+
+
 def main():
     parser = argparse.ArgumentParser(
-        description="Compute empirical quantiles for F_ST values and draw a histogram with 99th/99.5th percentiles and a threshold line."
+        description="Compute empirical quantiles for F_ST values and draw a histogram with 99th/99.5th percentiles and a threshold line. "
+                    "With --permutations, also derive per-site p-values and a family-wise threshold by permuting population labels "
+                    "(plotted on the Hudson F_ST histogram in <output>_permutation.png)."
     )
     parser.add_argument(
         "--input_csv", "-i",
@@ -21,10 +161,26 @@ def main():
         required=True,
         help="Destination PNG path, e.g., /path/FST_percentile_distribution.png"
     )
+    parser.add_argument(
+        "--permutations", "-n",
+        type=int,
+        default=0,
+        help="Number of population-label permutations for empirical thresholds (default: 0, percentiles only). "
+             "Requires --alignment and --meta_csv."
+    )
+    parser.add_argument("--alignment", help="Merged FASTA alignment used to compute FST (e.g., work_dir/temp.aln)")
+    parser.add_argument("--meta_csv", help="Metadata CSV with 'strain' and 'fs_pop' columns")
+    parser.add_argument("--pop1", default="hsp1", help="First population in 'fs_pop' (default: hsp1)")
+    parser.add_argument("--pop2", default="hsp2", help="Second population in 'fs_pop' (default: hsp2)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Family-wise error rate (default: 0.05)")
+    parser.add_argument("--threads", "-t", type=int, default=os.cpu_count(), help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=12345, help="Random seed (default: 12345)")
 
     args = parser.parse_args()
     input_csv = args.input_csv
     output_png = args.output_png
+    if args.permutations > 0 and not (args.alignment and args.meta_csv):
+        parser.error("--permutations requires --alignment and --meta_csv")
 
     # Load plotting theme
     theme = load_theme('arctic_light')
@@ -57,6 +213,28 @@ def main():
         f"(99.5th percentile ≈ {p995:.2f}). F_ST > {threshold:.2f} is considered highly differentiated."
     )
 
+    # Optional: permutation-based per-site p-values and family-wise threshold
+    fwer_threshold = None
+    if args.permutations > 0:
+        perm_df, fwer_threshold = permutation_thresholds(
+            args.alignment, args.meta_csv, args.pop1, args.pop2,
+            args.permutations, args.alpha, args.threads, args.seed
+        )
+        out_dir = os.path.dirname(os.path.abspath(input_csv))
+        perm_csv = os.path.join(out_dir, "Permutation_FST.csv")
+        perm_df.to_csv(perm_csv, index=False)
+        summary_csv = os.path.join(out_dir, "Permutation_threshold.csv")
+        pd.DataFrame([{
+            "permutations": args.permutations,
+            "alpha": args.alpha,
+            "fwer_threshold": fwer_threshold,
+            "n_significant": int((perm_df["Fst_hudson"] > fwer_threshold).sum()),
+        }]).to_csv(summary_csv, index=False)
+        print(
+            f"{args.permutations} permutations: family-wise (alpha={args.alpha}) Hudson F_ST threshold ≈ {fwer_threshold:.2f}. "
+            f"Per-site p-values saved to: {perm_csv}"
+        )
+
     # 7. Plot distribution
     plt.figure(figsize=(8, 5))
     plt.hist(fst_vals, bins=100, color='#71A48D', edgecolor='black', alpha=0.7)
@@ -76,5 +254,21 @@ def main():
 
     print(f"Histogram saved to: {output_png}")
 
+    # 8. Permutation threshold against the Hudson Fst it was derived from (separate figure)
+    if fwer_threshold is not None:
+        perm_png = os.path.splitext(output_png)[0] + "_permutation" + os.path.splitext(output_png)[1]
+        plt.figure(figsize=(8, 5))
+        plt.hist(perm_df["Fst_hudson"].dropna(), bins=100, color='#8E7CC3', edgecolor='black', alpha=0.7)
+        plt.xlabel("Hudson Fst value (segregating sites)")
+        plt.ylabel("Count")
+        plt.title("Hudson Fst distribution with permutation threshold")
+        plt.axvline(x=fwer_threshold, color='purple', linestyle='-.', linewidth=1.5,
+                    label=f"Permutation FWER {args.alpha:g} = {fwer_threshold:.2f}")
+        plt.legend(loc="upper right", fontsize=10)
+        plt.tight_layout()
+        plt.savefig(perm_png, dpi=300)
+        plt.close()
+        print(f"Permutation histogram saved to: {perm_png}")
+
 if __name__ == "__main__":
     main()
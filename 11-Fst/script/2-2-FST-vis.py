@@ -4,18 +4,30 @@
 #     --base_dir "${BASE_DIR}" \
 #     --limitation 0.2 \
 #     --gff_file "path/to/NC_000915.gff"
+#
+# Windowed scan produced by 2-3-window.py:
+# python 2-2-FST-vis.py \
+#     --base_dir "${BASE_DIR}" \
+#     --input_csv "${BASE_DIR}/Windowed_FST.csv" \
+#     --output_prefix "FST_windows" \
+#     --limitation 0.2 \
+#     --gff_file "path/to/NC_000915.gff"
 
 import os
+import time
 import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap
 from aquarel import load_theme
 
 def parse_args():
     parser = argparse.ArgumentParser(
         description=(
             "FST visualization and annotation workflow:\n"
-            "1) Draw stacked scatter plots (bottom and top panels rasterized, axes and annotations remain vector).\n"
+            "1) Draw stacked scatter plots (bottom and top panels rasterized, axes and annotations remain vector);\n"
+            "   --render raster pre-bins the low-Fst band into a density image for whole-genome data.\n"
             "2) Annotate sites with Fst > limitation using CDS features from the GFF file.\n"
             "3) Export the annotated plot and a text file listing annotations."
         )
@@ -36,6 +48,29 @@ def parse_args():
         required=True,
         help="Path to the NC_000915.gff file providing CDS coordinates and product annotations."
     )
+    parser.add_argument(
+        "--input_csv", "-i",
+        default=None,
+        help="CSV with 'Location' and 'Fst' columns (default: <base_dir>/Processed_FST.csv); "
+             "pass Windowed_FST.csv from 2-3-window.py to plot window midpoints."
+    )
+    parser.add_argument(
+        "--output_prefix", "-p",
+        default="FST_annotations",
+        help="File name prefix for the .txt/.pdf outputs written to base_dir (default: FST_annotations)."
+    )
+    parser.add_argument(
+        "--render", "-r",
+        choices=["scatter", "raster"],
+        default="scatter",
+        help="scatter: every site drawn in both panels; raster: low-Fst band pre-binned into a density "
+             "image, only outliers drawn as vector markers, one label per CDS (default: scatter)."
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Render both modes (<prefix>_scatter.pdf, <prefix>_raster.pdf) and report runtime and file size."
+    )
     return parser.parse_args()
 
 def read_cds_list(gff_path):
@@ -68,14 +103,18 @@ def read_cds_list(gff_path):
                 cds_list.append((start, end, product_info))
     return cds_list
 
-def annotate_sites(data_df, cds_list, threshold, ax_top, txt_output_path):
+def annotate_sites(data_df, cds_list, threshold, ax_top, txt_output_path, dedup_labels=False):
     """
     For rows with Fst > threshold:
     1) Annotate the top subplot if the site falls within a CDS range.
     2) Record annotation details into txt_output_path.
+
+    With dedup_labels, each CDS receives a single label at its highest-Fst hit;
+    every hit is still written to the text file.
     """
     annotate_df = data_df[data_df["Fst"] > threshold].copy()
     results = []
+    labels = []
 
     # Iterate through candidate sites
     for idx, row in annotate_df.iterrows():
@@ -84,17 +123,27 @@ def annotate_sites(data_df, cds_list, threshold, ax_top, txt_output_path):
         # Check whether the position falls inside a CDS interval
         for (start, end, product_info) in cds_list:
             if start <= pos <= end:
-                # Annotate figure using vector text with arrows
-                ax_top.annotate(
-                    product_info,
-                    xy=(pos, fst_value),
-                    xytext=(pos, min(fst_value + 0.03, 1.0)),
-                    arrowprops=dict(arrowstyle="->", color="black", lw=0.5),
-                    fontsize=8
-                )
+                labels.append(((start, end, product_info), pos, fst_value))
                 results.append(f"Position: {pos}, Fst: {fst_value:.4f}, CDS product: {product_info}")
                 break
 
+    if dedup_labels:
+        best = {}
+        for cds, pos, fst_value in labels:
+            if cds not in best or fst_value > best[cds][2]:
+                best[cds] = (cds, pos, fst_value)
+        labels = list(best.values())
+
+    # Annotate figure using vector text with arrows
+    for (_, _, product_info), pos, fst_value in labels:
+        ax_top.annotate(
+            product_info,
+            xy=(pos, fst_value),
+            xytext=(pos, min(fst_value + 0.03, 1.0)),
+            arrowprops=dict(arrowstyle="->", color="black", lw=0.5),
+            fontsize=8
+        )
+
     # Write annotations to disk
     with open(txt_output_path, "w", encoding="utf-8") as out_fh:
         for line in results:
@@ -102,28 +151,32 @@ def annotate_sites(data_df, cds_list, threshold, ax_top, txt_output_path):
 
     return len(results)
 
-def main():
-    args = parse_args()
-    BASE_DIR = args.base_dir.rstrip("/")
-    limitation = args.limitation
-    gff_file = args.gff_file
-
-    fst_csv_path = os.path.join(BASE_DIR, "Processed_FST.csv")
-    if not os.path.exists(fst_csv_path):
-        raise FileNotFoundError(f"Fst data file not found: {fst_csv_path}")
-    if not os.path.exists(gff_file):
-        raise FileNotFoundError(f"GFF file not found: {gff_file}")
-
-    data = pd.read_csv(fst_csv_path, header=0, encoding="utf-8")
-    if "Location" not in data.columns or "Fst" not in data.columns:
-        raise KeyError(f"CSV file must contain 'Location' and 'Fst': {fst_csv_path}")
+def draw_density(ax, x, y, x_max, y_max, color, bins=(2000, 50)):
+    """
+    Pre-bin (x, y) points into a 2-D count grid and draw it as a single image.
+    Empty bins stay transparent so the panel looks like a scatter plot.
+    """
+    counts, _, _ = np.histogram2d(x, y, bins=bins, range=[[0, x_max], [0, y_max]])
+    density = np.ma.masked_equal(np.log1p(counts.T), 0)
+    cmap = LinearSegmentedColormap.from_list("fst_density", ["#D4E4DB", color])
+    ax.imshow(
+        density,
+        extent=(0, x_max, 0, y_max),
+        origin="lower",
+        aspect="auto",
+        cmap=cmap,
+        interpolation="none"
+    )
 
-    theme = load_theme("arctic_light")
-    theme.apply()
-    plt.rcParams["font.family"]     = "Arial"
-    plt.rcParams["pdf.fonttype"]    = 42
-    plt.rcParams["ps.fonttype"]     = 42
+def render_figure(data, limitation, cds_list, txt_out, pdf_out, theme, render="scatter"):
+    """
+    Draw the stacked Fst panels and save them to pdf_out.
 
+    render="scatter" scatters every site in both panels (original behaviour).
+    render="raster" draws the low-Fst band as a density image, scatters only the
+    sites above limitation as vector markers and labels each CDS once.
+    Returns the number of annotated sites.
+    """
     fig, (ax_top, ax_bottom) = plt.subplots(
         2, 1,
         figsize=(12, 6),
@@ -132,27 +185,45 @@ def main():
     )
     plt.subplots_adjust(hspace=0)
 
-    scatter_bottom = ax_bottom.scatter(
-        data["Location"],
-        data["Fst"],
-        c="#71A48D",
-        alpha=1,
-        s=7,
-        rasterized=True
-    )
+    x_max = data["Location"].max() + 10000
+    if render == "raster":
+        low = data["Fst"] <= limitation
+        draw_density(
+            ax_bottom,
+            data.loc[low, "Location"].to_numpy(dtype=float),
+            data.loc[low, "Fst"].to_numpy(dtype=float),
+            x_max, limitation, "#71A48D"
+        )
+        ax_top.scatter(
+            data.loc[~low, "Location"],
+            data.loc[~low, "Fst"],
+            c="#AB5962",
+            alpha=1,
+            s=7,
+            rasterized=False
+        )
+    else:
+        ax_bottom.scatter(
+            data["Location"],
+            data["Fst"],
+            c="#71A48D",
+            alpha=1,
+            s=7,
+            rasterized=True
+        )
+        ax_top.scatter(
+            data["Location"],
+            data["Fst"],
+            c="#AB5962",
+            alpha=1,
+            s=7,
+            rasterized=True
+        )
     ax_bottom.set_ylim(0, limitation)
     ax_bottom.get_yaxis().set_visible(False)
     ax_bottom.set_ylabel("Fst", fontsize=10)
     ax_bottom.grid(False)
 
-    scatter_top = ax_top.scatter(
-        data["Location"],
-        data["Fst"],
-        c="#AB5962",
-        alpha=1,
-        s=7,
-        rasterized=True
-    )
     ax_top.set_ylim(limitation, 1)
     ax_top.set_ylabel("Fst", fontsize=10)
     ax_top.grid(False)
@@ -171,19 +242,63 @@ def main():
 
     ax_bottom.set_xlabel("Location (Position)", fontsize=10)
     ax_bottom.set_title("")
-    ax_bottom.set_xlim(left=0, right=data["Location"].max() + 10000)
+    ax_bottom.set_xlim(left=0, right=x_max)
     ax_bottom.ticklabel_format(style="plain", axis="x")
 
-    cds_list = read_cds_list(gff_file)
-    txt_out = os.path.join(BASE_DIR, "FST_annotations.txt")
-    n_hits = annotate_sites(data, cds_list, limitation, ax_top, txt_out)
-    print(f"Annotated {n_hits} sites with Fst > {limitation}. Details saved to: {txt_out}")
+    n_hits = annotate_sites(data, cds_list, limitation, ax_top, txt_out,
+                            dedup_labels=(render == "raster"))
 
     theme.apply_transforms()
-    pdf_out = os.path.join(BASE_DIR, "FST_annotations.pdf")
     plt.savefig(pdf_out, dpi=500)
     plt.close(fig)
-    print(f"Annotated PDF saved to: {pdf_out}")
+    return n_hits
+
+def main():
+    args = parse_args()
+    BASE_DIR = args.base_dir.rstrip("/")
+    limitation = args.limitation
+    gff_file = args.gff_file
+
+    fst_csv_path = args.input_csv or os.path.join(BASE_DIR, "Processed_FST.csv")
+    if not os.path.exists(fst_csv_path):
+        raise FileNotFoundError(f"Fst data file not found: {fst_csv_path}")
+    if not os.path.exists(gff_file):
+        raise FileNotFoundError(f"GFF file not found: {gff_file}")
+
+    data = pd.read_csv(fst_csv_path, header=0, encoding="utf-8")
+    if "Location" not in data.columns or "Fst" not in data.columns:
+        raise KeyError(f"CSV file must contain 'Location' and 'Fst': {fst_csv_path}")
+    # Windows without usable sites carry NaN Fst
+    data = data.dropna(subset=["Fst"])
+
+    theme = load_theme("arctic_light")
+    theme.apply()
+    plt.rcParams["font.family"]     = "Arial"
+    plt.rcParams["pdf.fonttype"]    = 42
+    plt.rcParams["ps.fonttype"]     = 42
+
+    cds_list = read_cds_list(gff_file)
+    txt_out = os.path.join(BASE_DIR, f"{args.output_prefix}.txt")
+
+    # --benchmark renders both modes side by side for a runtime/file-size comparison
+    modes = ["scatter", "raster"] if args.benchmark else [args.render]
+    timings = []
+    for mode in modes:
+        suffix = f"_{mode}" if args.benchmark else ""
+        pdf_out = os.path.join(BASE_DIR, f"{args.output_prefix}{suffix}.pdf")
+        t0 = time.perf_counter()
+        n_hits = render_figure(data, limitation, cds_list, txt_out, pdf_out, theme, render=mode)
+        elapsed = time.perf_counter() - t0
+        size_mb = os.path.getsize(pdf_out) / 1e6
+        timings.append((mode, elapsed, size_mb))
+        print(f"[{mode}] Annotated PDF saved to: {pdf_out} ({elapsed:.1f} s, {size_mb:.2f} MB)")
+    print(f"Annotated {n_hits} sites with Fst > {limitation}. Details saved to: {txt_out}")
+
+    if args.benchmark:
+        print(f"{len(data)} sites plotted")
+        print(f"{'mode':<10}{'seconds':>10}{'MB':>10}")
+        for mode, elapsed, size_mb in timings:
+            print(f"{mode:<10}{elapsed:>10.2f}{size_mb:>10.2f}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Example:
+# python 2-3-window.py \
+#     --alignment "${WORK_DIR}/temp.aln" \
+#     --meta_csv "conf/META.csv" \
+#     --window 10000 \
+#     --step 5000 \
+#     --output_csv "${OUTPUT_DIR}/Windowed_FST.csv"
+
+import argparse
+import csv
+import math
+
+import numpy as np
+import pandas as pd
+
+# A/C/G/T -> 0..3, every other byte (gap, N, IUPAC) -> 4 and is ignored
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    BASE_CODES[_base] = _code
+    BASE_CODES[_base + 32] = _code  # lowercase
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Sliding-window scan of Hudson Fst, nucleotide diversity (pi) and Tajima's D.\n"
+            "Sequences are streamed one at a time into per-population base counts, so memory\n"
+            "depends on the alignment length only, not on the number of samples.\n"
+            "The output uses 'Location' (window midpoint) and 'Fst' columns so that\n"
+            "2-2-FST-vis.py can plot it with --input_csv."
+        )
+    )
+    parser.add_argument(
+        "--alignment", "-a",
+        required=True,
+        help="Merged FASTA alignment (e.g., work_dir/temp.aln); all sequences must share the same length."
+    )
+    parser.add_argument(
+        "--meta_csv", "-m",
+        required=True,
+        help="Metadata CSV with 'strain' and 'fs_pop' columns (e.g., conf/META.csv)."
+    )
+    parser.add_argument("--pop1", default="hsp1", help="First population in 'fs_pop' (default: hsp1)")
+    parser.add_argument("--pop2", default="hsp2", help="Second population in 'fs_pop' (default: hsp2)")
+    parser.add_argument("--window", "-w", type=int, default=10000, help="Window size in bp (default: 10000)")
+    parser.add_argument("--step", "-s", type=int, default=5000, help="Step size in bp (default: 5000)")
+    parser.add_argument(
+        "--output_csv", "-o",
+        required=True,
+        help="Destination CSV, e.g., /path/Windowed_FST.csv"
+    )
+    args = parser.parse_args()
+    if args.window <= 0 or args.step <= 0:
+        parser.error("--window and --step must be positive integers")
+    return args
+
+
+def load_populations(meta_csv, pop1, pop2):
+    """
+    Return a dict strain -> population index (0 for pop1, 1 for pop2).
+    """
+    meta = pd.read_csv(meta_csv, dtype=str)
+    for col in ("strain", "fs_pop"):
+        if col not in meta.columns:
+            raise KeyError(f"Column '{col}' is missing from the CSV file: {meta_csv}")
+    meta = meta[meta["fs_pop"].isin([pop1, pop2])]
+    return {s.strip(): (0 if p == pop1 else 1) for s, p in zip(meta["strain"], meta["fs_pop"])}
+
+
+def iter_fasta(path):
+    """
+    Yield (name, sequence_bytes) one record at a time.
+    """
+    name, chunks = None, []
+    with open(path, "rb") as fh:
+        for line in fh:
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(chunks)
+                name = line[1:].split()[0].decode() if line[1:].strip() else ""
+                chunks = []
+            else:
+                chunks.append(line.rstrip())
+    if name is not None:
+        yield name, b"".join(chunks)
+
+
+def count_alleles(alignment, populations):
+    """
+    Stream the alignment and accumulate base counts.
+
+    Returns an array of shape (2, 4, n_sites): population x base (A, C, G, T) x site.
+    """
+    counts = None
+    n_used = [0, 0]
+    for name, seq in iter_fasta(alignment):
+        pop = populations.get(name)
+        if pop is None:
+            continue
+        codes = BASE_CODES[np.frombuffer(seq, dtype=np.uint8)]
+        if counts is None:
+            counts = np.zeros((2, 4, codes.size), dtype=np.uint32)
+        elif codes.size != counts.shape[2]:
+            raise ValueError(
+                f"Sequence {name} has length {codes.size}, expected {counts.shape[2]}; input must be aligned."
+            )
+        for base in range(4):
+            counts[pop, base] += codes == base
+        n_used[pop] += 1
+    if counts is None or min(n_used) == 0:
+        raise ValueError(f"Both populations need at least one sequence in the alignment (found {n_used}).")
+    print(f"Loaded {n_used[0]} + {n_used[1]} sequences over {counts.shape[2]} sites.")
+    return counts
+
+
+def site_statistics(counts):
+    """
+    Per-site components used by the window summaries.
+
+    Returns a dict of float64 arrays: Hudson Fst numerator/denominator, pooled pi,
+    pooled sample size, and callable/segregating masks.
+    """
+    counts = counts.astype(np.float64)
+    n_pop = counts.sum(axis=1)                       # (2, n_sites)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        freq = counts / n_pop[:, None, :]
+        # Unbiased within-population mean pairwise difference
+        within_pop = n_pop / (n_pop - 1) * (1.0 - (freq ** 2).sum(axis=1))
+        between = 1.0 - (freq[0] * freq[1]).sum(axis=0)
+
+        pooled = counts.sum(axis=0)                  # (4, n_sites)
+        n = pooled.sum(axis=0)
+        pi = n / (n - 1) * (1.0 - ((pooled / n) ** 2).sum(axis=0))
+
+    fst_ok = (n_pop >= 2).all(axis=0)
+    callable_ = n >= 2
+    return {
+        "num": np.where(fst_ok, between - within_pop.mean(axis=0), 0.0),
+        "den": np.where(fst_ok, between, 0.0),
+        "fst_ok": fst_ok.astype(np.float64),
+        "pi": np.where(callable_, pi, 0.0),
+        "n": np.where(callable_, n, 0.0),
+        "callable": callable_.astype(np.float64),
+        "seg": (callable_ & ((pooled > 0).sum(axis=0) > 1)).astype(np.float64),
+    }
+
+
+def tajima_d(theta_pi, n_seg, n):
+    """
+    Tajima's D for a window with `n_seg` segregating sites and `n` sequences.
+    """
+    n = int(round(n))
+    if n_seg == 0 or n < 4:
+        return float("nan")
+    i = np.arange(1, n)
+    a1 = np.sum(1.0 / i)
+    a2 = np.sum(1.0 / i ** 2)
+    b1 = (n + 1) / (3.0 * (n - 1))
+    b2 = 2.0 * (n * n + n + 3) / (9.0 * n * (n - 1))
+    c1 = b1 - 1.0 / a1
+    c2 = b2 - (n + 2) / (a1 * n) + a2 / (a1 * a1)
+    e1 = c1 / a1
+    e2 = c2 / (a1 * a1 + a2)
+    return (theta_pi - n_seg / a1) / math.sqrt(e1 * n_seg + e2 * n_seg * (n_seg - 1))
+
+
+def iter_windows(stats, window, step):
+    """
+    Yield one output row per window, using prefix sums so each window is O(1).
+
+    When the step does not land on the end of the alignment, one last window
+    [n_sites - window, n_sites) is added so the tail is covered.
+    """
+    n_sites = stats["num"].size
+    cum = {k: np.concatenate(([0.0], np.cumsum(v))) for k, v in stats.items()}
+    last_start = max(n_sites - window, 0)
+    starts = list(range(0, last_start + 1, step))
+    if starts[-1] + window < n_sites:
+        starts.append(last_start)
+    for start in starts:
+        end = min(start + window, n_sites)
+        s = {k: v[end] - v[start] for k, v in cum.items()}
+        fst = s["num"] / s["den"] if s["den"] > 0 else float("nan")
+        pi = s["pi"] / s["callable"] if s["callable"] > 0 else float("nan")
+        # Sample size varies with missing data; use the mean over callable sites
+        n_mean = s["n"] / s["callable"] if s["callable"] > 0 else 0.0
+        yield [
+            (start + 1 + end) // 2, start + 1, end,
+            int(s["fst_ok"]), int(s["seg"]),
+            fst, pi, tajima_d(s["pi"], int(s["seg"]), n_mean),
+        ]
+
+
+def main():
+    args = parse_args()
+
+    populations = load_populations(args.meta_csv, args.pop1, args.pop2)
+    counts = count_alleles(args.alignment, populations)
+    stats = site_statistics(counts)
+    del counts
+
+    n_windows = 0
+    with open(args.output_csv, "w", newline="", encoding="utf-8") as out_fh:
+        writer = csv.writer(out_fh)
+        writer.writerow(["Location", "Start", "End", "N_sites", "N_segregating", "Fst", "Pi", "TajimaD"])
+        for row in iter_windows(stats, args.window, args.step):
+            writer.writerow(row)
+            n_windows += 1
+
+    print(f"Wrote {n_windows} windows (size={args.window}, step={args.step}) to: {args.output_csv}")
+
+
+if __name__ == "__main__":
+    main()
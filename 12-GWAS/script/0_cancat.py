@@ -1,44 +1,188 @@
+#!/usr/bin/env python3
+# Example:
+# python 0_cancat.py example/list.txt merge_fasta example/alignmentSub.aln --index --threads 8
+#
+# Also used by 11-Fst/script/2-0-FST_BATCH.r to build its merged alignment.
 import os
 import sys
+import shutil
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+COPY_BUFFER = 16 * 1024 * 1024  # Fallback copy block size (bytes)
+
+
+def scan_fasta(path):
+    """
+    Read one FASTA file and describe its records.
+
+    Returns a list of (name, seq_length, seq_offset, line_bases, line_width) tuples, with
+    seq_offset relative to the start of the file (the fields of a samtools .fai line),
+    and whether the file ends with a newline. Whole-file byte operations keep the scan cheap
+    enough to run one file per thread.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records = []
+    start = data.find(b'>')
+    if start != 0 and data[:start].strip():
+        raise ValueError(f"{path}: sequence data before the first '>' header")
+    while start != -1:
+        header_end = data.find(b'\n', start)
+        if header_end == -1:
+            header_end = len(data)
+        name = data[start + 1:header_end].split(None, 1)[0].decode() if data[start + 1:header_end].strip() else ""
+        seq_offset = header_end + 1
+        next_start = data.find(b'\n>', header_end)
+        seq_end = len(data) if next_start == -1 else next_start + 1
+        block = data[seq_offset:seq_end]
+
+        lines = block.split(b'\n')
+        if lines and lines[-1] == b'':
+            lines.pop()
+        line_width = len(lines[0]) + 1 if lines else 0
+        line_bases = len(lines[0].rstrip(b'\r')) if lines else 0
+        seq_length = len(block) - block.count(b'\n') - block.count(b'\r')
+        # .fai offsets are only usable when every line but the last has the same width
+        uniform = all(len(line) + 1 == line_width for line in lines[:-1]) and \
+            (not lines or len(lines[-1]) + 1 <= line_width)
+        records.append((name, seq_length, seq_offset, line_bases, line_width if uniform else 0))
+        start = -1 if next_start == -1 else next_start + 1
+    return records, not data or data.endswith(b'\n')
+
+
+def copy_file(src, fout):
+    """
+    Append src to the unbuffered binary file object fout, using os.sendfile where available.
+    """
+    with open(src, 'rb') as fin:
+        size = os.fstat(fin.fileno()).st_size
+        try:
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(fout.fileno(), fin.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            if offset == size:
+                return
+            fin.seek(offset)
+        except (AttributeError, OSError):
+            fin.seek(0)
+        shutil.copyfileobj(fin, fout, COPY_BUFFER)
+
+
+def read_ids(list_file, meta_csv=None, id_column="strain"):
+    """
+    Target IDs from a one-per-line list, or from a column of a metadata CSV.
+    """
+    if meta_csv:
+        import pandas as pd
+        meta = pd.read_csv(meta_csv, dtype=str)
+        if id_column not in meta.columns:
+            raise KeyError(f"Column does not exist in CSV: {id_column}")
+        return [i.strip() for i in meta[id_column].dropna() if i.strip()]
+    with open(list_file, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def concatenate(fasta_files, output_file, threads=4, index_file=None, validate=True):
+    """
+    Concatenate FASTA files into output_file (written atomically via a .tmp file).
+
+    The files are scanned in a thread pool while being copied; with validate=True every
+    sequence must have the same length. When index_file is given a .fai-style index
+    (name, length, offset, line bases, line width) is written for the merged file.
+    Returns the number of sequences and the alignment length.
+    """
+    tmp_file = output_file + ".tmp"
+    lengths = {}
+    index_rows = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool, \
+                open(tmp_file, 'wb', buffering=0) as fout:
+            scans = pool.map(scan_fasta, fasta_files)
+            base = 0
+            for path, (records, ends_with_newline) in zip(fasta_files, scans):
+                copy_file(path, fout)
+                for name, seq_length, seq_offset, line_bases, line_width in records:
+                    lengths.setdefault(seq_length, name)
+                    index_rows.append((name, seq_length, base + seq_offset, line_bases, line_width))
+                base += os.path.getsize(path)
+                if not ends_with_newline:
+                    # Keep the next header on its own line
+                    fout.write(b'\n')
+                    base += 1
+                if validate and len(lengths) > 1:
+                    found = ", ".join(f"{n} ({l} bp)" for l, n in lengths.items())
+                    raise ValueError(f"Sequences do not share one alignment length: {found} (first seen in {path})")
+
+        if index_file:
+            unindexable = [row[0] for row in index_rows if row[4] == 0]
+            if unindexable:
+                print(f"Warning: {len(unindexable)} sequences have irregular line widths and cannot be "
+                      f"seeked through the index: {unindexable[:5]}")
+            with open(index_file + ".tmp", 'w') as f_idx:
+                for row in index_rows:
+                    f_idx.write('\t'.join(map(str, row)) + '\n')
+            os.replace(index_file + ".tmp", index_file)
+        os.replace(tmp_file, output_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return len(index_rows), (next(iter(lengths)) if len(lengths) == 1 else None)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Merge multiple FASTA files into a single output file")
-    parser.add_argument("list_file", help="List file containing target IDs")
+    parser.add_argument("list_file", nargs="?", default=None, help="List file containing target IDs")
     parser.add_argument("fasta_dir", help="Directory that stores FASTA files")
     parser.add_argument("output_file", help="Path to the merged output file")
+    parser.add_argument("--meta_csv", default=None,
+                        help="Read the target IDs from this CSV instead of list_file (e.g., 11-Fst conf/META.csv)")
+    parser.add_argument("--id_column", default="strain", help="ID column for --meta_csv (default: strain)")
+    parser.add_argument("--suffix", default=".fasta", help="FASTA file suffix (default: .fasta)")
+    parser.add_argument("--threads", type=int, default=4, help="Threads used to scan/validate files (default: 4)")
+    parser.add_argument("--index", action="store_true",
+                        help="Also write <output_file>.fai (samtools faidx layout) for seeking to single samples")
+    parser.add_argument("--no_validate", dest="validate", action="store_false",
+                        help="Do not require all sequences to share the alignment length")
     args = parser.parse_args()
-
-    list_file = args.list_file
-    fasta_dir = args.fasta_dir
-    output_file = args.output_file
+    if not args.list_file and not args.meta_csv:
+        parser.error("either list_file or --meta_csv is required")
 
     # Read target ID list
     try:
-        with open(list_file, 'r') as f:
-            target_ids = [line.strip() for line in f if line.strip()]
-    except IOError as e:
-        print(f"Error: Unable to read list file {list_file}: {e}")
+        target_ids = read_ids(args.list_file, args.meta_csv, args.id_column)
+    except (IOError, KeyError) as e:
+        print(f"Error: Unable to read target IDs: {e}")
+        sys.exit(1)
+
+    fasta_files = []
+    for tid in target_ids:
+        fasta_file = os.path.join(args.fasta_dir, tid + args.suffix)
+        # Check whether the corresponding FASTA file exists
+        if os.path.exists(fasta_file):
+            fasta_files.append(fasta_file)
+        else:
+            print(f"Warning: File {fasta_file} does not exist")
+    if not fasta_files:
+        print("Error: No FASTA files were found for the target IDs")
         sys.exit(1)
 
-    # Open output file (overwrite mode)
+    index_file = args.output_file + ".fai" if args.index else None
     try:
-        with open(output_file, 'w') as fout:
-            # Iterate through all target IDs
-            for tid in target_ids:
-                fasta_file = os.path.join(fasta_dir, tid + ".fasta")
-                # Check whether the corresponding FASTA file exists
-                if os.path.exists(fasta_file):
-                    with open(fasta_file, 'r') as fin:
-                        # Read line by line and write directly to the output file
-                        for line in fin:
-                            fout.write(line)
-                    fout.flush()  # Flush buffer after each file
-                else:
-                    print(f"Warning: File {fasta_file} does not exist")
-    except IOError as e:
-        print(f"Error: Unable to write to output file {output_file}: {e}")
+        n_seqs, length = concatenate(fasta_files, args.output_file, args.threads, index_file, args.validate)
+    except (IOError, ValueError) as e:
+        print(f"Error: Unable to write to output file {args.output_file}: {e}")
         sys.exit(1)
 
+    length_note = f", alignment length {length}" if length is not None else ""
+    print(f"Merged {n_seqs} sequences from {len(fasta_files)} files into {args.output_file}{length_note}")
+    if index_file:
+        print(f"Index written to: {index_file}")
+
+
 if __name__ == '__main__':
     main()
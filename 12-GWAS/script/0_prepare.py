@@ -3,26 +3,119 @@ import argparse
 import os
 import sys
 
+import numpy as np
+
+
+def iter_records(f_in, biallelic):
+    """
+    Yield (line_number, pos_id, alleles, genotype_tokens) for every usable data row.
+    The header line must already have been consumed from f_in.
+    """
+    for line_number, line in enumerate(f_in, start=2):
+        tokens = line.split()
+        if not tokens:
+            continue  # Skip empty rows
+
+        # Data rows must contain at least 4 columns
+        if len(tokens) < 4:
+            print(f"Warning: Skipped line {line_number} because it lacks enough columns")
+            continue
+
+        alt_alleles = tokens[2].split(",")
+        # Skip if biallelic is required but the alternative allele count is not 1
+        if biallelic and len(alt_alleles) != 1:
+            continue
+
+        yield line_number, tokens[0], [tokens[1]] + alt_alleles, tokens[3:]
+
+
+def iter_chunks(records, chunk_size):
+    """
+    Group records into lists of at most chunk_size items.
+    """
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def convert_chunk(chunk, n_samples):
+    """
+    Convert a chunk of 0/1/2/3 genotype codes to bases with a per-chunk lookup table.
+
+    Returns the output lines for rows that converted cleanly.
+    """
+    valid = []
+    for record in chunk:
+        line_number, pos_id, alleles, genotypes = record
+        if len(genotypes) != n_samples:
+            print(f"Error processing line {line_number}: expected {n_samples} genotypes, found {len(genotypes)}. "
+                  f"Content: {[pos_id, alleles[0], ','.join(alleles[1:])] + genotypes}")
+            continue
+        valid.append(record)
+    if not valid:
+        return []
+
+    # Codes: one byte per genotype; anything that is not a single digit is invalid
+    raw = np.array([r[3] for r in valid], dtype=np.bytes_)
+    if raw.dtype.itemsize == 1:
+        codes = raw.view(np.uint8).astype(np.int16) - ord('0')
+    else:
+        lengths = np.char.str_len(raw)
+        codes = np.where(lengths == 1, raw.astype('S1').view(np.uint8).astype(np.int16) - ord('0'), -1)
+
+    # Lookup table: row i holds [REF, ALT1, ALT2, ...] padded to the widest row
+    width = max(len(r[2]) for r in valid)
+    table = np.array([r[2] + [''] * (width - len(r[2])) for r in valid], dtype=object)
+    n_alleles = np.array([len(r[2]) for r in valid])
+
+    bad = ((codes < 0) | (codes >= n_alleles[:, None])).any(axis=1)
+    for i in np.flatnonzero(bad):
+        line_number, pos_id, alleles, genotypes = valid[i]
+        print(f"Error processing line {line_number}: invalid genotype code. "
+              f"Content: {[pos_id, alleles[0], ','.join(alleles[1:])] + genotypes}")
+
+    keep = np.flatnonzero(~bad)
+    bases = table[keep[:, None], codes[keep]]
+    return [valid[i][1] + '\t' + '\t'.join(row) + '\n' for i, row in zip(keep, bases.tolist())]
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate Bugwas genotype input files by mapping 0/1/2/3 codes to A/T/C/G"
     )
     parser.add_argument(
-        "input_file", 
+        "input_file",
         help="Path to the input file (for example: input/tmp2.txt)"
     )
     parser.add_argument(
-        "--output_file", 
+        "--output_file",
         help="Output file path. If omitted, a default is derived from the biallelic setting",
         default=None
     )
     # Keep only biallelic variants by default; use --no-biallelic to keep all variants
     parser.add_argument(
-        "--no-biallelic", 
-        dest="biallelic", 
-        action="store_false", 
+        "--no-biallelic",
+        dest="biallelic",
+        action="store_false",
         help="Disable the biallelic filter and keep all variants"
     )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=5000,
+        help="Number of SNP rows converted and written per chunk (default: 5000)"
+    )
+    parser.add_argument(
+        "--progress_every",
+        type=int,
+        default=100000,
+        help="Print a progress message every N input lines (default: 100000)"
+    )
     parser.set_defaults(biallelic=True)
 
     args = parser.parse_args()
@@ -37,66 +130,37 @@ def main():
         output_name = "geno_biallelic_SNP.txt" if biallelic else "geno_multiallelic_SNP.txt"
         output_file = os.path.join(base_dir, output_name)
 
-    header = []          # Header info: first element is marker id column, second is sample names
-    positions = []       # SNP identifiers
-    genotype_data = []   # Converted genotype rows
+    tmp_file = output_file + ".tmp"
+    n_written = 0
+    next_report = args.progress_every
 
     try:
-        with open(input_file, 'r') as f:
-            for line_number, line in enumerate(f, start=1):
-                tokens = line.strip().split()
-                if not tokens:
-                    continue  # Skip empty rows
-
-                # First row is header
-                if line_number == 1:
-                    if len(tokens) < 4:
-                        raise ValueError("Header must contain at least 4 columns (marker, Ref, Alt, samples)")
-                    header = [tokens[0], tokens[3:]]  # First column is marker, sample names start at column 4
-                    continue
-
-                # Data rows must contain at least 4 columns
-                if len(tokens) < 4:
-                    print(f"Warning: Skipped line {line_number} because it lacks enough columns")
-                    continue
-
-                pos_id = tokens[0]
-                ref_allele = tokens[1]
-                alt_alleles = tokens[2].split(",")
-                genotypes = tokens[3:]
-
-                # Skip if biallelic is required but the alternative allele count is not 1
-                if biallelic and len(alt_alleles) != 1:
-                    continue
-
-                # Convert genotype codes to nucleotide bases
-                try:
-                    converted_genotypes = [
-                        ref_allele if g == '0' else alt_alleles[int(g) - 1]
-                        for g in genotypes
-                    ]
-                except (ValueError, IndexError) as e:
-                    print(f"Error processing line {line_number}: {e}. Content: {tokens}")
-                    continue
-
-                positions.append(pos_id)
-                genotype_data.append(converted_genotypes)
-                # Progress message
-                print(f"Processed line {line_number}")
-    except Exception as e:
-        print(f"Error reading input file {input_file}: {e}")
-        sys.exit(1)
+        with open(input_file, 'r') as f_in, open(tmp_file, 'w') as f_out:
+            # First row is header: marker column, Ref, Alt, then sample names
+            header = f_in.readline().split()
+            if len(header) < 4:
+                raise ValueError("Header must contain at least 4 columns (marker, Ref, Alt, samples)")
+            samples = header[3:]
+            f_out.write(header[0] + '\t' + '\t'.join(samples) + '\n')
 
-    try:
-        with open(output_file, 'w') as f_out:
-            # Write header
-            f_out.write(header[0] + '\t' + '\t'.join(header[1]) + '\n')
-            # Write each data row
-            for pos, geno in zip(positions, genotype_data):
-                f_out.write(pos + '\t' + '\t'.join(geno) + '\n')
+            # Convert and write one chunk at a time
+            for chunk in iter_chunks(iter_records(f_in, biallelic), args.chunk_size):
+                lines = convert_chunk(chunk, len(samples))
+                f_out.writelines(lines)
+                n_written += len(lines)
+                # Progress message (throttled)
+                last_line = chunk[-1][0]
+                if last_line >= next_report:
+                    print(f"Processed line {last_line} ({n_written} SNPs written)")
+                    next_report = (last_line // args.progress_every + 1) * args.progress_every
+        os.replace(tmp_file, output_file)
     except Exception as e:
-        print(f"Error writing output file {output_file}: {e}")
+        print(f"Error converting input file {input_file} to {output_file}: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
         sys.exit(1)
 
+    print(f"Wrote {n_written} SNPs to {output_file}")
+
 if __name__ == '__main__':
     main()
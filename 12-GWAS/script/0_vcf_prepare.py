@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# Example:
+# python 0_vcf_prepare.py \
+#     --vcf merged_biallelic.7544.vcf.gz \
+#     --id_file example/ID.txt \
+#     --output_dir example \
+#     --snp_fasta example/alignmentSub.temp
+import argparse
+import gzip
+import os
+import sys
+
+import numpy as np
+
+VALID_BASES = {'A', 'C', 'G', 'T'}
+
+
+def read_ids(id_file=None, pheno_file=None):
+    """
+    Return the ordered list of sample IDs to keep.
+
+    id_file has one ID per line; pheno_file is tab-delimited with a header and IDs in
+    the first column. When both are given, the ID order is kept and only samples
+    that also have a phenotype are retained.
+    """
+    ids = None
+    if id_file:
+        with open(id_file, 'r') as f:
+            ids = [line.strip() for line in f if line.strip()]
+    if pheno_file:
+        with open(pheno_file, 'r') as f:
+            next(f, None)  # Skip header
+            pheno_ids = [line.split()[0] for line in f if line.strip()]
+        if ids is None:
+            ids = pheno_ids
+        else:
+            keep = set(pheno_ids)
+            ids = [i for i in ids if i in keep]
+    if not ids:
+        raise ValueError("No sample IDs were provided (use --id_file and/or --pheno_file)")
+    return ids
+
+
+def open_text(path):
+    return gzip.open(path, 'rt') if path.endswith(('.gz', '.bgz')) else open(path, 'r')
+
+
+def iter_vcf_chunks(f_in, columns, chunk_size):
+    """
+    Yield (positions, alleles, genotype_fields) for chunks of SNP records.
+    Only the requested sample columns are kept; the VCF header must already be consumed.
+    """
+    positions, alleles, fields = [], [], []
+    for line in f_in:
+        row = line.rstrip('\n').split('\t')
+        ref, alt = row[3], row[4]
+        positions.append(row[1])
+        alleles.append([ref] + ([] if alt == '.' else alt.split(',')))
+        fields.append([row[i] for i in columns])
+        if len(positions) >= chunk_size:
+            yield positions, alleles, fields
+            positions, alleles, fields = [], [], []
+    if positions:
+        yield positions, alleles, fields
+
+
+def decode_chunk(alleles, fields):
+    """
+    Decode haploid calls for one chunk.
+
+    Returns (bases, n_distinct) where bases is an (n_sites x n_samples) object array of
+    called bases and n_distinct the number of different bases per site. Sites with a
+    missing call, a non-ACGT allele or an indel among the kept samples get n_distinct 0
+    (the equivalent of `snp-sites -c` dropping non-core columns).
+    """
+    n_sites = len(alleles)
+    # Allele index = text before the first '/', '|' or ':'; haploid calls are coded 0/0, 1/1, ...
+    raw = np.array(fields, dtype=np.bytes_)
+    width = raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(raw.shape + (width,))
+    first = chars[..., 0].astype(np.int16) - ord('0')
+    second = chars[..., 1] if width > 1 else np.zeros(raw.shape, dtype=np.uint8)
+    codes = np.where((first >= 0) & (first <= 9), first, -1)
+
+    # Rare multi-digit allele indices fall back to per-field parsing
+    for i in np.flatnonzero(((second >= ord('0')) & (second <= ord('9'))).any(axis=1)):
+        for j, field in enumerate(fields[i]):
+            gt = field.split(':', 1)[0].replace('|', '/').split('/')[0]
+            codes[i, j] = int(gt) if gt.isdigit() else -1
+
+    max_alleles = max(len(a) for a in alleles)
+    table = np.array([a + ['N'] * (max_alleles - len(a)) for a in alleles], dtype=object)
+    is_base = np.vectorize(lambda b: b in VALID_BASES, otypes=[bool])(table)
+
+    rows = np.arange(n_sites)[:, None]
+    called = (codes >= 0) & (codes < max_alleles)
+    safe = np.where(called, codes, 0)
+    core = called.all(axis=1) & is_base[rows, safe].all(axis=1)
+
+    present = np.zeros((n_sites, max_alleles), dtype=bool)
+    present[np.broadcast_to(rows, safe.shape), safe] = True
+    n_distinct = np.where(core, present.sum(axis=1), 0)
+    return table[rows, safe], n_distinct
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Write Bugwas biallelic and multiallelic genotype files directly from the merged VCF "
+            "in one streaming pass (replaces 0_cancat.py + snp-sites + sed/grep/cut + 0_prepare.py)"
+        )
+    )
+    parser.add_argument("--vcf", required=True, help="Merged panel VCF (.vcf or .vcf.gz)")
+    parser.add_argument("--id_file", default=None, help="Sample ID list, one per line (e.g., example/ID.txt)")
+    parser.add_argument("--pheno_file", default=None, help="Phenotype file; IDs are read from the first column")
+    parser.add_argument("--output_dir", required=True,
+                        help="Directory for geno_biallelic_SNP.txt and geno_multiallelic_SNP.txt")
+    parser.add_argument("--snp_fasta", default=None,
+                        help="Optional core-SNP FASTA (same sites as the multiallelic file) for tree building")
+    parser.add_argument("--chunk_size", type=int, default=20000, help="VCF records per chunk (default: 20000)")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    bi_path = os.path.join(args.output_dir, "geno_biallelic_SNP.txt")
+    multi_path = os.path.join(args.output_dir, "geno_multiallelic_SNP.txt")
+
+    try:
+        ids = read_ids(args.id_file, args.pheno_file)
+        snp_columns = []
+        n_bi = n_multi = n_records = 0
+
+        with open_text(args.vcf) as f_in, open(bi_path, 'w') as f_bi, open(multi_path, 'w') as f_multi:
+            # Locate the requested samples in the #CHROM header line
+            for line in f_in:
+                if line.startswith('#CHROM'):
+                    vcf_samples = line.rstrip('\n').split('\t')[9:]
+                    break
+            else:
+                raise ValueError("No #CHROM header line found in the VCF")
+            index = {s: i + 9 for i, s in enumerate(vcf_samples)}
+            missing = [s for s in ids if s not in index]
+            if missing:
+                print(f"Warning: {len(missing)} samples are not in the VCF and will be skipped: {missing[:10]}")
+            ids = [s for s in ids if s in index]
+            if not ids:
+                raise ValueError("None of the requested samples are present in the VCF")
+            columns = [index[s] for s in ids]
+
+            header = 'ps\t' + '\t'.join(ids) + '\n'
+            f_bi.write(header)
+            f_multi.write(header)
+
+            for positions, alleles, fields in iter_vcf_chunks(f_in, columns, args.chunk_size):
+                bases, n_distinct = decode_chunk(alleles, fields)
+                for i in np.flatnonzero(n_distinct >= 2):
+                    out = positions[i] + '\t' + '\t'.join(bases[i]) + '\n'
+                    f_multi.write(out)
+                    n_multi += 1
+                    if n_distinct[i] == 2:
+                        f_bi.write(out)
+                        n_bi += 1
+                if args.snp_fasta:
+                    snp_columns.append(bases[n_distinct >= 2].astype('S1'))
+                n_records += len(positions)
+                print(f"Processed {n_records} VCF records ({n_multi} core SNPs)")
+    except Exception as e:
+        print(f"Error converting VCF {args.vcf}: {e}")
+        sys.exit(1)
+
+    print(f"Wrote {n_bi} biallelic SNPs to {bi_path}")
+    print(f"Wrote {n_multi} SNPs to {multi_path}")
+
+    if args.snp_fasta:
+        matrix = np.concatenate(snp_columns) if snp_columns else np.empty((0, len(ids)), dtype='S1')
+        with open(args.snp_fasta, 'wb') as f_fa:
+            for j, sample in enumerate(ids):
+                f_fa.write(b'>' + sample.encode() + b'\n' + matrix[:, j].tobytes() + b'\n')
+        print(f"Wrote core-SNP alignment ({n_multi} sites x {len(ids)} samples) to {args.snp_fasta}")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,15 +12,29 @@ SCRIPT_DIR="12-GWAS/script"
 MERGE_FASTA_DIR="merge_fasta"
 PYTHON3="python3"
 VERYFASTTREE="VeryFastTree"
+CORE_SNPS="7-Phylogenetic_tree/script/7_core_snps.py"
+# Association engine: "bugwas" (R bugwas/GEMMA) or "python" (2_lmm.py, same output columns)
+GWAS_ENGINE="bugwas"
+# Merged panel VCF; when set, steps 1-2 and 4-6 are replaced by a single streaming pass
+PANEL_VCF=""
 
-# 1. Extract sequences for the target population
-python3 "$SCRIPT_DIR/0_cancat.py" \
-    "$INPUT_DIR/list.txt" \
-    "$MERGE_FASTA_DIR" \
-    "$INPUT_DIR/alignmentSub.aln"
-
-# 2. Extract SNP positions
-snp-sites -c -o "$INPUT_DIR/alignmentSub.temp" "$INPUT_DIR/alignmentSub.aln"
+if [[ -n "$PANEL_VCF" ]]; then
+    # 1-6. Genotype files and core-SNP alignment straight from the VCF, restricted to ID.txt/pheno.txt
+    ${PYTHON3} "$SCRIPT_DIR/0_vcf_prepare.py" \
+        --vcf "$PANEL_VCF" \
+        --id_file "$INPUT_DIR/ID.txt" \
+        --pheno_file "$INPUT_DIR/pheno.txt" \
+        --output_dir "$INPUT_DIR" \
+        --snp_fasta "$INPUT_DIR/alignmentSub.temp"
+else
+    # 1-2. Core SNPs straight from the per-sample FASTA files (no merged alignment, no snp-sites);
+    #      the same pass writes the core-SNP VCF used in step 5
+    ${PYTHON3} "$CORE_SNPS" \
+        --fasta_dir "$MERGE_FASTA_DIR" \
+        --ids "$INPUT_DIR/list.txt" \
+        --output_fasta "$INPUT_DIR/alignmentSub.temp" \
+        --vcf "$INPUT_DIR/tmp1.vcf"
+fi
 
 # 3. Build the phylogenetic tree
 nohup "$VERYFASTTREE" -nt -threads 16 \
@@ -28,22 +42,30 @@ nohup "$VERYFASTTREE" -nt -threads 16 \
     >"$INPUT_DIR/treeFull.nwk" \
     2>"$INPUT_DIR/treeFull.log" &
 
-# 4. Generate genotype file (VCF)
-snp-sites -c -v -o "$INPUT_DIR/tmp1.vcf" "$INPUT_DIR/alignmentSub.aln"
-
-# 5. Process the VCF file and extract required columns
-sed "s/#CHROM/CHROM/" "$INPUT_DIR/tmp1.vcf" \
-    | grep -v "#" | cut -f 2,4-5,10- | sed "1s/POS/ps/" \
-    >"$INPUT_DIR/tmp2.txt"
+if [[ -z "$PANEL_VCF" ]]; then
+    # 4. Genotype file (VCF): already written with the SNP alignment in step 1-2
+    # 5. Process the VCF file and extract required columns
+    sed "s/#CHROM/CHROM/" "$INPUT_DIR/tmp1.vcf" \
+        | grep -v "#" | cut -f 2,4-5,10- | sed "1s/POS/ps/" \
+        >"$INPUT_DIR/tmp2.txt"
 
-# 6. Create the bugwas input file (biallelic filter enabled by default)
-${PYTHON3} 0_prepare.py \
-    "$INPUT_DIR/tmp2.txt" \
-    --output_file "$INPUT_DIR/geno_biallelic_SNP.txt"
+    # 6. Create the bugwas input file (biallelic filter enabled by default)
+    ${PYTHON3} 0_prepare.py \
+        "$INPUT_DIR/tmp2.txt" \
+        --output_file "$INPUT_DIR/geno_biallelic_SNP.txt"
+fi
 
 
 # 7. Run GWAS analysis and post-processing (requires phenotype and metadata files)
-Rscript s5_analysis_GWAS.r
+if [[ "$GWAS_ENGINE" == "python" ]]; then
+    ${PYTHON3} "$SCRIPT_DIR/2_lmm.py" \
+        --geno_file "$INPUT_DIR/geno_biallelic_SNP.txt" \
+        --pheno_file "$INPUT_DIR/pheno.txt" \
+        --output "bugwas_biallelic_lmmout_allSNPs.txt" \
+        --threads 16
+else
+    Rscript s5_analysis_GWAS.r
+fi
 
 # Gene annotation example
 ${PYTHON3} 12-GWAS/script/3_annotation.py \
@@ -53,6 +75,16 @@ ${PYTHON3} 12-GWAS/script/3_annotation.py \
     --logp_threshold 5 \
     --dist_threshold 1
 
+# LD-aware clumping: one lead SNP (with CDS annotation) per locus
+${PYTHON3} 12-GWAS/script/4_clump.py \
+    --gwas_file "bugwas_biallelic_lmmout_allSNPs.txt" \
+    --geno_file "$INPUT_DIR/geno_biallelic_SNP.txt" \
+    --gff_file "NC_000915.gff" \
+    --output_dir "output" \
+    --logp_threshold 5 \
+    --window 10000 \
+    --r2_threshold 0.5
+
 # 8. Remove intermediate files (comment out to keep them)
 rm -f "$INPUT_DIR/tmp1.vcf" "$INPUT_DIR/alignmentSub.aln" "$INPUT_DIR/alignmentSub.temp"
 
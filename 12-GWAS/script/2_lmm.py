@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# Example:
+# python 12-GWAS/script/2_lmm.py \
+#     --geno_file example/geno_biallelic_SNP.txt \
+#     --pheno_file example/pheno.txt \
+#     --output lmm_biallelic_lmmout_allSNPs.txt \
+#     --threads 16
+#
+# Batch mode (all trait columns of a multi-column pheno.txt, one kinship):
+# python 12-GWAS/script/2_lmm.py \
+#     --geno_file example/geno_biallelic_SNP.txt \
+#     --pheno_file example/pheno.txt \
+#     --batch \
+#     --output_dir output/lmm_batch
+import os
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+from scipy import optimize, stats
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+# threadpoolctl is optional; without it BLAS uses its own default thread count
+try:
+    from threadpoolctl import threadpool_limits
+    _HAS_THREADPOOLCTL = True
+except Exception:
+    _HAS_THREADPOOLCTL = False
+
+
+def read_geno_header(geno_file):
+    with open(geno_file, 'r') as f:
+        return f.readline().split()[1:]
+
+
+def iter_genotype_chunks(geno_file, columns, chunk_size):
+    """
+    Stream a bugwas genotype file (ps, then one base per sample) in chunks.
+
+    Yields (positions, X) where X is a float32 (chunk x n_kept_samples) matrix coding
+    the minor base(s) as 1 and the major base as 0, for the sample columns in `columns`.
+    """
+    columns = np.asarray(columns)
+    with open(geno_file, 'r') as f:
+        next(f)  # Header
+        positions, rows = [], []
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            positions.append(int(tokens[0]))
+            rows.append(tokens[1:])
+            if len(rows) >= chunk_size:
+                yield np.array(positions), encode_minor(rows, columns)
+                positions, rows = [], []
+        if rows:
+            yield np.array(positions), encode_minor(rows, columns)
+
+
+def encode_minor(rows, columns):
+    bases = np.array(rows, dtype='S1').view(np.uint8)[:, columns]
+    counts = np.stack([(bases == ord(b)).sum(axis=1) for b in "ACGT"], axis=1)
+    major = np.frombuffer(b"ACGT", dtype=np.uint8)[counts.argmax(axis=1)]
+    return (bases != major[:, None]).astype(np.float32)
+
+
+def standardize_rows(X):
+    """
+    Centre and scale each SNP (row); monomorphic SNPs become zero rows.
+    Returns (Z, polymorphic mask).
+    """
+    mean = X.mean(axis=1, keepdims=True)
+    sd = X.std(axis=1, keepdims=True)
+    poly = sd[:, 0] > 0
+    Z = np.zeros_like(X)
+    Z[poly] = (X[poly] - mean[poly]) / sd[poly]
+    return Z, poly
+
+
+def compute_kinship(geno_file, columns, chunk_size):
+    """
+    Standardized-genotype relatedness K = Z'Z / m, accumulated block by block
+    with one BLAS rank-k update per chunk.
+    """
+    n = len(columns)
+    K = np.zeros((n, n), dtype=np.float64)
+    m = 0
+    for _, X in iter_genotype_chunks(geno_file, columns, chunk_size):
+        Z, poly = standardize_rows(X)
+        K += Z.T @ Z
+        m += int(poly.sum())
+    if m == 0:
+        raise ValueError("No polymorphic SNPs among the phenotyped samples")
+    return K / m, m
+
+
+def reml_loglik(log_delta, S, Uy, UW):
+    """
+    Restricted log-likelihood of the null model y = W b + g + e in the eigenbasis,
+    with delta = sigma_e^2 / sigma_g^2. Uy may hold several traits (n x t); returns one value per trait.
+    """
+    n, p = UW.shape
+    h = S + np.exp(log_delta)
+    w = 1.0 / h
+    WtW = UW.T @ (UW * w[:, None])
+    Wty = UW.T @ (Uy * w[:, None])
+    beta = np.linalg.solve(WtW, Wty)
+    resid = Uy - UW @ beta
+    sigma_g = (resid ** 2 * w[:, None]).sum(axis=0) / (n - p)
+    _, logdet_wtw = np.linalg.slogdet(WtW)
+    return -0.5 * ((n - p) * np.log(2 * np.pi * sigma_g) + np.log(h).sum() + logdet_wtw + (n - p))
+
+
+def fit_delta(S, Uy, UW, grid=np.linspace(-10, 10, 41)):
+    """
+    Maximise the REML likelihood over log(delta): coarse grid, then bounded refinement per trait.
+    """
+    ll = np.array([reml_loglik(g, S, Uy, UW) for g in grid])  # (grid, traits)
+    deltas = []
+    for t in range(Uy.shape[1]):
+        i = int(ll[:, t].argmax())
+        lo, hi = grid[max(i - 1, 0)], grid[min(i + 1, len(grid) - 1)]
+        res = optimize.minimize_scalar(
+            lambda g: -reml_loglik(g, S, Uy[:, [t]], UW)[0],
+            bounds=(lo, hi), method="bounded"
+        )
+        deltas.append(np.exp(res.x))
+    return np.array(deltas)
+
+
+def test_chunk(UX, Uy, Ua, w):
+    """
+    Wald test of every SNP in a chunk for every trait, with delta fixed at its null estimate.
+
+    UX: rotated genotypes (n x snps); Uy: rotated traits (n x traits); Ua: rotated intercept (n);
+    w: 1 / (S + delta) per trait (n x traits). The per-SNP 2x2 GLS systems are solved in closed
+    form from weighted cross-products computed as matrix-matrix products.
+    Returns beta, se, pvalue arrays of shape (snps x traits).
+    """
+    n = UX.shape[0]
+    aw = Ua[:, None] * w                                  # (n, t)
+    aa = (Ua[:, None] * aw).sum(axis=0)                   # (t,)
+    ay = (aw * Uy).sum(axis=0)                            # (t,)
+    yy = (Uy ** 2 * w).sum(axis=0)                        # (t,)
+    ab = UX.T @ aw                                        # (snps, t)
+    bb = (UX ** 2).T @ w                                  # (snps, t)
+    by = UX.T @ (Uy * w)                                  # (snps, t)
+
+    det = aa * bb - ab ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = (aa * by - ab * ay) / det
+        alpha = (bb * ay - ab * by) / det
+        rss = yy - alpha * ay - beta * by
+        sigma2 = rss / (n - 2)
+        se = np.sqrt(sigma2 * aa / det)
+        tstat = beta / se
+    pvalue = 2 * stats.t.sf(np.abs(tstat), df=n - 2)
+    return beta, se, pvalue
+
+
+def load_phenotypes(pheno_file, geno_samples, traits=None):
+    """
+    Read a tab-delimited phenotype file (ID column first, one column per trait) and align it
+    to the genotype file. Samples missing any requested trait are dropped.
+    Returns (trait names, phenotype matrix n x t, genotype column indices).
+    """
+    pheno = pd.read_csv(pheno_file, sep=r"\s+", dtype={0: str})
+    id_col = pheno.columns[0]
+    traits = traits or list(pheno.columns[1:])
+    missing = [t for t in traits if t not in pheno.columns]
+    if missing:
+        raise KeyError(f"Traits not found in {pheno_file}: {missing}")
+    pheno = pheno.dropna(subset=traits)
+    index = {s: i for i, s in enumerate(geno_samples)}
+    pheno = pheno[pheno[id_col].isin(index)]
+    if len(pheno) < 3:
+        raise ValueError("Fewer than 3 phenotyped samples are present in the genotype file")
+    columns = [index[s] for s in pheno[id_col]]
+    return traits, pheno[traits].to_numpy(dtype=np.float64), columns
+
+
+def prepare_null_model(geno_file, columns, Y, chunk_size):
+    """
+    Kinship, its eigendecomposition and the per-trait null-model fit, computed once.
+    """
+    t0 = time.perf_counter()
+    K, m = compute_kinship(geno_file, columns, chunk_size)
+    S, U = np.linalg.eigh(K)
+    S = np.clip(S, 0, None)
+    print(f"Kinship from {m} SNPs and eigendecomposition done in {time.perf_counter() - t0:.1f} s")
+
+    Ua = U.T @ np.ones(len(columns))
+    Uy = U.T @ Y
+    deltas = fit_delta(S, Uy, Ua[:, None])
+    return U, S, Ua, Uy, deltas
+
+
+def run_scan(geno_file, columns, model, chunk_size):
+    """
+    Yield (positions, beta, se, pvalue) for each genotype chunk.
+    """
+    U, S, Ua, Uy, deltas = model
+    w = 1.0 / (S[:, None] + deltas[None, :])
+    for positions, X in iter_genotype_chunks(geno_file, columns, chunk_size):
+        UX = U.T @ X.T.astype(np.float64)
+        beta, se, pvalue = test_chunk(UX, Uy, Ua, w)
+        yield positions, beta, se, pvalue
+
+
+def write_results(path, positions, beta, se, pvalue, header):
+    """
+    Append one chunk of results in lmmout_allSNPs-compatible columns.
+    """
+    with np.errstate(divide="ignore"):
+        neglog10 = -np.log10(pvalue)
+    pd.DataFrame({
+        'ps': positions,
+        'beta': beta,
+        'se': se,
+        'pvalue': pvalue,
+        'negLog10': neglog10,
+    }).to_csv(path, sep='\t', index=False, header=header, mode='w' if header else 'a')
+
+
+def plot_manhattan(path, positions, neglog10, traits, threshold):
+    """
+    One Manhattan panel per trait, stacked with a shared x axis.
+    """
+    fig, axes = plt.subplots(len(traits), 1, figsize=(12, 2.2 * len(traits)), sharex=True, squeeze=False)
+    for ax, trait, values in zip(axes[:, 0], traits, neglog10.T):
+        ax.scatter(positions, values, s=3, c="#71A48D", rasterized=True)
+        ax.axhline(threshold, color="#AB5962", linestyle="--", linewidth=1)
+        ax.set_ylabel("-log10(p)", fontsize=9)
+        ax.set_title(trait, fontsize=10, loc="left")
+        ax.grid(False)
+    axes[-1, 0].set_xlabel("Position")
+    axes[-1, 0].ticklabel_format(style="plain", axis="x")
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Linear mixed model GWAS (kinship + eigendecomposition computed once, SNPs tested in vectorized chunks). "
+                    "With --batch, every trait column is tested in the same pass over the genotypes."
+    )
+    parser.add_argument("--geno_file", required=True, help="Bugwas genotype file (e.g., geno_biallelic_SNP.txt)")
+    parser.add_argument("--pheno_file", required=True, help="Phenotype file: ID column, then one column per trait")
+    parser.add_argument("--trait", default=None, help="Trait column to test (default: the first trait column)")
+    parser.add_argument("--output", default=None, help="Output path (ps, beta, se, pvalue, negLog10)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Test all trait columns (or --traits) against one kinship; requires --output_dir")
+    parser.add_argument("--traits", default=None, help="Comma-separated trait columns for --batch (default: all)")
+    parser.add_argument("--output_dir", default=None,
+                        help="--batch output directory: <trait>_lmmout_allSNPs.txt per trait plus manhattan_summary.tsv/.pdf")
+    parser.add_argument("--logp_threshold", type=float, default=5,
+                        help="-log10(p) line and significance count in the batch summary (default: 5)")
+    parser.add_argument("--chunk_size", type=int, default=5000, help="SNPs per chunk (default: 5000)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="BLAS threads (requires threadpoolctl; default: BLAS default)")
+    args = parser.parse_args()
+    if args.batch and not args.output_dir:
+        parser.error("--batch requires --output_dir")
+    if not args.batch and not args.output:
+        parser.error("--output is required unless --batch is used")
+
+    if args.threads and not _HAS_THREADPOOLCTL:
+        print("Warning: threadpoolctl is not installed; --threads is ignored (set OMP_NUM_THREADS instead)",
+              file=sys.stderr)
+    limiter = threadpool_limits(limits=args.threads) if (args.threads and _HAS_THREADPOOLCTL) \
+        else contextlib.nullcontext()
+    with limiter:
+        if args.batch:
+            run_batch(args)
+        else:
+            run(args)
+
+
+def run(args):
+    geno_samples = read_geno_header(args.geno_file)
+    # Default to the first trait column; only samples missing this trait are dropped
+    trait = args.trait or pd.read_csv(args.pheno_file, sep=r"\s+", nrows=0).columns[1]
+    _, Y, columns = load_phenotypes(args.pheno_file, geno_samples, [trait])
+    print(f"Testing trait '{trait}' on {len(columns)} samples")
+
+    model = prepare_null_model(args.geno_file, columns, Y, args.chunk_size)
+    print(f"Null model: delta = sigma_e^2 / sigma_g^2 = {model[4][0]:.4g}")
+
+    t0 = time.perf_counter()
+    n_snps = 0
+    for positions, beta, se, pvalue in run_scan(args.geno_file, columns, model, args.chunk_size):
+        write_results(args.output, positions, beta[:, 0], se[:, 0], pvalue[:, 0], header=(n_snps == 0))
+        n_snps += len(positions)
+    elapsed = time.perf_counter() - t0
+    print(f"Tested {n_snps} SNPs in {elapsed:.1f} s ({n_snps / max(elapsed, 1e-9):.0f} SNPs/s). "
+          f"Results saved to: {args.output}")
+
+
+def run_batch(args):
+    """
+    Test several traits with one kinship/eigendecomposition and one pass over the genotype chunks.
+    Samples missing any of the selected traits are dropped so that all traits share the same kinship.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    geno_samples = read_geno_header(args.geno_file)
+    requested = [t.strip() for t in args.traits.split(",")] if args.traits else None
+    traits, Y, columns = load_phenotypes(args.pheno_file, geno_samples, requested)
+    print(f"Testing {len(traits)} traits on {len(columns)} samples")
+
+    model = prepare_null_model(args.geno_file, columns, Y, args.chunk_size)
+    for trait, delta in zip(traits, model[4]):
+        print(f"Null model '{trait}': delta = {delta:.4g}")
+
+    out_paths = [os.path.join(args.output_dir, f"{trait}_lmmout_allSNPs.txt") for trait in traits]
+    all_positions, all_logp = [], []
+    t0 = time.perf_counter()
+    n_snps = 0
+    for positions, beta, se, pvalue in run_scan(args.geno_file, columns, model, args.chunk_size):
+        for t, path in enumerate(out_paths):
+            write_results(path, positions, beta[:, t], se[:, t], pvalue[:, t], header=(n_snps == 0))
+        with np.errstate(divide="ignore"):
+            all_logp.append((-np.log10(pvalue)).astype(np.float32))
+        all_positions.append(positions)
+        n_snps += len(positions)
+    elapsed = time.perf_counter() - t0
+    print(f"Tested {n_snps} SNPs x {len(traits)} traits in {elapsed:.1f} s")
+
+    positions = np.concatenate(all_positions)
+    neglog10 = np.concatenate(all_logp)
+    finite = np.where(np.isfinite(neglog10), neglog10, np.nan)
+    lead = np.nanargmax(np.nan_to_num(finite, nan=-np.inf), axis=0)
+    summary = pd.DataFrame({
+        'trait': traits,
+        'delta': model[4],
+        'n_snps': n_snps,
+        'n_significant': (finite > args.logp_threshold).sum(axis=0),
+        'lead_ps': positions[lead],
+        'lead_negLog10': finite[lead, np.arange(len(traits))],
+        'result_file': out_paths,
+    })
+    summary_path = os.path.join(args.output_dir, "manhattan_summary.tsv")
+    summary.to_csv(summary_path, sep='\t', index=False)
+    plot_path = os.path.join(args.output_dir, "manhattan_summary.pdf")
+    plot_manhattan(plot_path, positions, finite, traits, args.logp_threshold)
+    print(f"Per-trait results, summary and Manhattan plots saved to: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
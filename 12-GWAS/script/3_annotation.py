@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import time
 import argparse
 import pandas as pd
 import numpy as np
@@ -8,6 +9,49 @@ def extract_product(attr_str):
     parts = attr_str.split("product=")
     return parts[1].split(";")[0] if len(parts) > 1 else None
 
+def overlap_join(positions, starts, ends, long_feature=50000):
+    """
+    Find all (SNP, feature) pairs with start < pos < end.
+
+    Features are sorted by start and, for each SNP, only features starting within
+    `long_feature` bp upstream are examined (located with np.searchsorted). The few
+    features longer than that are tested against every SNP directly.
+    Pairs are returned ordered by SNP index, then by feature index.
+
+    :return: (snp_idx, feature_idx) integer arrays
+    """
+    positions = np.asarray(positions)
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    lengths = ends - starts
+    snp_parts, feat_parts = [], []
+
+    short = np.flatnonzero(lengths <= long_feature)
+    if short.size and positions.size:
+        order = short[np.argsort(starts[short], kind="stable")]
+        sorted_starts = starts[order]
+        hi = np.searchsorted(sorted_starts, positions, side="left")  # start < pos
+        lo = np.searchsorted(sorted_starts, positions - long_feature, side="left")
+        counts = hi - lo
+        snp_idx = np.repeat(np.arange(positions.size), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        feat_idx = order[np.repeat(lo, counts) + offsets]
+        hit = ends[feat_idx] > positions[snp_idx]
+        snp_parts.append(snp_idx[hit])
+        feat_parts.append(feat_idx[hit])
+
+    for f in np.flatnonzero(lengths > long_feature):
+        snp_idx = np.flatnonzero((starts[f] < positions) & (ends[f] > positions))
+        snp_parts.append(snp_idx)
+        feat_parts.append(np.full(snp_idx.size, f))
+
+    if not snp_parts:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    snp_idx = np.concatenate(snp_parts)
+    feat_idx = np.concatenate(feat_parts)
+    keep = np.lexsort((feat_idx, snp_idx))
+    return snp_idx[keep], feat_idx[keep]
+
 def gwas_analysis(gwas_file, gff_file, output_dir, logp_threshold=5, dist_threshold=1000,
                   gwas_sep="\t", gff_sep="\t", gwas_header=0, gff_header=None):
     """
@@ -57,21 +101,10 @@ def gwas_analysis(gwas_file, gff_file, output_dir, logp_threshold=5, dist_thresh
                             names=['seqid', 'source', 'type', 'start', 'end', 'score',
                                    'strand', 'phase', 'attributes'])
 
-    # 7. Match each significant SNP to CDS annotations and record the negLog10 value
-    sig_CDS_list = []
-    for idx, snp_row in sig.iterrows():
-        pos = snp_row['ps']
-        current_logp = snp_row['logp']  # Track the current SNP -log10(p-value)
-        matched = gff_CDS.loc[(gff_CDS['start'] < pos) & (gff_CDS['end'] > pos)]
-        if not matched.empty:
-            matched = matched.copy()
-            matched['negLog10'] = current_logp
-            sig_CDS_list.append(matched)
-    if sig_CDS_list:
-        # Combine all matches
-        sigCDS_all = pd.concat(sig_CDS_list, ignore_index=True)
-    else:
-        sigCDS_all = pd.DataFrame(columns=list(gff_CDS.columns) + ['negLog10'])
+    # 7. Match each significant SNP to CDS annotations (sorted-interval join) and record the negLog10 value
+    snp_idx, feat_idx = overlap_join(sig['ps'].to_numpy(), gff_CDS['start'].to_numpy(), gff_CDS['end'].to_numpy())
+    sigCDS_all = gff_CDS.iloc[feat_idx].reset_index(drop=True)
+    sigCDS_all['negLog10'] = sig['logp'].to_numpy()[snp_idx]
 
     # 8. Extract product details from the attributes field
     sigCDS_all['product'] = sigCDS_all['attributes'].apply(extract_product)
@@ -90,22 +123,57 @@ def gwas_analysis(gwas_file, gff_file, output_dir, logp_threshold=5, dist_thresh
 
     print("Analysis complete. Results written to:", output_dir)
 
+def benchmark_overlap(gff_file, n_snps=100000, loop_sample=2000, gff_sep="\t", gff_header=None, seed=1):
+    """
+    Time overlap_join against the former per-SNP DataFrame filter on random positions.
+    The per-SNP loop is timed on `loop_sample` SNPs and extrapolated to n_snps.
+    """
+    gff = pd.read_csv(gff_file, sep=gff_sep, header=gff_header,
+                      names=['seqid', 'source', 'type', 'start', 'end', 'score',
+                             'strand', 'phase', 'attributes'])
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.integers(1, gff['end'].max() + 1, n_snps))
+
+    t0 = time.perf_counter()
+    snp_idx, feat_idx = overlap_join(positions, gff['start'].to_numpy(), gff['end'].to_numpy())
+    t_join = time.perf_counter() - t0
+
+    sample = positions[:loop_sample]
+    t0 = time.perf_counter()
+    n_loop = 0
+    for pos in sample:
+        n_loop += len(gff.loc[(gff['start'] < pos) & (gff['end'] > pos)])
+    t_loop = (time.perf_counter() - t0) * n_snps / len(sample)
+
+    assert n_loop == int((snp_idx < len(sample)).sum()), "overlap_join disagrees with the per-SNP filter"
+    print(f"{n_snps} SNPs x {len(gff)} features -> {len(snp_idx)} overlaps")
+    print(f"sorted-interval join: {t_join:.3f} s")
+    print(f"per-SNP filter (extrapolated from {len(sample)} SNPs): {t_loop:.1f} s")
+
 def main():
     parser = argparse.ArgumentParser(description="GWAS annotation helper that can be configured from shell variables")
-    parser.add_argument("--gwas_file", type=str, required=True, help="Path to the GWAS result file")
+    parser.add_argument("--gwas_file", type=str, default=None, help="Path to the GWAS result file")
     parser.add_argument("--gff_file", type=str, required=True, help="Path to the CDS annotation GFF file")
-    parser.add_argument("--output_dir", type=str, required=True, help="Output directory")
+    parser.add_argument("--output_dir", type=str, default=None, help="Output directory")
     parser.add_argument("--logp_threshold", type=float, default=5, help="-log10(p-value) filtering threshold (default: 5)")
     parser.add_argument("--dist_threshold", type=int, default=1000, help="Proximity threshold between SNPs in bp (default: 1000)")
     parser.add_argument("--gwas_sep", type=str, default="\t", help="GWAS file delimiter (default: tab)")
     parser.add_argument("--gff_sep", type=str, default="\t", help="GFF file delimiter (default: tab)")
     parser.add_argument("--gwas_header", type=int, default=0, help="Header argument for the GWAS file (default: 0)")
     parser.add_argument("--gff_header", type=str, default="None", help="Header argument for the GFF file; use None if there is no header")
+    parser.add_argument("--benchmark", type=int, default=0,
+                        help="Only benchmark the SNP/CDS join on this many random SNPs (e.g., 100000) and exit")
     args = parser.parse_args()
 
     # Convert gff_header argument when strings are used
     gff_header = None if args.gff_header == "None" else int(args.gff_header)
 
+    if args.benchmark:
+        benchmark_overlap(args.gff_file, args.benchmark, gff_sep=args.gff_sep, gff_header=gff_header)
+        return
+    if not args.gwas_file or not args.output_dir:
+        parser.error("--gwas_file and --output_dir are required")
+
     gwas_analysis(
         gwas_file=args.gwas_file,
         gff_file=args.gff_file,
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Example:
+# python 12-GWAS/script/4_clump.py \
+#     --gwas_file bugwas_biallelic_lmmout_allSNPs.txt \
+#     --geno_file example/geno_biallelic_SNP.txt \
+#     --gff_file NC_000915.gff \
+#     --output_dir output \
+#     --logp_threshold 5 \
+#     --window 10000 \
+#     --r2_threshold 0.5
+import os
+import sys
+import argparse
+import importlib
+import pandas as pd
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+annotation = importlib.import_module("3_annotation")
+
+
+def load_significant(gwas_file, logp_threshold, gwas_sep="\t"):
+    """
+    Read GWAS results and keep SNPs with finite -log10(p) above the threshold, sorted by position.
+    """
+    gwas_data = pd.read_csv(gwas_file, sep=gwas_sep)
+    if 'negLog10' in gwas_data.columns:
+        gwas_data['logp'] = gwas_data['negLog10']
+    elif 'pvalue' in gwas_data.columns:
+        gwas_data['logp'] = -np.log10(gwas_data['pvalue'])
+    else:
+        raise ValueError("The input file must contain either a 'negLog10' or 'pvalue' column.")
+    if 'ps' not in gwas_data.columns:
+        raise ValueError("Column 'ps' is required to determine SNP positions.")
+
+    gwas_data.replace([np.inf, -np.inf], np.nan, inplace=True)
+    sig = gwas_data.loc[(gwas_data['logp'] > logp_threshold) & (gwas_data['logp'].notna())]
+    return sig.sort_values('ps', kind='stable').reset_index(drop=True)
+
+
+def load_genotypes(geno_file, positions):
+    """
+    Stream a bugwas genotype file (ps, then one base per sample) and keep only `positions`.
+
+    Each kept SNP is coded 1 for its most common base and 0 otherwise.
+    Returns an (n_positions x n_samples) float32 matrix in the order of `positions`;
+    SNPs missing from the file are all-NaN rows. Positions are compared as integers, so
+    "1234.0" in the GWAS table matches 1234 in the genotype file; duplicate positions in
+    either file raise ValueError.
+    """
+    row_of = {}
+    for i, p in enumerate(positions):
+        p = int(p)
+        if p in row_of:
+            raise ValueError(f"Position {p} appears more than once among the significant SNPs")
+        row_of[p] = i
+    seen = set()
+    with open(geno_file, 'r') as f:
+        n_samples = len(f.readline().split()) - 1
+        matrix = np.full((len(positions), n_samples), np.nan, dtype=np.float32)
+        for line in f:
+            ps, _, rest = line.partition('\t')
+            if not ps.strip():
+                continue
+            ps = int(float(ps))
+            i = row_of.get(ps)
+            if i is None:
+                continue
+            if ps in seen:
+                raise ValueError(f"Position {ps} appears more than once in {geno_file}")
+            seen.add(ps)
+            bases = np.array(rest.split(), dtype='S1').view(np.uint8)
+            major = np.bincount(bases).argmax()
+            matrix[i] = bases == major
+    return matrix
+
+
+def standardize(matrix):
+    """
+    Centre and scale each SNP row so that r = dot(z_i, z_j) / n_samples.
+    Monomorphic or missing SNPs become all-zero rows (r = 0 with everything).
+    """
+    mean = matrix.mean(axis=1, keepdims=True)
+    sd = matrix.std(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (matrix - mean) / sd
+    return np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def clump(positions, logp, z, window, r2_threshold):
+    """
+    Greedy clumping: take the strongest unassigned SNP as lead, then assign every
+    unassigned SNP within `window` bp whose r^2 with the lead is >= r2_threshold.
+
+    Only SNPs inside the lead's window are compared, as one vectorized block.
+    Returns an array with the locus number (1-based) of every SNP.
+    """
+    n_samples = max(z.shape[1], 1)
+    locus = np.zeros(len(positions), dtype=np.int64)
+    order = np.argsort(-logp, kind="stable")
+    current = 0
+    for lead in order:
+        if locus[lead]:
+            continue
+        current += 1
+        locus[lead] = current
+        lo = np.searchsorted(positions, positions[lead] - window, side="left")
+        hi = np.searchsorted(positions, positions[lead] + window, side="right")
+        cand = np.arange(lo, hi)
+        cand = cand[locus[cand] == 0]
+        if cand.size == 0:
+            continue
+        r2 = (z[cand] @ z[lead] / n_samples) ** 2
+        locus[cand[r2 >= r2_threshold]] = current
+    return locus
+
+
+def annotate_leads(leads, gff_file, gff_sep="\t", gff_header=None):
+    """
+    Attach overlapping feature products (';'-joined) to each lead SNP.
+    """
+    gff = pd.read_csv(gff_file, sep=gff_sep, header=gff_header,
+                      names=['seqid', 'source', 'type', 'start', 'end', 'score',
+                             'strand', 'phase', 'attributes'])
+    snp_idx, feat_idx = annotation.overlap_join(leads['ps'].to_numpy(), gff['start'].to_numpy(), gff['end'].to_numpy())
+    hits = pd.DataFrame({
+        'lead': snp_idx,
+        'cds_start': gff['start'].to_numpy()[feat_idx],
+        'cds_end': gff['end'].to_numpy()[feat_idx],
+        'product': gff['attributes'].iloc[feat_idx].map(annotation.extract_product).to_numpy(),
+    }).dropna(subset=['product'])
+    joined = hits.groupby('lead').agg(
+        cds_start=('cds_start', 'min'),
+        cds_end=('cds_end', 'max'),
+        product=('product', lambda x: ';'.join(dict.fromkeys(x))),
+    )
+    return leads.join(joined, how='left')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Group significant GWAS SNPs into loci by distance and LD (r^2) and report one lead SNP per locus"
+    )
+    parser.add_argument("--gwas_file", type=str, required=True, help="Path to the GWAS result file (ps + negLog10/pvalue)")
+    parser.add_argument("--geno_file", type=str, required=True, help="Bugwas genotype file (e.g., geno_biallelic_SNP.txt)")
+    parser.add_argument("--gff_file", type=str, required=True, help="Path to the CDS annotation GFF file")
+    parser.add_argument("--output_dir", type=str, required=True, help="Output directory")
+    parser.add_argument("--logp_threshold", type=float, default=5, help="-log10(p-value) filtering threshold (default: 5)")
+    parser.add_argument("--window", type=int, default=10000, help="Maximum distance from the lead SNP in bp (default: 10000)")
+    parser.add_argument("--r2_threshold", type=float, default=0.5, help="Minimum r^2 with the lead SNP (default: 0.5)")
+    parser.add_argument("--gwas_sep", type=str, default="\t", help="GWAS file delimiter (default: tab)")
+    parser.add_argument("--gff_sep", type=str, default="\t", help="GFF file delimiter (default: tab)")
+    parser.add_argument("--gff_header", type=str, default="None", help="Header argument for the GFF file; use None if there is no header")
+    args = parser.parse_args()
+
+    gff_header = None if args.gff_header == "None" else int(args.gff_header)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    sig = load_significant(args.gwas_file, args.logp_threshold, args.gwas_sep)
+    if sig.empty:
+        print(f"No SNPs with -log10(p) > {args.logp_threshold}; nothing to clump.")
+        return
+
+    positions = sig['ps'].to_numpy()
+    z = standardize(load_genotypes(args.geno_file, positions))
+    n_missing = int((z == 0).all(axis=1).sum())
+    if n_missing:
+        print(f"Warning: {n_missing} significant SNPs are missing or monomorphic in {args.geno_file}; they form their own loci")
+
+    sig['locus'] = clump(positions, sig['logp'].to_numpy(), z, args.window, args.r2_threshold)
+
+    # One row per locus: the lead (highest -log10 p) SNP plus the span and size of the locus
+    lead_rows = sig.loc[sig.groupby('locus')['logp'].idxmax()]
+    span = sig.groupby('locus')['ps'].agg(locus_start='min', locus_end='max', n_snps='size')
+    leads = lead_rows[['locus', 'ps', 'logp']].set_index('locus').join(span).reset_index()
+    leads = annotate_leads(leads, args.gff_file, args.gff_sep, gff_header)
+    leads = leads.sort_values('logp', ascending=False)
+
+    loci_path = os.path.join(args.output_dir, "significantLoci.txt")
+    leads.to_csv(loci_path, sep='\t', index=False)
+    members_path = os.path.join(args.output_dir, "significantLociSNPs.txt")
+    sig.to_csv(members_path, sep='\t', index=False)
+
+    print(f"{len(sig)} significant SNPs grouped into {len(leads)} loci "
+          f"(window={args.window} bp, r2>={args.r2_threshold}). Results written to: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,23 @@ CONF_DIR="$PROJECT_DIR/conf"
 # Set path to merged VCF file (relative to project root)
 MERGED_VCF="$ROOT_DIR/1-nucmer/output/merge/merged_biallelic.7544.vcf.gz"
 
+# Split engine: "python" (1-split_vcf.py, one pass over the merged VCF for all regions)
+# or "bcftools" (one bcftools view -S per sample list)
+SPLIT_ENGINE="python"
+
 # Ensure output directory exists
 mkdir -p "$DATA_DIR"
 
+if [[ "$SPLIT_ENGINE" == "python" ]]; then
+    python3 "$SCRIPT_DIR/1-split_vcf.py" \
+        --vcf "$MERGED_VCF" \
+        --conf_dir "$CONF_DIR" \
+        --output_dir "$DATA_DIR" \
+        --threads 8 || exit 1
+    echo "All VCF files have been generated!"
+    exit 0
+fi
+
 # Use GNU parallel for parallel processing
 find "$CONF_DIR" -name "*.txt" | \
 parallel -j 8 'bcftools view -S {} -Oz -o '"$DATA_DIR"'/$(basename {} .txt).vcf.gz '"$MERGED_VCF"
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Split the merged VCF into all region VCFs in one pass (replaces one `bcftools view -S` per
+# sample list in 1-Split_VCF.sh, each of which decompresses and parses the whole merged file).
+#
+# The merged VCF is read once. For every line, the columns of each region (conf/<region>.txt, in
+# list order) are selected and INFO/AC and INFO/AN are recalculated for that subset, as bcftools
+# view -S does. Each region has its own BGZF writer (data/<region>.vcf.gz, readable by bcftools and
+# tabix); 64 KB blocks are compressed on a shared thread pool and written in order.
+#
+# Example:
+# python 1-split_vcf.py \
+#     --vcf ../../1-nucmer/output/merge/merged_biallelic.7544.vcf.gz \
+#     --conf_dir ../conf \
+#     --output_dir ../data \
+#     --threads 8
+
+import argparse
+import importlib.util
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+import numpy as np
+
+_spec = importlib.util.spec_from_file_location(
+    "variant_stats", os.path.join(os.path.dirname(os.path.abspath(__file__)), "2-variant_stats.py"))
+variant_stats = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(variant_stats)
+
+BLOCK_SIZE = 65280  # Uncompressed bytes per BGZF block, as in htslib
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+AC_HEADER = '##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count in genotypes">\n'
+AN_HEADER = '##INFO=<ID=AN,Number=1,Type=Integer,Description="Total number of alleles in called genotypes">\n'
+
+
+def bgzf_block(data, level):
+    """
+    One BGZF block: a gzip member whose BC extra field holds the block size minus one.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    if len(cdata) > 65536 - 26:  # Incompressible data; store it instead
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+    header = struct.pack('<4BI2BH2BHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<II', zlib.crc32(data), len(data))
+
+
+class BGZFWriter:
+    """
+    BGZF file written through <path>.tmp; blocks are compressed on pool and written in order.
+    """
+
+    def __init__(self, path, pool, level=6, max_pending=64):
+        self.path = path
+        self.pool = pool
+        self.level = level
+        self.max_pending = max_pending
+        self.handle = open(path + ".tmp", 'wb')
+        self.buffer = bytearray()
+        self.pending = deque()
+
+    def write(self, text):
+        self.buffer += text.encode()
+        while len(self.buffer) >= BLOCK_SIZE:
+            self._submit(bytes(self.buffer[:BLOCK_SIZE]))
+            del self.buffer[:BLOCK_SIZE]
+
+    def _submit(self, data):
+        self.pending.append(self.pool.submit(bgzf_block, data, self.level))
+        while self.pending and (self.pending[0].done() or len(self.pending) > self.max_pending):
+            self.handle.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.handle.write(self.pending.popleft().result())
+        self.handle.write(BGZF_EOF)
+        self.handle.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def discard(self):
+        for future in self.pending:
+            future.cancel()
+        self.handle.close()
+        if os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+
+def region_columns(samples, regions, force_samples=False):
+    """
+    {region: [column indices into the sample columns]} in sample-list order.
+    """
+    index = {s: i for i, s in enumerate(samples)}
+    columns = {}
+    for name, ids in regions.items():
+        missing = [s for s in ids if s not in index]
+        if missing and not force_samples:
+            raise ValueError(f"{len(missing)} samples of {name} are not in the VCF, e.g. {missing[:3]}; "
+                             f"use --force_samples to skip them")
+        if missing:
+            print(f"Warning: skipping {len(missing)} samples of {name} that are not in the VCF")
+        columns[name] = [index[s] for s in ids if s in index]
+    return columns
+
+
+def column_getter(cols):
+    """
+    Callable selecting cols from a row as a tuple (itemgetter returns a bare item for one index).
+    """
+    if len(cols) > 1:
+        return itemgetter(*cols)
+    return lambda row: tuple(row[i] for i in cols)
+
+
+def set_ac_an(info, ac, an):
+    """
+    INFO string with AC and AN replaced (or added in front of the other keys).
+    """
+    kept = [kv for kv in info.split(';') if kv != '.' and not kv.startswith(('AC=', 'AN='))]
+    return ';'.join([f"AC={ac}", f"AN={an}"] + kept)
+
+
+def allele_counts(gts, n_alt):
+    """
+    Per-ALT allele counts and AN of a list of sample columns (multi-allelic sites).
+    """
+    counts = [0] * (n_alt + 1)
+    an = 0
+    for gt in gts:
+        for allele in gt.split(':', 1)[0].replace('|', '/').split('/'):
+            if allele.isdigit():
+                an += 1
+                if int(allele) <= n_alt:
+                    counts[int(allele)] += 1
+    return ','.join(map(str, counts[1:])), an
+
+
+def write_chunk(chunk, names, columns, getters, writers, no_update):
+    """
+    Subset one chunk of split VCF rows to every region and hand the text to its writer.
+    """
+    samples = [row[9:] for row in chunk]
+    if not no_update:
+        alt, called = variant_stats.decode_counts(np.array(samples, dtype='S3'))
+        multi = [i for i, row in enumerate(chunk) if ',' in row[4]]
+    for name in names:
+        getter = getters[name]
+        if not no_update:
+            cols = columns[name]
+            ac = alt[:, cols].sum(axis=1, dtype=np.int64).tolist()
+            an = called[:, cols].sum(axis=1, dtype=np.int64).tolist()
+            for i in multi:
+                ac[i], an[i] = allele_counts(getter(samples[i]), chunk[i][4].count(',') + 1)
+        lines = []
+        for i, row in enumerate(chunk):
+            info = row[7] if no_update else set_ac_an(row[7], ac[i], an[i])
+            lines.append('\t'.join(row[:7]) + '\t' + info + '\t' + row[8] + '\t' + '\t'.join(getter(samples[i])))
+        writers[name].write('\n'.join(lines) + '\n')
+    return len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write one BGZF VCF per region sample list from a single pass over the merged VCF"
+    )
+    parser.add_argument("--vcf", required=True, help="Merged multi-sample VCF (.vcf or .vcf.gz)")
+    parser.add_argument("--conf_dir", required=True, help="Directory of <region>.txt sample lists")
+    parser.add_argument("--output_dir", required=True, help="Output directory for <region>.vcf.gz")
+    parser.add_argument("--threads", type=int, default=8, help="Compression threads (default: 8)")
+    parser.add_argument("--level", type=int, default=6, help="Compression level 1-9 (default: 6)")
+    parser.add_argument("--chunk_size", type=int, default=2000, help="Sites decoded per chunk (default: 2000)")
+    parser.add_argument("--force_samples", action="store_true",
+                        help="Skip listed samples missing from the VCF instead of failing (as bcftools)")
+    parser.add_argument("--no_update", action="store_true",
+                        help="Do not recalculate INFO/AC and INFO/AN (as bcftools view -I)")
+    args = parser.parse_args()
+
+    writers = {}
+    try:
+        regions = variant_stats.read_regions(args.conf_dir)
+        os.makedirs(args.output_dir, exist_ok=True)
+        t0 = time.perf_counter()
+        with variant_stats.open_text(args.vcf) as f_in, \
+                ThreadPoolExecutor(max_workers=max(1, args.threads)) as pool:
+            meta = []
+            for line in f_in:
+                if line.startswith('#CHROM'):
+                    header = line.rstrip('\n').split('\t')
+                    break
+                meta.append(line)
+            else:
+                raise ValueError("No #CHROM header line found in the VCF")
+            if not args.no_update:
+                if not any(m.startswith('##INFO=<ID=AC,') for m in meta):
+                    meta.append(AC_HEADER)
+                if not any(m.startswith('##INFO=<ID=AN,') for m in meta):
+                    meta.append(AN_HEADER)
+            columns = region_columns(header[9:], regions, args.force_samples)
+
+            names = list(regions)
+            getters = {}
+            for name in names:
+                getters[name] = column_getter(columns[name])
+                writers[name] = BGZFWriter(os.path.join(args.output_dir, f"{name}.vcf.gz"), pool, args.level)
+                writers[name].write(''.join(meta) + '\t'.join(header[:9] + [header[9 + i] for i in columns[name]]) + '\n')
+
+            n_sites = 0
+            chunk = []
+            for line in f_in:
+                chunk.append(line.rstrip('\n').split('\t'))
+                if len(chunk) < args.chunk_size:
+                    continue
+                n_sites += write_chunk(chunk, names, columns, getters, writers, args.no_update)
+                chunk = []
+                if n_sites % (args.chunk_size * 50) == 0:
+                    print(f"Processed {n_sites} sites ({time.perf_counter() - t0:.1f} s)")
+            if chunk:
+                n_sites += write_chunk(chunk, names, columns, getters, writers, args.no_update)
+
+            for name in names:
+                writers.pop(name).close()
+    except (IOError, ValueError) as e:
+        for writer in writers.values():
+            writer.discard()
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Split {n_sites} sites into {len(names)} region VCFs in {time.perf_counter() - t0:.1f} s: "
+          + ", ".join(f"{n} ({len(columns[n])} samples)" for n in names))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 #!/bin/bash
+# See 2-variant_stats.py for a single-pass version that reads the merged VCF directly
+# and stores the Venn membership as bitsets.
 
 # Set working directories based on script location
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" &> /dev/null && pwd)"
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Per-region variant frequency classes from the merged panel in one pass (replaces the bcftools
+# query + awk loop of 2-Variant_count.sh; no per-region VCFs from 1-Split_VCF.sh are needed).
+#
+# The merged VCF is read once in chunks of sites. Genotypes become an ALT-count matrix and a
+# called-allele matrix (sites x samples); multiplying them by the sample-to-region membership
+# matrix gives AC and AN of every site in every region at once. A site is a variant of a region
+# when its AC there is > 0; it is then classified as in 2-Variant_count.sh:
+#   Common MAF > 0.05, Low_Frequency 0.01 < MAF <= 0.05, Rare MAF <= 0.01,
+#   Singleton AC = 1, Doubleton AC = 2, Private = variant in this region only.
+#
+# Venn membership is kept as one bit per site and region (venn_bits.npz); overlaps are
+# popcounts of bitwise ANDs, and every exclusive Venn cell is counted from per-site region codes.
+#
+# Example:
+# python 2-variant_stats.py \
+#     --vcf ../../1-nucmer/output/merge/merged_biallelic.7544.vcf.gz \
+#     --conf_dir ../conf \
+#     --output_dir ../output
+
+import argparse
+import glob
+import gzip
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+CLASSES = ["all", "common", "low", "rare", "singleton", "doubleton", "private"]
+SUMMARY_COLUMNS = ["Region", "Total_Variants", "Common", "Low_Frequency", "Rare", "Singleton", "Doubleton", "Private"]
+MAX_VENN_REGIONS = 16  # 2^16 exclusive cells
+
+if hasattr(np, "bitwise_count"):
+    def popcount(bits):
+        return int(np.bitwise_count(bits).sum())
+else:
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(bits):
+        return int(_POPCOUNT8[bits].sum())
+
+
+def open_text(path):
+    return gzip.open(path, 'rt') if path.endswith(('.gz', '.bgz')) else open(path, 'r')
+
+
+def read_regions(conf_dir):
+    """
+    {region: [sample IDs]} from the <region>.txt sample lists in conf_dir.
+    """
+    regions = {}
+    for path in sorted(glob.glob(os.path.join(conf_dir, "*.txt"))):
+        with open(path, 'r') as f:
+            samples = [line.strip() for line in f if line.strip()]
+        if samples:
+            regions[os.path.splitext(os.path.basename(path))[0]] = samples
+    if not regions:
+        raise ValueError(f"No sample lists (*.txt) found in {conf_dir}")
+    return regions
+
+
+def membership_matrix(samples, regions):
+    """
+    (n_samples x n_regions) float32 0/1 matrix; samples outside every region are all-zero rows.
+    """
+    index = {s: i for i, s in enumerate(samples)}
+    M = np.zeros((len(samples), len(regions)), dtype=np.float32)
+    for r, (name, ids) in enumerate(regions.items()):
+        found = [index[s] for s in ids if s in index]
+        if len(found) < len(ids):
+            print(f"Warning: {len(ids) - len(found)} samples of {name} are not in the VCF")
+        M[found, r] = 1
+    return M
+
+
+def iter_vcf_chunks(f_in, chunk_size):
+    """
+    Yield (site_ids, genotype_prefixes) per chunk; the header must already be consumed.
+
+    Only the first three characters of each sample column are kept: the GT of a haploid
+    ('0', '1', '.') or single-digit diploid ('0/1', '1|1') call.
+    """
+    ids, gts = [], []
+    for line in f_in:
+        row = line.rstrip('\n').split('\t', 9)
+        ids.append(f"{row[0]}_{row[1]}_{row[3]}_{row[4]}")
+        gts.append(row[9].split('\t'))
+        if len(ids) >= chunk_size:
+            yield ids, np.array(gts, dtype='S3')
+            ids, gts = [], []
+    if ids:
+        yield ids, np.array(gts, dtype='S3')
+
+
+def decode_counts(gts):
+    """
+    ALT1 allele counts and called-allele counts per call, both uint8 (sites x samples).
+    """
+    chars = np.ascontiguousarray(gts).view(np.uint8).reshape(gts.shape + (3,))
+    a1, sep, a2 = chars[..., 0], chars[..., 1], chars[..., 2]
+    diploid = (sep == ord('/')) | (sep == ord('|'))
+    called1 = (a1 >= ord('0')) & (a1 <= ord('9'))
+    called2 = diploid & (a2 >= ord('0')) & (a2 <= ord('9'))
+    alt = (a1 == ord('1')).astype(np.uint8) + (diploid & (a2 == ord('1'))).astype(np.uint8)
+    called = called1.astype(np.uint8) + called2.astype(np.uint8)
+    return alt, called
+
+
+def classify(ac, an):
+    """
+    Boolean (sites x regions) masks for every class in CLASSES from per-region AC/AN.
+    """
+    present = (ac > 0) & (an > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        af = np.where(an > 0, ac / an, 0.0)
+    maf = np.minimum(af, 1 - af)
+    return {
+        "all": present,
+        "common": present & (maf > 0.05),
+        "low": present & (maf > 0.01) & (maf <= 0.05),
+        "rare": present & (maf <= 0.01),
+        "singleton": present & (ac == 1),
+        "doubleton": present & (ac == 2),
+        "private": present & (present.sum(axis=1) == 1)[:, None],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-region AC/AN, frequency classes and bitset Venn membership from a merged VCF in one pass"
+    )
+    parser.add_argument("--vcf", required=True, help="Merged multi-sample VCF (.vcf or .vcf.gz)")
+    parser.add_argument("--conf_dir", required=True, help="Directory of <region>.txt sample lists")
+    parser.add_argument("--output_dir", required=True, help="Output directory")
+    parser.add_argument("--chunk_size", type=int, default=20000, help="Sites per chunk (default: 20000)")
+    parser.add_argument("--id_lists", action="store_true",
+                        help="Also write venn_data/<region>_<class>.txt ID lists like 2-Variant_count.sh")
+    args = parser.parse_args()
+    # Whole bytes per chunk so packed bitsets of consecutive chunks can be concatenated
+    chunk_size = max(8, args.chunk_size - args.chunk_size % 8)
+
+    try:
+        regions = read_regions(args.conf_dir)
+        names = list(regions)
+        os.makedirs(args.output_dir, exist_ok=True)
+        t0 = time.perf_counter()
+
+        with open_text(args.vcf) as f_in:
+            for line in f_in:
+                if line.startswith('#CHROM'):
+                    samples = line.rstrip('\n').split('\t')[9:]
+                    break
+            else:
+                raise ValueError("No #CHROM header line found in the VCF")
+            M = membership_matrix(samples, regions)
+            in_region = M.any(axis=1)
+            M = M[in_region]   # only the samples of some region take part in the products
+
+            sites = []
+            packed = {c: [] for c in CLASSES}
+            venn_codes = {c: np.zeros(1 << len(names), dtype=np.int64) for c in CLASSES} \
+                if len(names) <= MAX_VENN_REGIONS else None
+            weights = (1 << np.arange(len(names))).astype(np.int64)
+            for ids, gts in iter_vcf_chunks(f_in, chunk_size):
+                alt, called = decode_counts(gts[:, in_region])
+                ac = np.rint(alt @ M).astype(np.int64)      # (sites x regions), exact for counts < 2^24
+                an = np.rint(called @ M).astype(np.int64)
+                masks = classify(ac, an)
+                for c in CLASSES:
+                    packed[c].append(np.packbits(masks[c], axis=0, bitorder='little'))
+                    if venn_codes is not None:
+                        venn_codes[c] += np.bincount(masks[c] @ weights, minlength=len(venn_codes[c]))
+                sites.extend(ids)
+                print(f"Processed {len(sites)} sites ({time.perf_counter() - t0:.1f} s)")
+
+        # Bitsets: (regions x bytes) per class, bit i of the site axis = sites[i]
+        bits = {c: np.ascontiguousarray(np.concatenate(packed[c], axis=0).T) for c in CLASSES}
+
+        # Summary table in the layout of 2-Variant_count.sh
+        labels = {"all": "Total_Variants", "common": "Common", "low": "Low_Frequency", "rare": "Rare",
+                  "singleton": "Singleton", "doubleton": "Doubleton", "private": "Private"}
+        summary = pd.DataFrame({"Region": names})
+        for c in CLASSES:
+            summary[labels[c]] = [popcount(bits[c][r]) for r in range(len(names))]
+        summary = summary[SUMMARY_COLUMNS]
+        summary_path = os.path.join(args.output_dir, "variant_summary.tsv")
+        summary.to_csv(summary_path, sep='\t', index=False)
+        with open(os.path.join(args.output_dir, "variant_summary_formatted.tsv"), 'w') as f:
+            f.write(summary.to_string(index=False) + "\n")
+
+        # Pairwise overlaps: popcount(bits_i & bits_j)
+        rows = []
+        for c in CLASSES:
+            for i in range(len(names)):
+                for j in range(i, len(names)):
+                    rows.append((c, names[i], names[j], popcount(np.bitwise_and(bits[c][i], bits[c][j]))))
+        pd.DataFrame(rows, columns=["Class", "Region_A", "Region_B", "Shared"]).to_csv(
+            os.path.join(args.output_dir, "venn_pairwise.tsv"), sep='\t', index=False)
+
+        # Exclusive Venn cells: sites whose region membership is exactly the listed set
+        if venn_codes is not None:
+            rows = []
+            for c in CLASSES:
+                for code in np.flatnonzero(venn_codes[c][1:]) + 1:
+                    members = [n for r, n in enumerate(names) if code >> r & 1]
+                    rows.append((c, "&".join(members), len(members), int(venn_codes[c][code])))
+            pd.DataFrame(rows, columns=["Class", "Regions", "N_Regions", "Count"]).to_csv(
+                os.path.join(args.output_dir, "venn_counts.tsv"), sep='\t', index=False)
+        else:
+            print(f"Warning: more than {MAX_VENN_REGIONS} regions; venn_counts.tsv is skipped")
+
+        bits_path = os.path.join(args.output_dir, "venn_bits.npz")
+        with open(bits_path + ".tmp", 'wb') as f:
+            np.savez_compressed(f, regions=np.array(names), classes=np.array(CLASSES),
+                                sites=np.array(sites), n_sites=len(sites), **bits)
+        os.replace(bits_path + ".tmp", bits_path)
+
+        if args.id_lists:
+            venn_dir = os.path.join(args.output_dir, "venn_data")
+            os.makedirs(venn_dir, exist_ok=True)
+            site_array = np.array(sites, dtype=object)
+            for c in CLASSES:
+                for r, name in enumerate(names):
+                    member = np.unpackbits(bits[c][r], bitorder='little', count=len(sites)).astype(bool)
+                    with open(os.path.join(venn_dir, f"{name}_{c}.txt"), 'w') as f:
+                        f.writelines(s + "\n" for s in site_array[member])
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(summary.to_string(index=False))
+    print(f"Finished {len(sites)} sites x {len(names)} regions in {time.perf_counter() - t0:.1f} s; "
+          f"results in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PCA on a VCF without the PLINK round-trip
+-----------------------------------------
+This script does the following:
+1. Stream the VCF in chunks and code each variant as ALT-allele dosage (missing = -1).
+2. LD-prune with a sliding window of r^2 (like `plink --indep-pairwise <window> <step> <r2>`):
+   a variant is dropped when its r^2 with an earlier kept variant less than `window`
+   variants away on the same chromosome exceeds the threshold.
+3. Compute the top-k principal components with a randomized SVD whose matrix products
+   standardize the stored int8 genotypes chunk by chunk, so the full standardized matrix
+   is never built.
+4. Write PLINK-compatible `.eigenvec` / `.eigenval` / `.prune.in` files, a `.pca_model.npz`
+   with the SNP loadings, means and scales and, optionally, run UMAP on the components in
+   the same process (see UMAP.py).
+5. `project` subcommand: place new samples from a VCF onto a stored model without refitting.
+
+Example usage:
+    python 0-PCA.py \
+        --vcf ../cleaned.vcf.gz \
+        --out_prefix ../filtered_PCA/hpglobal_LD_PCA \
+        --n_pcs 20 \
+        --window 50 \
+        --r2 0.1 \
+        --umap_output ../filtered_PCA/UMAP.csv \
+        --umap_model ../filtered_PCA/UMAP.joblib
+
+    python 0-PCA.py project \
+        --model ../filtered_PCA/hpglobal_LD_PCA.pca_model.npz \
+        --vcf new_isolates.vcf.gz \
+        --output new_isolates.eigenvec \
+        --umap_model ../filtered_PCA/UMAP.joblib \
+        --umap_output new_isolates_UMAP.csv
+"""
+
+import argparse
+import gzip
+import importlib.util
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def parse_args(argv=None):
+    """
+    Parse command-line arguments.
+
+    Returns
+    -------
+    argparse.Namespace
+        Input/output paths, pruning and PCA settings, optional UMAP settings.
+    """
+    parser = argparse.ArgumentParser(
+        description="LD-pruned randomized PCA from a VCF, written as PLINK-style .eigenvec/.eigenval"
+    )
+    parser.add_argument("--vcf", required=True, help="Input VCF (.vcf or .vcf.gz)")
+    parser.add_argument("--out_prefix", required=True,
+                        help="Output prefix (<prefix>.eigenvec, .eigenval, .prune.in, .pca_model.npz)")
+    parser.add_argument("--n_pcs", type=int, default=20, help="Number of principal components (default 20)")
+    parser.add_argument("--window", type=int, default=50, help="LD window in variants (default 50)")
+    parser.add_argument("--r2", type=float, default=0.1, help="LD r^2 threshold (default 0.1)")
+    parser.add_argument("--maf", type=float, default=0.0,
+                        help="Minimum minor allele frequency (default 0: drop monomorphic only)")
+    parser.add_argument("--chunk_size", type=int, default=10000, help="Variants per chunk (default 10000)")
+    parser.add_argument("--oversample", type=int, default=10,
+                        help="Extra random vectors for the randomized SVD (default 10)")
+    parser.add_argument("--power_iter", type=int, default=7,
+                        help="Power iterations; more sharpens the trailing PCs (default 7)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default 42)")
+    parser.add_argument("--umap_output", default=None,
+                        help="Optional: also run UMAP on the PCs and save FID/IID/V1/V2 to this CSV")
+    parser.add_argument("--umap_model", default=None,
+                        help="Optional: also run UMAP and save the fitted reducer here for `project`")
+    parser.add_argument("--umap_n_pcs", type=int, default=10, help="PCs passed to UMAP (default 10)")
+    parser.add_argument("--n_neighbors", type=int, default=10, help="UMAP n_neighbors (default 10)")
+    parser.add_argument("--min_dist", type=float, default=0.1, help="UMAP min_dist (default 0.1)")
+    args = parser.parse_args(argv)
+    if args.window < 2:
+        parser.error("--window must be at least 2")
+    if (args.umap_output or args.umap_model) and args.umap_n_pcs > args.n_pcs:
+        parser.error("--umap_n_pcs cannot exceed --n_pcs")
+    return args
+
+
+def parse_project_args(argv=None):
+    """
+    Parse arguments of the `project` subcommand.
+
+    Returns
+    -------
+    argparse.Namespace
+        Stored model, new-sample VCF, output paths and optional UMAP model.
+    """
+    parser = argparse.ArgumentParser(
+        prog="0-PCA.py project",
+        description="Project new samples from a VCF onto a stored PCA model (and optionally its UMAP)"
+    )
+    parser.add_argument("--model", required=True, help="<prefix>.pca_model.npz written by a previous run")
+    parser.add_argument("--vcf", required=True, help="VCF with the new samples (.vcf or .vcf.gz)")
+    parser.add_argument("--output", required=True,
+                        help="PC scores of the new samples in .eigenvec layout (FID IID PC1 ... PCk)")
+    parser.add_argument("--chunk_size", type=int, default=10000, help="Variants per chunk (default 10000)")
+    parser.add_argument("--umap_model", default=None, help="Optional: fitted reducer from --umap_model")
+    parser.add_argument("--umap_output", default=None,
+                        help="CSV with FID/IID/V1/V2 of the new samples (requires --umap_model)")
+    args = parser.parse_args(argv)
+    if bool(args.umap_model) != bool(args.umap_output):
+        parser.error("--umap_model and --umap_output must be given together")
+    return args
+
+
+def open_text(path):
+    return gzip.open(path, 'rt') if path.endswith(('.gz', '.bgz')) else open(path, 'r')
+
+
+def iter_vcf_chunks(f_in, chunk_size):
+    """
+    Yield (chroms, ids, genotype_fields) for chunks of VCF records; the header must be consumed.
+    Variants without an ID get CHROM:POS, as with `plink --set-missing-var-ids @:#`.
+    """
+    chroms, ids, fields = [], [], []
+    for line in f_in:
+        row = line.rstrip('\n').split('\t')
+        chroms.append(row[0])
+        ids.append(row[2] if row[2] != '.' else f"{row[0]}:{row[1]}")
+        fields.append(row[9:])
+        if len(ids) >= chunk_size:
+            yield chroms, ids, fields
+            chroms, ids, fields = [], [], []
+    if ids:
+        yield chroms, ids, fields
+
+
+def decode_dosage(fields):
+    """
+    ALT1 dosage per call: 0/1 for haploid calls, 0/1/2 for diploid calls.
+
+    Missing calls and other ALT alleles are -1. Returns (dosage int8, ploidy per variant).
+    """
+    raw = np.array(fields, dtype=np.bytes_)
+    width = raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(raw.shape + (width,))
+
+    def allele(col):
+        if col >= width:
+            return np.full(raw.shape, -1, dtype=np.int16)
+        d = chars[..., col].astype(np.int16) - ord('0')
+        return np.where((d >= 0) & (d <= 9), d, -1)
+
+    a1 = allele(0)
+    sep = chars[..., 1] if width > 1 else np.zeros(raw.shape, dtype=np.uint8)
+    diploid = (sep == ord('/')) | (sep == ord('|'))
+    a2 = np.where(diploid, allele(2), 0)
+    # Multi-digit allele indices are never ALT1; treat them as missing
+    multi = (allele(1) >= 0) | (diploid & (allele(3) >= 0))
+    valid = (a1 >= 0) & (a1 <= 1) & (a2 >= 0) & (a2 <= 1) & ~multi
+    dosage = np.where(valid, a1 + a2, -1).astype(np.int8)
+    ploidy = np.where(diploid.any(axis=1), 2, 1)
+    return dosage, ploidy
+
+
+def standardize(dosage, mean, scale):
+    """
+    (dosage - mean) / scale with missing calls set to 0 (mean imputation), as float32.
+    """
+    z = (dosage.astype(np.float32) - mean[:, None]) / scale[:, None]
+    z[dosage < 0] = 0.0
+    return z
+
+
+class LDPruner:
+    """
+    Streaming windowed r^2 pruning.
+
+    Keeps the last window-1 candidate variants (standardized, with their keep flag and
+    chromosome) so windows continue across chunk boundaries.
+    """
+
+    def __init__(self, n_samples, window, r2_threshold):
+        self.window = window
+        self.r2_threshold = r2_threshold
+        self.n_samples = n_samples
+        self.prev_z = np.zeros((window - 1, n_samples), dtype=np.float32)
+        self.prev_keep = np.zeros(window - 1, dtype=bool)
+        self.prev_chrom = np.full(window - 1, None, dtype=object)
+
+    def prune(self, z, chroms):
+        """
+        Return the keep mask for a chunk of standardized variants (in genomic order).
+        """
+        lag_max = self.window - 1
+        n_prev = lag_max
+        all_z = np.vstack([self.prev_z, z])
+        all_chrom = np.concatenate([self.prev_chrom, np.asarray(chroms, dtype=object)])
+        c = len(z)
+
+        # r^2 of each new variant with each of the window-1 variants before it
+        conflict = np.zeros((c, lag_max), dtype=bool)
+        for lag in range(1, lag_max + 1):
+            r = np.einsum('ij,ij->i', all_z[n_prev:], all_z[n_prev - lag:n_prev - lag + c]) / self.n_samples
+            same_chrom = all_chrom[n_prev:] == all_chrom[n_prev - lag:n_prev - lag + c]
+            conflict[:, lag - 1] = (r * r > self.r2_threshold) & same_chrom
+
+        keep = np.concatenate([self.prev_keep, np.zeros(c, dtype=bool)])
+        lags = np.arange(1, lag_max + 1)
+        for j in range(c):
+            row = conflict[j]
+            keep[n_prev + j] = not (row.any() and keep[n_prev + j - lags[row]].any())
+
+        self.prev_z = all_z[-lag_max:].copy()
+        self.prev_keep = keep[-lag_max:].copy()
+        self.prev_chrom = all_chrom[-lag_max:].copy()
+        return keep[n_prev:]
+
+
+def read_and_prune(vcf, geno_path, window, r2_threshold, maf, chunk_size):
+    """
+    Stream the VCF, filter and LD-prune it, and store kept dosages as int8 rows in geno_path.
+
+    Returns
+    -------
+    tuple
+        (samples, kept_ids, mean, scale): sample IDs, kept variant IDs and the
+        per-variant standardization used for PCA.
+    """
+    with open_text(vcf) as f_in:
+        for line in f_in:
+            if line.startswith('#CHROM'):
+                samples = line.rstrip('\n').split('\t')[9:]
+                break
+        else:
+            raise ValueError("No #CHROM header line found in the VCF")
+
+        pruner = LDPruner(len(samples), window, r2_threshold)
+        kept_ids, means, scales = [], [], []
+        n_seen = 0
+        with open(geno_path, 'wb') as f_geno:
+            for chroms, ids, fields in iter_vcf_chunks(f_in, chunk_size):
+                dosage, ploidy = decode_dosage(fields)
+                called = dosage >= 0
+                n_called = called.sum(axis=1)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    mean = np.where(called, dosage, 0).sum(axis=1) / n_called
+                    var = np.where(called, (dosage - mean[:, None]) ** 2, 0).sum(axis=1) / n_called
+                freq = mean / ploidy
+                ok = (n_called > 0) & (var > 0) & (np.minimum(freq, 1 - freq) >= maf)
+
+                idx = np.flatnonzero(ok)
+                mean, scale = mean[idx].astype(np.float32), np.sqrt(var[idx]).astype(np.float32)
+                z = standardize(dosage[idx], mean, scale)
+                keep = pruner.prune(z, [chroms[i] for i in idx])
+
+                f_geno.write(np.ascontiguousarray(dosage[idx[keep]]).tobytes())
+                kept_ids.extend(ids[i] for i in idx[keep])
+                means.append(mean[keep])
+                scales.append(scale[keep])
+                n_seen += len(ids)
+                logging.info(f"Read {n_seen} variants, {len(kept_ids)} kept after filtering and LD pruning")
+
+    mean = np.concatenate(means) if means else np.empty(0, dtype=np.float32)
+    scale = np.concatenate(scales) if scales else np.empty(0, dtype=np.float32)
+    return samples, kept_ids, mean, scale
+
+
+def randomized_pca(geno, mean, scale, n_pcs, oversample=10, power_iter=7, chunk_size=10000, seed=42):
+    """
+    Top principal components of the standardized (variants x samples) genotype matrix Z.
+
+    Z is only formed chunk by chunk inside the products Z @ Q and Z.T @ B.
+
+    Returns
+    -------
+    tuple
+        (eigenvectors (n_samples x n_pcs), eigenvalues of Z.T Z / n_variants).
+    """
+    m, n = geno.shape
+    rank = min(n_pcs + oversample, n, m)
+    rng = np.random.default_rng(seed)
+
+    def z_chunks():
+        for start in range(0, m, chunk_size):
+            stop = min(start + chunk_size, m)
+            yield start, stop, standardize(np.asarray(geno[start:stop]), mean[start:stop], scale[start:stop])
+
+    def z_times(Q):
+        out = np.empty((m, Q.shape[1]), dtype=np.float32)
+        for start, stop, z in z_chunks():
+            out[start:stop] = z @ Q
+        return out
+
+    def zt_times(B):
+        out = np.zeros((n, B.shape[1]), dtype=np.float64)
+        for start, stop, z in z_chunks():
+            out += z.T @ B[start:stop]
+        return out
+
+    # Range finder on the sample side with power iterations (orthonormalized each round)
+    Q, _ = np.linalg.qr(rng.standard_normal((n, rank)))
+    for _ in range(power_iter + 1):
+        Q, _ = np.linalg.qr(zt_times(z_times(Q.astype(np.float32))))
+
+    B = z_times(Q.astype(np.float32)).astype(np.float64)   # Z Q, (m x rank)
+    eigval, W = np.linalg.eigh(B.T @ B)
+    order = np.argsort(eigval)[::-1][:n_pcs]
+    vectors = Q @ W[:, order]
+    # Fix the arbitrary sign so that the largest loading of each PC is positive
+    signs = np.sign(vectors[np.abs(vectors).argmax(axis=0), np.arange(vectors.shape[1])])
+    return vectors * signs, eigval[order] / m
+
+
+def pca_loadings(geno, mean, scale, vectors, values, chunk_size=10000):
+    """
+    SNP loadings P = Z V / (n_variants * eigenvalue), one row per kept variant.
+
+    With Z = U S V.T this is U / S, so P.T @ z gives the PC scores of a standardized sample z
+    on the same scale as the .eigenvec rows (a training sample maps exactly onto its own row).
+    """
+    m = geno.shape[0]
+    weights = (vectors / (values * m)).astype(np.float32)
+    loadings = np.empty((m, vectors.shape[1]), dtype=np.float32)
+    for start in range(0, m, chunk_size):
+        stop = min(start + chunk_size, m)
+        z = standardize(np.asarray(geno[start:stop]), mean[start:stop], scale[start:stop])
+        loadings[start:stop] = z @ weights
+    return loadings
+
+
+def save_model(path, samples, kept_ids, mean, scale, loadings, values):
+    """
+    Store everything `project` needs in one .npz, replaced atomically.
+    """
+    with open(path + ".tmp", 'wb') as f:
+        np.savez(
+            f, ids=np.array(kept_ids), samples=np.array(samples), mean=mean, scale=scale,
+            loadings=loadings, eigenval=values
+        )
+    os.replace(path + ".tmp", path)
+
+
+def project_vcf(vcf, model, chunk_size=10000):
+    """
+    PC scores of the samples in a VCF under a stored model.
+
+    Variants are matched to the model by ID (CHROM:POS when the ID is missing), standardized
+    with the model's means and scales and accumulated chunk by chunk. Model variants absent
+    from the VCF, and missing calls, contribute 0 (mean imputation).
+
+    Returns
+    -------
+    tuple
+        (samples, scores (n_samples x n_pcs), number of model variants found).
+    """
+    model_ids = model['ids']
+    row_of = {vid: i for i, vid in enumerate(model_ids.tolist())}
+    mean, scale, loadings = model['mean'], model['scale'], model['loadings']
+    used = np.zeros(len(model_ids), dtype=bool)
+
+    with open_text(vcf) as f_in:
+        for line in f_in:
+            if line.startswith('#CHROM'):
+                samples = line.rstrip('\n').split('\t')[9:]
+                break
+        else:
+            raise ValueError("No #CHROM header line found in the VCF")
+
+        scores = np.zeros((len(samples), loadings.shape[1]), dtype=np.float64)
+        for chroms, ids, fields in iter_vcf_chunks(f_in, chunk_size):
+            sel, rows = [], []
+            for i, vid in enumerate(ids):
+                r = row_of.get(vid, -1)
+                if r >= 0 and not used[r]:
+                    used[r] = True
+                    sel.append(i)
+                    rows.append(r)
+            if not rows:
+                continue
+            dosage, _ = decode_dosage([fields[i] for i in sel])
+            rows = np.array(rows)
+            z = standardize(dosage, mean[rows], scale[rows])
+            scores += z.T @ loadings[rows]
+    return samples, scores, int(used.sum())
+
+
+def write_eigenvec(path, samples, vectors):
+    """
+    PLINK 1.9 layout: FID IID PC1 ... PCk (no header); --double-id style FID = IID.
+    """
+    eigenvec = pd.DataFrame(vectors, columns=[f'PC{i}' for i in range(1, vectors.shape[1] + 1)])
+    eigenvec.insert(0, 'IID', samples)
+    eigenvec.insert(0, 'FID', samples)
+    eigenvec.to_csv(path, sep=' ', header=False, index=False, float_format='%.6g')
+
+
+def load_umap_module():
+    """
+    Import UMAP.py from this directory by path; a plain `import UMAP` can resolve to the
+    umap package on case-insensitive file systems.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "UMAP.py")
+    spec = importlib.util.spec_from_file_location("umap_stage", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def project_main(argv):
+    """
+    `project` subcommand: PC (and optionally UMAP) coordinates of new samples.
+    """
+    args = parse_project_args(argv)
+    t0 = time.perf_counter()
+    with np.load(args.model) as model:
+        model = dict(model)
+    samples, scores, n_found = project_vcf(args.vcf, model, args.chunk_size)
+    n_model = len(model['ids'])
+    logging.info(f"Projected {len(samples)} samples using {n_found}/{n_model} model variants "
+                 f"in {time.perf_counter() - t0:.1f} s")
+    if n_found < 0.9 * n_model:
+        logging.warning("More than 10% of the model variants are absent from the VCF; "
+                        "projected scores are shrunk towards the origin")
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    write_eigenvec(args.output, samples, scores)
+    logging.info(f"PC scores saved to {args.output}")
+
+    if args.umap_model:
+        umap_stage = load_umap_module()
+        embedding = umap_stage.project(umap_stage.load_model(args.umap_model), scores)
+        pd.DataFrame({
+            'FID': samples,
+            'IID': samples,
+            'V1': embedding[:, 0],
+            'V2': embedding[:, 1]
+        }).to_csv(args.umap_output, index=False)
+        logging.info(f"UMAP coordinates saved to {args.umap_output}")
+
+
+def main():
+    """
+    Main entry point: prune, run PCA, write PLINK-style outputs and optional UMAP.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    if len(sys.argv) > 1 and sys.argv[1] == "project":
+        project_main(sys.argv[2:])
+        return
+    args = parse_args()
+    out_dir = os.path.dirname(args.out_prefix)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    geno_path = args.out_prefix + ".geno.tmp"
+    try:
+        t0 = time.perf_counter()
+        samples, kept_ids, mean, scale = read_and_prune(
+            args.vcf, geno_path, args.window, args.r2, args.maf, args.chunk_size
+        )
+        if not kept_ids:
+            raise ValueError("No variants left after filtering and LD pruning")
+        logging.info(f"Pruning finished in {time.perf_counter() - t0:.1f} s: "
+                     f"{len(kept_ids)} variants x {len(samples)} samples")
+
+        geno = np.memmap(geno_path, dtype=np.int8, mode='r', shape=(len(kept_ids), len(samples)))
+        t1 = time.perf_counter()
+        n_pcs = min(args.n_pcs, len(samples), len(kept_ids))
+        vectors, values = randomized_pca(
+            geno, mean, scale, n_pcs, args.oversample, args.power_iter, args.chunk_size, args.seed
+        )
+        logging.info(f"Randomized PCA ({n_pcs} PCs) finished in {time.perf_counter() - t1:.1f} s")
+        loadings = pca_loadings(geno, mean, scale, vectors, values, args.chunk_size)
+        del geno
+    finally:
+        if os.path.exists(geno_path):
+            os.remove(geno_path)
+
+    write_eigenvec(args.out_prefix + ".eigenvec", samples, vectors)
+    np.savetxt(args.out_prefix + ".eigenval", values, fmt='%.6g')
+    with open(args.out_prefix + ".prune.in", 'w') as f:
+        f.write('\n'.join(kept_ids) + '\n')
+    save_model(args.out_prefix + ".pca_model.npz", samples, kept_ids, mean, scale, loadings, values)
+    logging.info(f"Results saved to {args.out_prefix}.eigenvec/.eigenval/.prune.in/.pca_model.npz")
+
+    if args.umap_output or args.umap_model:
+        umap_stage = load_umap_module()
+        reducer = umap_stage.fit_umap(
+            vectors[:, :args.umap_n_pcs], n_neighbors=args.n_neighbors, min_dist=args.min_dist,
+            random_state=args.seed
+        )
+        embedding = reducer.embedding_
+        if args.umap_model:
+            umap_stage.save_model(reducer, args.umap_model, args.umap_n_pcs)
+            logging.info(f"UMAP model saved to {args.umap_model}")
+        if args.umap_output:
+            pd.DataFrame({
+                'FID': samples,
+                'IID': samples,
+                'V1': embedding[:, 0],
+                'V2': embedding[:, 1]
+            }).to_csv(args.umap_output, index=False)
+            logging.info(f"UMAP results saved to {args.umap_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,21 @@ mkdir -p "$OUTPUT_DIR"
 PLINK_PREFIX="${OUTPUT_DIR}/filtered"
 PCA_OUTPUT_DIR="../filtered_PCA"
 mkdir -p "$PCA_OUTPUT_DIR"
+# PCA engine: "plink" (bed conversion + --indep-pairwise + --pca) or "python" (0-PCA.py, same .eigenvec layout)
+PCA_ENGINE="plink"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+if [[ "$PCA_ENGINE" == "python" ]]; then
+    echo "Running streaming LD pruning and randomized PCA in Python"
+    python3 "${SCRIPT_DIR}/0-PCA.py" \
+        --vcf "$INPUT_VCF" \
+        --out_prefix "${PCA_OUTPUT_DIR}/hpglobal_LD_PCA" \
+        --n_pcs 20 \
+        --window 50 \
+        --r2 0.1
+    echo "PCA analysis completed! All output files are saved in ${PCA_OUTPUT_DIR}/"
+    exit 0
+fi
 
 # Convert VCF to PLINK binary format
 echo "Converting VCF to PLINK binary format"
@@ -7,7 +7,8 @@ This script does the following:
 1. Read the first n principal components (PCs) per sample from a PLINK .eigenvec file.
 2. Run UMAP on the selected PCs to reduce them to two dimensions.
 3. Compute and print the variance and variance explained for the two dimensions (V1, V2).
-4. Optionally save the results to CSV.
+4. Optionally save the results to CSV and the fitted reducer for later projection.
+5. `project` subcommand: place new samples (a .eigenvec on the same PCs) onto a saved embedding.
 
 Example usage:
     python hpglobal_umap.py \
@@ -16,6 +17,26 @@ Example usage:
         --n_neighbors 10 \
         --min_dist 0.1 \
         --output result.csv
+
+Sweep mode (one kNN graph shared by every parameter combination):
+    python UMAP.py \
+        --input /path/to/hpglobal_LD_PCA.eigenvec \
+        --n_pcs 10 \
+        --sweep \
+        --n_neighbors_grid 5,10,15,30,50 \
+        --min_dist_grid 0.0,0.1,0.25,0.5 \
+        --processes 8 \
+        --output umap_sweep.csv
+
+Projection of new samples onto a saved embedding (PCs from `0-PCA.py project`):
+    python UMAP.py \
+        --input /path/to/hpglobal_LD_PCA.eigenvec \
+        --save_model UMAP.joblib \
+        --output result.csv
+    python UMAP.py project \
+        --model UMAP.joblib \
+        --input new_isolates.eigenvec \
+        --output new_isolates_UMAP.csv
 """
 # Input file sample, raw PLINK .eigenvec output without further edits:
 # SAMPLE1 SAMPLE1 0.123456 0.234567 0.345678 ...
@@ -24,11 +45,20 @@ Example usage:
 
 import argparse
 import logging
+import sys
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 
+import joblib
 import numpy as np
 import pandas as pd
+from sklearn.metrics import pairwise_distances
+from sklearn.utils import check_random_state
 from umap import UMAP
+from umap.umap_ import nearest_neighbors
+
+# Below this many samples UMAP computes exact neighbours itself; the sweep does the same
+SMALL_DATA = 4096
 
 
 def parse_args():
@@ -63,7 +93,65 @@ def parse_args():
         "--output", "-o", default=None,
         help="Optional CSV output path"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--sweep", action="store_true",
+        help="Run every combination of --n_neighbors_grid x --min_dist_grid "
+             "and write one long-format CSV keyed by the parameters"
+    )
+    parser.add_argument(
+        "--n_neighbors_grid", default="5,10,15,30,50",
+        help="Comma-separated n_neighbors values for --sweep (default 5,10,15,30,50)"
+    )
+    parser.add_argument(
+        "--min_dist_grid", default="0.0,0.1,0.25,0.5",
+        help="Comma-separated min_dist values for --sweep (default 0.0,0.1,0.25,0.5)"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=4,
+        help="Worker processes for --sweep layouts (default 4)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42,
+        help="UMAP random_state (default 42)"
+    )
+    parser.add_argument(
+        "--save_model", default=None,
+        help="Optional path to save the fitted reducer for the `project` subcommand"
+    )
+    args = parser.parse_args()
+    if args.sweep and not args.output:
+        parser.error("--sweep requires --output")
+    if args.sweep and args.save_model:
+        parser.error("--save_model is not available with --sweep")
+    return args
+
+
+def parse_project_args(argv=None):
+    """
+    Parse arguments of the `project` subcommand.
+
+    Returns
+    -------
+    argparse.Namespace
+        Saved model, input .eigenvec of the new samples and output path.
+    """
+    parser = argparse.ArgumentParser(
+        prog="UMAP.py project",
+        description="Place new samples onto a saved UMAP embedding with transform()"
+    )
+    parser.add_argument(
+        "--model", "-m", required=True,
+        help="Reducer saved with --save_model (or 0-PCA.py --umap_model)"
+    )
+    parser.add_argument(
+        "--input", "-i", required=True,
+        help=".eigenvec of the new samples on the same PCs (e.g. from 0-PCA.py project)"
+    )
+    parser.add_argument(
+        "--output", "-o", required=True,
+        help="CSV output path (FID, IID, V1, V2)"
+    )
+    return parser.parse_args(argv)
 
 
 def read_eigenvec(path: str) -> pd.DataFrame:
@@ -81,7 +169,7 @@ def read_eigenvec(path: str) -> pd.DataFrame:
         DataFrame with columns ['FID', 'IID', 'PC1', 'PC2', …].
     """
     # First two columns are FID/IID, remaining columns are PCs
-    df = pd.read_csv(path, delim_whitespace=True, header=None)
+    df = pd.read_csv(path, sep=r'\s+', header=None)
     n_pcs = df.shape[1] - 2
     cols = ['FID', 'IID'] + [f'PC{i}' for i in range(1, n_pcs + 1)]
     df.columns = cols
@@ -91,14 +179,15 @@ def read_eigenvec(path: str) -> pd.DataFrame:
     return df
 
 
-def run_umap(
+def fit_umap(
     X: np.ndarray,
     n_neighbors: int = 10,
     min_dist: float = 0.1,
-    random_state: int = 42
-) -> np.ndarray:
+    random_state: int = 42,
+    precomputed_knn: tuple = None
+) -> UMAP:
     """
-    Run UMAP on matrix X and reduce to two dimensions.
+    Fit UMAP on matrix X with two output dimensions.
 
     Parameters
     ----------
@@ -110,11 +199,14 @@ def run_umap(
         UMAP min_dist parameter.
     random_state : int
         Random seed for reproducibility.
+    precomputed_knn : tuple, optional
+        (knn_indices, knn_dists, search_index) with exactly n_neighbors columns,
+        e.g. from compute_knn(); skips the nearest-neighbour search.
 
     Returns
     -------
-    numpy.ndarray
-        Array of reduced coordinates with shape (n_samples, 2).
+    umap.UMAP
+        Fitted reducer; the coordinates are in `embedding_`.
     """
     reducer = UMAP(
         n_neighbors=n_neighbors,
@@ -122,11 +214,147 @@ def run_umap(
         n_components=2,
         metric='euclidean',
         init='spectral',
-        random_state=random_state
+        random_state=random_state,
+        precomputed_knn=precomputed_knn if precomputed_knn is not None else (None, None, None)
     )
-    embedding = reducer.fit_transform(X)
+    reducer.fit(X)
     logging.info("UMAP dimensionality reduction finished")
-    return embedding
+    return reducer
+
+
+def run_umap(
+    X: np.ndarray,
+    n_neighbors: int = 10,
+    min_dist: float = 0.1,
+    random_state: int = 42,
+    precomputed_knn: tuple = None
+) -> np.ndarray:
+    """
+    Run UMAP on matrix X and reduce to two dimensions.
+
+    Same parameters as fit_umap().
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of reduced coordinates with shape (n_samples, 2).
+    """
+    return fit_umap(X, n_neighbors, min_dist, random_state, precomputed_knn).embedding_
+
+
+def save_model(reducer: UMAP, path: str, n_pcs: int):
+    """
+    Save a fitted reducer with the number of PCs it was trained on.
+    """
+    joblib.dump({'reducer': reducer, 'n_pcs': n_pcs}, path)
+
+
+def load_model(path: str) -> dict:
+    """
+    Load a model written by save_model().
+    """
+    return joblib.load(path)
+
+
+def project(model: dict, X: np.ndarray) -> np.ndarray:
+    """
+    Coordinates of new samples on a saved embedding; the training layout is not changed.
+
+    Parameters
+    ----------
+    model : dict
+        Output of load_model().
+    X : numpy.ndarray
+        PC scores of the new samples with at least model['n_pcs'] columns.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of coordinates with shape (n_samples, 2).
+    """
+    n_pcs = model['n_pcs']
+    if X.shape[1] < n_pcs:
+        raise ValueError(f"The model was fitted on {n_pcs} PCs but the input has {X.shape[1]}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        return model['reducer'].transform(np.asarray(X[:, :n_pcs], dtype=np.float32))
+
+
+def compute_knn(X: np.ndarray, n_neighbors: int, random_state: int = 42) -> tuple:
+    """
+    Nearest-neighbour graph for the largest n_neighbors of a sweep.
+
+    Neighbours are sorted by distance, so the graph for any smaller n_neighbors is a
+    column slice. Small inputs use exact distances, as UMAP itself does.
+
+    Returns
+    -------
+    tuple
+        (knn_indices, knn_dists) with shape (n_samples, n_neighbors).
+    """
+    # UMAP works in float32; computing the graph on the same values keeps results identical
+    X = np.asarray(X, dtype=np.float32)
+    if X.shape[0] < SMALL_DATA:
+        dmat = pairwise_distances(X, metric='euclidean')
+        knn_indices = np.argsort(dmat, axis=1)[:, :n_neighbors]
+        knn_dists = np.take_along_axis(dmat, knn_indices, axis=1)
+    else:
+        knn_indices, knn_dists, _ = nearest_neighbors(
+            X, n_neighbors, 'euclidean', {}, False, check_random_state(random_state)
+        )
+    logging.info(f"kNN graph computed once for n_neighbors={n_neighbors}")
+    return knn_indices, knn_dists
+
+
+_SWEEP = {}
+
+
+def _init_sweep_worker(X, knn_indices, knn_dists):
+    """
+    Keep the shared inputs in each worker process so tasks only carry parameters.
+    """
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=UserWarning)
+    _SWEEP.update(X=X, knn_indices=knn_indices, knn_dists=knn_dists)
+
+
+def _sweep_task(params):
+    n_neighbors, min_dist, random_state = params
+    knn = (
+        np.ascontiguousarray(_SWEEP['knn_indices'][:, :n_neighbors]),
+        np.ascontiguousarray(_SWEEP['knn_dists'][:, :n_neighbors]),
+        None
+    )
+    embedding = run_umap(_SWEEP['X'], n_neighbors, min_dist, random_state, precomputed_knn=knn)
+    return n_neighbors, min_dist, embedding
+
+
+def run_sweep(
+    X: np.ndarray,
+    n_neighbors_grid: list,
+    min_dist_grid: list,
+    processes: int = 4,
+    random_state: int = 42
+):
+    """
+    Run UMAP for every (n_neighbors, min_dist) pair, reusing one kNN graph.
+
+    Yields
+    ------
+    tuple
+        (n_neighbors, min_dist, embedding) in grid order (n_neighbors outer, min_dist inner);
+        runs execute in parallel, but results are yielded in submission order.
+    """
+    knn_indices, knn_dists = compute_knn(X, max(n_neighbors_grid), random_state)
+    grid = [(k, d, random_state) for k in n_neighbors_grid for d in min_dist_grid]
+    with ProcessPoolExecutor(
+        max_workers=max(1, processes),
+        initializer=_init_sweep_worker,
+        initargs=(X, knn_indices, knn_dists)
+    ) as pool:
+        for n_neighbors, min_dist, embedding in pool.map(_sweep_task, grid):
+            logging.info(f"Finished n_neighbors={n_neighbors}, min_dist={min_dist}")
+            yield n_neighbors, min_dist, embedding
 
 
 def compute_variance_explained(embedding: np.ndarray) -> tuple:
@@ -155,6 +383,23 @@ def compute_variance_explained(embedding: np.ndarray) -> tuple:
     return v1_var, v2_var, ratio1, ratio2
 
 
+def project_main(argv):
+    """
+    `project` subcommand: transform new samples with a saved reducer.
+    """
+    args = parse_project_args(argv)
+    model = load_model(args.model)
+    df = read_eigenvec(args.input)
+    embedding = project(model, df.iloc[:, 2:].values)
+    pd.DataFrame({
+        'FID': df['FID'],
+        'IID': df['IID'],
+        'V1': embedding[:, 0],
+        'V2': embedding[:, 1]
+    }).to_csv(args.output, index=False)
+    logging.info(f"Projected {len(df)} samples; results saved to {args.output}")
+
+
 def main():
     """
     Main entry point to read data, run UMAP, and print the results.
@@ -168,6 +413,10 @@ def main():
     warnings.filterwarnings("ignore", category=FutureWarning)
     warnings.filterwarnings("ignore", category=UserWarning)
 
+    if len(sys.argv) > 1 and sys.argv[1] == "project":
+        project_main(sys.argv[2:])
+        return
+
     args = parse_args()
 
     # Load data
@@ -177,12 +426,41 @@ def main():
     pcs = [f'PC{i}' for i in range(1, args.n_pcs + 1)]
     X = df.loc[:, pcs].values
 
+    if args.sweep:
+        n_neighbors_grid = sorted({int(v) for v in args.n_neighbors_grid.split(',')})
+        min_dist_grid = sorted({float(v) for v in args.min_dist_grid.split(',')})
+        if max(n_neighbors_grid) >= X.shape[0]:
+            raise ValueError(f"n_neighbors must be smaller than the number of samples ({X.shape[0]})")
+        frames = []
+        for n_neighbors, min_dist, embedding in run_sweep(
+            X, n_neighbors_grid, min_dist_grid, args.processes, args.seed
+        ):
+            frames.append(pd.DataFrame({
+                'n_neighbors': n_neighbors,
+                'min_dist': min_dist,
+                'FID': df['FID'],
+                'IID': df['IID'],
+                'V1': embedding[:, 0],
+                'V2': embedding[:, 1]
+            }))
+        long_df = pd.concat(frames, ignore_index=True)
+        long_df.to_csv(args.output, index=False)
+        logging.info(
+            f"Sweep of {len(frames)} parameter combinations saved to {args.output}"
+        )
+        return
+
     # Run UMAP
-    embedding = run_umap(
+    reducer = fit_umap(
         X,
         n_neighbors=args.n_neighbors,
-        min_dist=args.min_dist
+        min_dist=args.min_dist,
+        random_state=args.seed
     )
+    embedding = reducer.embedding_
+    if args.save_model:
+        save_model(reducer, args.save_model, args.n_pcs)
+        logging.info(f"UMAP model saved to {args.save_model}")
 
     # Build the output DataFrame
     out_df = pd.DataFrame({
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Direct VCF -> FASTA conversion (replaces plink --recode, the .ped awk loop,
+# 6_vcf2fasta_plink.py renaming and 6_vcf2fasta_plink_0toN.py in one pass).
+#
+# Example:
+# python 6_vcf2fasta.py \
+#     --vcf ./output/Archive/merge/merged_clean_filtered.N_removehot.vcf.gz \
+#     --output_fasta ./output/Archive/merge_fasta/merged_clean_filtered.N_removehot.fasta \
+#     --mapping ./data/quality_control_ID_Hap.tsv
+
+import argparse
+import gzip
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+def create_mapping(mapping_path):
+    """
+    Read the TSV file and build a mapping dictionary from original ID to corrected ID.
+    New ID = first column (stripped) + "_" + second column (stripped)
+    """
+    df = pd.read_csv(mapping_path, sep='\t', header=0, dtype=str)
+    if df.shape[1] < 2:
+        raise ValueError("The mapping file does not have at least 2 columns, cannot build mapping.")
+    new_id = df.iloc[:, 0].str.strip() + "_" + df.iloc[:, 1].str.strip()
+    return dict(zip(df.iloc[:, 0].str.strip(), new_id))
+
+
+def open_text(path):
+    return gzip.open(path, 'rt') if path.endswith(('.gz', '.bgz')) else open(path, 'r')
+
+
+GT_WIDTH = 4  # Characters kept per call: enough for '1/1' and to spot a two-digit allele
+BYTES_PER_CALL = 16  # GT buffer plus the uint8 temporaries of decode_chunk
+
+
+def chunk_rows(n_samples, chunk_size, chunk_mb):
+    """
+    Sites per chunk: at most chunk_size, and few enough that one chunk fits in chunk_mb.
+    """
+    return max(1, min(chunk_size, chunk_mb * 1024 ** 2 // (max(n_samples, 1) * BYTES_PER_CALL)))
+
+
+def iter_vcf_chunks(f_in, n_samples, rows):
+    """
+    Yield (alleles, gt, full_fields) for chunks of single-base-REF records.
+
+    gt is a preallocated (rows x n_samples) S4 buffer holding only the first GT_WIDTH
+    characters of every sample column, so the sample strings of a line are dropped as soon
+    as it is copied. full_fields keeps the complete columns only for sites with more than
+    ten alleles, the only ones where two-digit allele indices are valid.
+    Indels/MNPs (REF longer than one base) are skipped; the header must already be consumed.
+    """
+    gt = np.zeros((rows, n_samples), dtype=f'S{GT_WIDTH}')
+    alleles, full_fields = [], {}
+    for line in f_in:
+        row = line.rstrip('\n').split('\t', 9)
+        if len(row[3]) != 1:
+            continue
+        site = [row[3]] + ([] if row[4] == '.' else row[4].split(','))
+        fields = row[9].split('\t')
+        gt[len(alleles)] = fields
+        if len(site) > 10:
+            full_fields[len(alleles)] = fields
+        alleles.append(site)
+        if len(alleles) == rows:
+            yield alleles, gt, full_fields
+            alleles, full_fields = [], {}
+    if alleles:
+        yield alleles, gt[:len(alleles)], full_fields
+
+
+def decode_chunk(alleles, gt, full_fields, missing=b'N'):
+    """
+    Decode one site-major chunk into an (n_sites x n_samples) uint8 matrix of bases.
+
+    Missing calls, heterozygous diploid calls and alleles that are not a single base
+    become `missing` (what the .ped route produced as '0' and 0toN turned into 'N').
+    """
+    chars = gt.view(np.uint8).reshape(gt.shape + (GT_WIDTH,))
+    invalid = np.uint8(255)
+
+    def digit(col):
+        d = chars[..., col] - np.uint8(ord('0'))  # Non-digits wrap around to > 9
+        return np.where(d <= 9, d, invalid)
+
+    first = digit(0)
+    diploid = (chars[..., 1] == ord('/')) | (chars[..., 1] == ord('|'))
+    codes = np.where(diploid & (digit(2) != first), invalid, first)
+
+    # Two-digit allele indices: parsed field by field where they can be valid (> 10 alleles),
+    # otherwise out of range and therefore missing
+    multi = (digit(1) != invalid) | (diploid & (digit(3) != invalid))
+    codes[multi] = invalid
+    for i, fields in full_fields.items():
+        for j in np.flatnonzero(multi[i]):
+            call = fields[j].split(':', 1)[0].replace('|', '/').split('/')
+            index = int(call[0]) if call[0].isdigit() and len(set(call)) == 1 else 255
+            codes[i, j] = min(index, 255)
+
+    # Per-site lookup table: allele index -> base, with the missing code in the last column
+    max_alleles = max(len(a) for a in alleles)
+    table = np.full((len(alleles), max_alleles + 1), missing[0], dtype=np.uint8)
+    for i, site in enumerate(alleles):
+        for k, allele in enumerate(site):
+            if len(allele) == 1 and allele != '*':
+                table[i, k] = ord(allele)
+    codes = np.minimum(codes, max_alleles).astype(np.intp)
+    return table[np.arange(len(alleles))[:, None], codes]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a haploid VCF to a per-sample FASTA of its SNP sites in one streaming pass"
+    )
+    parser.add_argument("--vcf", required=True, help="Input VCF (.vcf or .vcf.gz)")
+    parser.add_argument("--output_fasta", required=True, help="Output FASTA path")
+    parser.add_argument("--mapping", default=None,
+                        help="Optional TSV (with header) for renaming: new ID = first column + '_' + second column")
+    parser.add_argument("--missing", default="N", help="Character for missing calls (default: N)")
+    parser.add_argument("--chunk_size", type=int, default=20000, help="Maximum VCF records per chunk (default: 20000)")
+    parser.add_argument("--chunk_mb", type=int, default=256,
+                        help="Memory budget per chunk in MB; caps --chunk_size for many samples (default: 256)")
+    args = parser.parse_args()
+    if len(args.missing) != 1:
+        parser.error("--missing must be a single character")
+
+    tmp_fasta = args.output_fasta + ".tmp"
+    tmp_matrix = args.output_fasta + ".sites.tmp"
+    try:
+        mapping = create_mapping(args.mapping) if args.mapping else {}
+        with open_text(args.vcf) as f_in:
+            for line in f_in:
+                if line.startswith('#CHROM'):
+                    samples = line.rstrip('\n').split('\t')[9:]
+                    break
+            else:
+                raise ValueError("No #CHROM header line found in the VCF")
+
+            # Transpose each site-major chunk and append it sample-major to a scratch file
+            chunk_lengths = []
+            with open(tmp_matrix, 'wb') as f_tmp:
+                rows = chunk_rows(len(samples), args.chunk_size, args.chunk_mb)
+                for alleles, gt, full_fields in iter_vcf_chunks(f_in, len(samples), rows):
+                    bases = decode_chunk(alleles, gt, full_fields, args.missing.encode())
+                    f_tmp.write(np.ascontiguousarray(bases.T).tobytes())
+                    chunk_lengths.append(len(alleles))
+                    print(f"Processed {sum(chunk_lengths)} sites")
+
+        n_sites = sum(chunk_lengths)
+        n_renamed = 0
+        matrix = np.memmap(tmp_matrix, dtype=np.uint8, mode='r') if n_sites else np.empty(0, dtype=np.uint8)
+        offsets = np.concatenate(([0], np.cumsum(chunk_lengths) * len(samples)))
+        with open(tmp_fasta, 'wb') as f_out:
+            for j, sample in enumerate(samples):
+                name = mapping.get(sample, sample)
+                n_renamed += name != sample
+                f_out.write(b'>' + name.encode() + b'\n')
+                for start, length in zip(offsets[:-1], chunk_lengths):
+                    f_out.write(matrix[start + j * length:start + (j + 1) * length].tobytes())
+                f_out.write(b'\n')
+        del matrix
+        os.replace(tmp_fasta, args.output_fasta)
+    except Exception as e:
+        print(f"Error converting VCF {args.vcf}: {e}")
+        for path in (tmp_fasta, tmp_matrix):
+            if os.path.exists(path):
+                os.remove(path)
+        sys.exit(1)
+    os.remove(tmp_matrix)
+
+    print(f"Wrote {len(samples)} sequences x {n_sites} sites to {args.output_fasta}"
+          + (f" ({n_renamed} IDs renamed)" if mapping else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,29 @@ VCF_PATH="./output/Archive/merge/merged_clean_filtered.N_removehot.vcf.gz"
 OUT_PREFIX="./output/Archive/merge_fasta/merged_clean_filtered.N_removehot"
 PYTHON_PATH="python3"
 SCRIPT_PATH="./script/6_vcf2fasta_plink.py"
+CONVERTER_PATH="./script/6_vcf2fasta.py"
 MAPPING_FILE="./data/quality_control_ID_Hap.tsv" # Optional parameter, see rename_fasta_ids function
+RENAME_IDS=false  # true: apply MAPPING_FILE while converting
+USE_PLINK=false   # true: legacy plink --recode + awk route
 THREADS=32
 
 # ================== Function definitions ==================
 
+function vcf_to_fasta() {
+    local fasta_file="${OUT_PREFIX}.fasta"
+    local mapping_args=()
+    if [[ "$RENAME_IDS" == true ]]; then
+        mapping_args=(--mapping "$MAPPING_FILE")
+    fi
+
+    echo "[INFO] Converting VCF directly to FASTA (missing calls -> N)..."
+    "$PYTHON_PATH" "$CONVERTER_PATH" \
+        --vcf "$VCF_PATH" \
+        --output_fasta "$fasta_file" \
+        ${mapping_args[@]+"${mapping_args[@]}"}
+    echo "[INFO] VCF successfully converted to FASTA!"
+}
+
 function run_plink() {
     echo "[INFO] Processing VCF file with PLINK..."
     plink --vcf "$VCF_PATH" \
@@ -54,11 +72,15 @@ function rename_fasta_ids() {
 
 # ================== Main workflow execution ==================
 
-run_plink
-ped_to_fasta
-# rename_fasta_ids
-rm "$OUT_PREFIX".ped
-rm "$OUT_PREFIX".map
-rm "$OUT_PREFIX".log
-rm "$OUT_PREFIX".nosex
+if [[ "$USE_PLINK" == true ]]; then
+    run_plink
+    ped_to_fasta
+    # rename_fasta_ids
+    rm "$OUT_PREFIX".ped
+    rm "$OUT_PREFIX".map
+    rm "$OUT_PREFIX".log
+    rm "$OUT_PREFIX".nosex
+else
+    vcf_to_fasta
+fi
 echo "[DONE] All steps completed."
@@ -1,30 +1,141 @@
-def replace_zeros_with_n(input_file_path, output_file_path):
-    with open(input_file_path, 'r') as file:
-        lines = file.readlines()
-
-    # Used to store the modified content
-    modified_lines = []
-
-    for line in lines:
-        line = line.strip()
-
-        if line.startswith(">"):  # 这是标题行，不做修改
-        if line.startswith(">"):  # This is a header line, do not modify
-            modified_lines.append(line)
-        else:
-            # Replace '0' with 'N' in the sequence
-            modified_sequence = line.replace('0', 'N')
-            modified_lines.append(modified_sequence)
-
-    # 将修改后的内容写入新的文件
-    # Write the modified content to a new file
-    with open(output_file_path, 'w') as output_file:
-        for modified_line in modified_lines:
-            output_file.write(modified_line + "\n")
-
-    print(f"File has been processed and saved to: {output_file_path}")
-
-# 使用示例
-input_file_path = 'input.fasta'  
-output_file_path = 'output.fasta' 
-replace_zeros_with_n(input_file_path, output_file_path)
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Replace missing-call codes ('0' from the plink .ped route) with 'N' in FASTA sequences.
+# Header lines are left untouched; files are streamed in fixed-size blocks.
+#
+# Examples:
+# python 6_vcf2fasta_plink_0toN.py merged.fasta --output merged_N.fasta
+# python 6_vcf2fasta_plink_0toN.py output/*.fasta --output_dir output/fixed --processes 8 --missing_codes 0-.
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+BLOCK_SIZE = 16 * 1024 * 1024  # Bytes read per block
+
+
+def build_table(missing_codes, replacement):
+    """
+    bytes.translate table mapping every missing code to the replacement character.
+    """
+    table = bytearray(range(256))
+    for code in missing_codes.encode():
+        table[code] = ord(replacement)
+    return bytes(table)
+
+
+def translate_block(block, table, in_header):
+    """
+    Translate sequence bytes of a block that ends on a line boundary, leaving '>' lines as they are.
+
+    in_header tells whether the block starts inside a header line (only possible when a header
+    is longer than a block). Returns the translated block and the header state at its end.
+    """
+    out = []
+    pos = 0
+    if in_header:
+        end = block.find(b'\n')
+        if end == -1:
+            return block, True
+        out.append(block[:end + 1])
+        pos = end + 1
+    while pos < len(block):
+        header = pos if block.startswith(b'>', pos) else block.find(b'\n>', pos)
+        if header == -1:
+            out.append(block[pos:].translate(table))
+            return b''.join(out), False
+        if header != pos:
+            header += 1  # keep the newline with the sequence part
+            out.append(block[pos:header].translate(table))
+        end = block.find(b'\n', header)
+        if end == -1:
+            out.append(block[header:])
+            return b''.join(out), True
+        out.append(block[header:end + 1])
+        pos = end + 1
+    return b''.join(out), False
+
+
+def replace_missing(input_file_path, output_file_path, missing_codes="0", replacement="N", block_size=BLOCK_SIZE):
+    """
+    Stream one FASTA file through the translation table; memory is bounded by block_size.
+    The output is written to a temporary file and moved into place when complete.
+    """
+    table = build_table(missing_codes, replacement)
+    tmp_path = output_file_path + ".tmp"
+    in_header = False
+    carry = b''
+    try:
+        with open(input_file_path, 'rb') as fin, open(tmp_path, 'wb') as fout:
+            while True:
+                block = fin.read(block_size)
+                if not block:
+                    break
+                block = carry + block
+                # Only translate up to the last complete line so a header is never split
+                cut = block.rfind(b'\n') + 1
+                if cut == 0 and len(block) < 4 * block_size:
+                    carry = block
+                    continue
+                cut = cut or len(block)
+                carry = block[cut:]
+                translated, in_header = translate_block(block[:cut], table, in_header)
+                fout.write(translated)
+            if carry:
+                fout.write(translate_block(carry, table, in_header)[0])
+        os.replace(tmp_path, output_file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_file_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replace missing-call codes (default '0') with 'N' in FASTA sequences, streaming in blocks"
+    )
+    parser.add_argument("input_fasta", nargs="+", help="Input FASTA file(s)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output", help="Output FASTA (single input only)")
+    output.add_argument("--output_dir", help="Output directory; each file keeps its name")
+    parser.add_argument("--missing_codes", default="0",
+                        help="Characters treated as missing, e.g. '0' or '0-.' (default: 0)")
+    parser.add_argument("--replacement", default="N", help="Replacement character (default: N)")
+    parser.add_argument("--processes", type=int, default=4, help="Files processed concurrently (default: 4)")
+    parser.add_argument("--block_mb", type=int, default=16, help="Block size in MB (default: 16)")
+    args = parser.parse_args()
+    if args.output and len(args.input_fasta) > 1:
+        parser.error("--output accepts a single input file; use --output_dir for several")
+    if len(args.replacement) != 1:
+        parser.error("--replacement must be a single character")
+
+    if args.output:
+        outputs = [args.output]
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        outputs = [os.path.join(args.output_dir, os.path.basename(p)) for p in args.input_fasta]
+    for src, dst in zip(args.input_fasta, outputs):
+        if os.path.abspath(src) == os.path.abspath(dst):
+            parser.error(f"Output would overwrite its input: {src}")
+
+    block_size = args.block_mb * 1024 * 1024
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.processes, len(outputs)))) as pool:
+        futures = {
+            pool.submit(replace_missing, src, dst, args.missing_codes, args.replacement, block_size): src
+            for src, dst in zip(args.input_fasta, outputs)
+        }
+        for future, src in futures.items():
+            try:
+                print(f"File has been processed and saved to: {future.result()}")
+            except Exception as e:
+                print(f"Error processing {src}: {e}")
+                failed += 1
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,51 @@
 
 #! install VeryFastTree
 #! conda install VeryFastTree
-#! conda install -c bioconda snp-sites 
-#! conda install -c conda-forge seqmagick
 
-seqmagick convert \
-    --include-from-file List_to_bulid_tree.txt \
-    All_WGS.fasta \
-    List_to_bulid_tree.fasta
+# MODE="full": core SNPs + VeryFastTree over every sample in List_to_bulid_tree.txt
+# MODE="incremental": place the isolates in New_isolates.txt onto WGS.tree; a full build
+#                     only runs when more than DRIFT_THRESHOLD x (tips at the last full build)
+#                     isolates have been placed since then
+MODE="full"
+NEW_LIST="New_isolates.txt"
+DRIFT_THRESHOLD=0.05
 
-snp-sites -c -o List_to_bulid_tree_snp-sites.fasta \
-    List_to_bulid_tree.fasta
+function full_build() {
+    # Core SNPs of the listed samples straight from All_WGS.fasta
+    # (replaces seqmagick --include-from-file + snp-sites -c; no subset alignment is written)
+    python3 7_core_snps.py \
+        --alignment All_WGS.fasta \
+        --ids List_to_bulid_tree.txt \
+        --output_fasta List_to_bulid_tree_snp-sites.fasta \
+        --positions List_to_bulid_tree_snp-sites.pos
 
+    VeryFastTree \
+        -nt -gtr < List_to_bulid_tree_snp-sites.fasta \
+        > WGS.tree
 
-VeryFastTree \
-    -nt -gtr < List_to_bulid_tree_snp-sites.fasta \
-    > WGS.tree
\ No newline at end of file
+    # Placement history restarts from the new tree
+    rm -f WGS.tree.placement.json
+}
+
+if [[ "$MODE" == "incremental" ]]; then
+    python3 7_place_isolates.py \
+        --tree WGS.tree \
+        --snp_fasta List_to_bulid_tree_snp-sites.fasta \
+        --positions List_to_bulid_tree_snp-sites.pos \
+        --alignment All_WGS.fasta \
+        --ids "$NEW_LIST" \
+        --drift_threshold "$DRIFT_THRESHOLD"
+    status=$?
+    if [[ $status -eq 0 || $status -eq 3 ]]; then
+        # Keep the sample list complete for the next full build
+        cat List_to_bulid_tree.txt "$NEW_LIST" | awk 'NF && !seen[$0]++' > List_to_bulid_tree.txt.tmp
+        mv List_to_bulid_tree.txt.tmp List_to_bulid_tree.txt
+    fi
+    if [[ $status -eq 3 ]]; then
+        full_build
+    elif [[ $status -ne 0 ]]; then
+        exit $status
+    fi
+else
+    full_build
+fi
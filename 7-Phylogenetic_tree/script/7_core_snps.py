@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Core-SNP extraction (equivalent to `snp-sites -c`, optionally `-v`) without an intermediate alignment.
+#
+# Examples:
+# python 7_core_snps.py \
+#     --alignment All_WGS.fasta \
+#     --ids List_to_bulid_tree.txt \
+#     --output_fasta List_to_bulid_tree_snp-sites.fasta
+#
+# python 7-Phylogenetic_tree/script/7_core_snps.py \
+#     --fasta_dir merge_fasta \
+#     --ids example/list.txt \
+#     --output_fasta example/alignmentSub.temp \
+#     --vcf example/tmp1.vcf
+
+import argparse
+import mmap
+import os
+import sys
+
+import numpy as np
+
+# Upper-case lookup and A/C/G/T mask; a core column contains only A/C/G/T in every sequence
+UPPER = np.arange(256, dtype=np.uint8)
+UPPER[ord('a'):ord('z') + 1] -= 32
+IS_ACGT = np.zeros(256, dtype=bool)
+IS_ACGT[list(b"ACGT")] = True
+
+
+def index_fasta(path, mm):
+    """
+    Return (name, seq_start, seq_end) byte ranges for every record of a memory-mapped FASTA.
+    """
+    records = []
+    start = mm.find(b'>')
+    while start != -1:
+        header_end = mm.find(b'\n', start)
+        if header_end == -1:
+            header_end = len(mm)
+        header = mm[start + 1:header_end].split()
+        next_start = mm.find(b'\n>', header_end)
+        seq_end = len(mm) if next_start == -1 else next_start
+        records.append((header[0].decode() if header else "", header_end + 1, seq_end))
+        start = -1 if next_start == -1 else next_start + 1
+    if not records and len(mm):
+        raise ValueError(f"No FASTA records found in {path}")
+    return records
+
+
+class Alignment:
+    """
+    View over one multi-sample FASTA or a set of per-sample FASTA files.
+
+    A single file stays memory-mapped and sequences are read straight from the page cache.
+    With several files (one per sample) only the byte ranges are kept, and each row() opens,
+    reads and closes its file, so the number of open descriptors does not grow with the
+    number of samples. Line breaks are removed per row, so wrapped and single-line FASTA are
+    both supported.
+    """
+
+    def __init__(self, paths, ids=None):
+        self._paths = []
+        self._maps = {}  # path index -> mmap, single-file input only
+        self.rows = []  # (path index, name, seq_start, seq_end)
+        keep_open = len(paths) == 1
+        for path in paths:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._paths.append(path)
+            k = len(self._paths) - 1
+            try:
+                for name, a, b in index_fasta(path, mm):
+                    self.rows.append((k, name, a, b))
+            finally:
+                if keep_open:
+                    self._maps[k] = mm
+                else:
+                    mm.close()
+        if ids is not None:
+            wanted = set(ids)
+            missing = wanted.difference(r[1] for r in self.rows)
+            if missing:
+                print(f"Warning: {len(missing)} requested IDs are not in the alignment: {sorted(missing)[:10]}")
+            self.rows = [r for r in self.rows if r[1] in wanted]
+        if not self.rows:
+            raise ValueError("No sequences selected")
+        self.names = [r[1] for r in self.rows]
+
+    def row(self, i):
+        """
+        Upper-cased uint8 codes of sequence i.
+        """
+        k, name, a, b = self.rows[i]
+        if k in self._maps:
+            raw = self._maps[k][a:b]
+        else:
+            with open(self._paths[k], 'rb') as f:
+                f.seek(a)
+                raw = f.read(b - a)
+        return UPPER[np.frombuffer(raw.translate(None, b'\r\n'), dtype=np.uint8)]
+
+    def iter_blocks(self, block_rows):
+        """
+        Yield (first_row, block) with block an (n_rows x length) uint8 matrix.
+        """
+        length = None
+        for first in range(0, len(self.rows), block_rows):
+            rows = [self.row(i) for i in range(first, min(first + block_rows, len(self.rows)))]
+            for i, r in enumerate(rows, start=first):
+                if length is None:
+                    length = r.size
+                elif r.size != length:
+                    raise ValueError(f"Sequence {self.names[i]} has length {r.size}, expected {length}; "
+                                     f"input must be aligned.")
+            yield first, np.stack(rows)
+
+    def close(self):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps = {}
+
+
+def find_core_snps(alignment, block_rows=32):
+    """
+    Column-wise reductions over blocks of rows.
+
+    Returns (snp_columns, reference_row, length): 0-based indices of variable columns where every
+    sequence has A/C/G/T, the first sequence's codes, and the alignment length.
+    """
+    ref = variable = noncore = None
+    for first, block in alignment.iter_blocks(block_rows):
+        if ref is None:
+            ref = block[0].copy()
+            variable = np.zeros(ref.size, dtype=bool)
+            noncore = np.zeros(ref.size, dtype=bool)
+        variable |= (block != ref).any(axis=0)
+        noncore |= (~IS_ACGT[block]).any(axis=0)
+        print(f"Scanned {first + len(block)}/{len(alignment.rows)} sequences")
+    return np.flatnonzero(variable & ~noncore), ref, ref.size
+
+
+def write_vcf(path, names, snp_matrix, snp_columns, ref, length, chunk_size=10000):
+    """
+    Write a haploid VCF in the layout of `snp-sites -v` (CHROM 1, REF = first sequence).
+
+    snp_matrix is (n_samples x n_snps); ALT alleles follow A, C, G, T order.
+    """
+    n = len(names)
+    with open(path + ".tmp", 'w') as f:
+        f.write("##fileformat=VCFv4.1\n")
+        f.write(f"##contig=<ID=1,length={length}>\n")
+        f.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t" + "\t".join(names) + "\n")
+        bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+        for c0 in range(0, len(snp_columns), chunk_size):
+            cols = snp_columns[c0:c0 + chunk_size]
+            sub = np.asarray(snp_matrix[:, c0:c0 + len(cols)]).T            # sites x samples
+            ref_base = ref[cols]
+            present = (sub[:, :, None] == bases).any(axis=1)               # sites x 4
+            is_ref = ref_base[:, None] == bases
+            alt = present & ~is_ref
+            # Allele code per base: 0 for REF, 1.. for ALT bases in A/C/G/T order
+            code_of = np.where(is_ref, 0, np.cumsum(alt, axis=1))
+            idx = np.searchsorted(bases, sub)
+            codes = np.take_along_axis(code_of, idx, axis=1)
+            # Build "c\tc\t...c\n" rows as bytes in one go
+            text = np.full((len(cols), 2 * n), ord('\t'), dtype=np.uint8)
+            text[:, 0::2] = codes + ord('0')
+            text[:, -1] = ord('\n')
+            for k in range(len(cols)):
+                alts = ",".join(chr(b) for b in bases[alt[k]])
+                f.write(f"1\t{cols[k] + 1}\t.\t{chr(ref_base[k])}\t{alts}\t.\t.\t.\tGT\t")
+                f.write(text[k].tobytes().decode())
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract variable, gap-free (core) alignment columns into a SNP-only FASTA and an optional VCF"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--alignment", help="Multi-sample FASTA alignment (e.g., All_WGS.fasta)")
+    source.add_argument("--fasta_dir", help="Directory of per-sample <id>.fasta files (requires --ids); "
+                                            "no merged alignment is written")
+    parser.add_argument("--ids", default=None, help="Sample IDs to keep, one per line (default: all sequences)")
+    parser.add_argument("--suffix", default=".fasta", help="Per-sample file suffix for --fasta_dir (default: .fasta)")
+    parser.add_argument("--output_fasta", required=True, help="SNP-only FASTA (same as snp-sites -c output)")
+    parser.add_argument("--vcf", default=None, help="Optional VCF of the same sites (same as snp-sites -c -v)")
+    parser.add_argument("--positions", default=None,
+                        help="Optional list of the kept columns (1-based, one per line) for 7_place_isolates.py")
+    parser.add_argument("--block_rows", type=int, default=32,
+                        help="Sequences per block for the column reductions (default: 32)")
+    args = parser.parse_args()
+    if args.fasta_dir and not args.ids:
+        parser.error("--fasta_dir requires --ids")
+
+    ids = None
+    if args.ids:
+        with open(args.ids, 'r') as f:
+            ids = [line.strip() for line in f if line.strip()]
+
+    if args.fasta_dir:
+        paths = []
+        for sid in ids:
+            path = os.path.join(args.fasta_dir, sid + args.suffix)
+            if os.path.exists(path):
+                paths.append(path)
+            else:
+                print(f"Warning: File {path} does not exist")
+    else:
+        paths = [args.alignment]
+
+    try:
+        alignment = Alignment(paths, ids)
+        snp_columns, ref, length = find_core_snps(alignment, args.block_rows)
+        print(f"{len(snp_columns)} core SNP columns out of {length} in {len(alignment.names)} sequences")
+
+        # Second pass: one row at a time into the SNP FASTA (and a temporary SNP matrix for the VCF)
+        snp_matrix = None
+        if args.vcf:
+            matrix_path = args.vcf + ".snps.npy"
+            snp_matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype=np.uint8,
+                                                   shape=(len(alignment.names), len(snp_columns)))
+        with open(args.output_fasta + ".tmp", 'wb') as f_out:
+            for i, name in enumerate(alignment.names):
+                snps = alignment.row(i)[snp_columns]
+                f_out.write(b'>' + name.encode() + b'\n' + snps.tobytes() + b'\n')
+                if snp_matrix is not None:
+                    snp_matrix[i] = snps
+        os.replace(args.output_fasta + ".tmp", args.output_fasta)
+        print(f"SNP alignment written to: {args.output_fasta}")
+        if args.positions:
+            np.savetxt(args.positions, snp_columns + 1, fmt="%d")
+            print(f"SNP positions written to: {args.positions}")
+
+        if snp_matrix is not None:
+            write_vcf(args.vcf, alignment.names, snp_matrix, snp_columns, ref, length)
+            del snp_matrix
+            os.remove(matrix_path)
+            print(f"VCF written to: {args.vcf}")
+        alignment.close()
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Incremental tree update: place new isolates onto an existing core-SNP tree.
+#
+# New genomes are reduced to the SNP columns of the previous build (7_core_snps.py --positions),
+# each is attached next to its nearest tip by SNP p-distance, and the SNP alignment is extended so
+# the next round can place onto them too. Isolates of one batch are placed in input order and are
+# also compared with the earlier isolates of the same batch, so close relatives are joined. All
+# placements are checked before anything is written; the tree, SNP alignment, state and report
+# are then replaced together. When the isolates added since the last full build exceed
+# --drift_threshold (as a fraction of the tips at that build) nothing is written and the script exits
+# with status 3, telling 7-VeryFastTree.sh to rebuild from scratch.
+#
+# Example:
+# python 7_place_isolates.py \
+#     --tree WGS.tree \
+#     --snp_fasta List_to_bulid_tree_snp-sites.fasta \
+#     --positions List_to_bulid_tree_snp-sites.pos \
+#     --alignment New_WGS.fasta \
+#     --ids New_isolates.txt
+
+import argparse
+import importlib
+import io
+import json
+import os
+import sys
+
+import numpy as np
+from Bio import Phylo
+from Bio.Phylo.BaseTree import Clade
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+core_snps = importlib.import_module("7_core_snps")
+
+REBUILD_EXIT_CODE = 3
+
+
+def load_state(path, n_tips):
+    """
+    Placement history since the last full build; a missing file means the tree was just rebuilt.
+    """
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {"tips_at_rebuild": n_tips, "placed": []}
+
+
+def nearest_tips(reference, new_snps, block_rows=256):
+    """
+    For each new isolate, the nearest sequence of the SNP alignment by p-distance.
+
+    Positions where either sequence is not A/C/G/T are ignored. Returns (index, p_distance,
+    compared_sites) arrays, one entry per new isolate.
+    """
+    new_valid = core_snps.IS_ACGT[new_snps]
+    best = np.full(len(new_snps), -1, dtype=np.int64)
+    best_p = np.full(len(new_snps), np.inf)
+    best_sites = np.zeros(len(new_snps), dtype=np.int64)
+    for first, block in reference.iter_blocks(block_rows):
+        if block.shape[1] != new_snps.shape[1]:
+            raise ValueError(f"SNP alignment has {block.shape[1]} columns but --positions lists {new_snps.shape[1]}")
+        block_valid = core_snps.IS_ACGT[block]
+        for k, (x, x_valid) in enumerate(zip(new_snps, new_valid)):
+            compared = block_valid & x_valid
+            sites = compared.sum(axis=1)
+            mismatches = ((block != x) & compared).sum(axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                p = np.where(sites > 0, mismatches / sites, np.inf)
+            j = int(np.argmin(p))
+            if p[j] < best_p[k]:
+                best[k], best_p[k], best_sites[k] = first + j, p[j], sites[j]
+    return best, best_p, best_sites
+
+
+def nearest_in_batch(new_snps):
+    """
+    For each new isolate, the nearest earlier isolate of the same batch by p-distance.
+
+    Same conventions as nearest_tips; the first isolate has no candidate (index -1, inf).
+    """
+    valid = core_snps.IS_ACGT[new_snps]
+    best = np.full(len(new_snps), -1, dtype=np.int64)
+    best_p = np.full(len(new_snps), np.inf)
+    best_sites = np.zeros(len(new_snps), dtype=np.int64)
+    for k in range(1, len(new_snps)):
+        compared = valid[:k] & valid[k]
+        sites = compared.sum(axis=1)
+        mismatches = ((new_snps[:k] != new_snps[k]) & compared).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = np.where(sites > 0, mismatches / sites, np.inf)
+        j = int(np.argmin(p))
+        best[k], best_p[k], best_sites[k] = j, p[j], sites[j]
+    return best, best_p, best_sites
+
+
+def attach(tree, parents, tips, tip_name, new_name, distance):
+    """
+    Attach new_name as a sister of tip_name; tips maps exact tip names to their clades.
+
+    The tip's branch is split min(distance / 2, branch length) above the tip and the new
+    isolate hangs from that point, so the tip-to-tip path length equals `distance`.
+    """
+    tip = tips.get(tip_name)
+    if tip is None:
+        raise ValueError(f"{tip_name} is not a tip of the tree")
+    parent = parents.get(tip)
+    tip_length = tip.branch_length or 0.0
+    split = min(distance / 2.0, tip_length)
+    node = Clade(branch_length=tip_length - split)
+    tip.branch_length = split
+    leaf = Clade(name=new_name, branch_length=max(distance - split, 0.0))
+    node.clades = [tip, leaf]
+    if parent is None:
+        # The nearest tip is the root itself (single-tip tree)
+        tree.root = node
+    else:
+        parent.clades[parent.clades.index(tip)] = node
+        parents[node] = parent
+    parents[tip] = node
+    parents[leaf] = node
+    tips[new_name] = leaf
+
+
+def copy_alignment(f_in, f_out, block_size=16 * 1024 * 1024):
+    """
+    Copy the existing SNP alignment, making sure it ends with a newline.
+    """
+    last = b'\n'
+    while True:
+        block = f_in.read(block_size)
+        if not block:
+            break
+        f_out.write(block)
+        last = block[-1:]
+    if last != b'\n':
+        f_out.write(b'\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Place new isolates onto an existing core-SNP tree; exit 3 when a full rebuild is due"
+    )
+    parser.add_argument("--tree", required=True, help="Newick tree from the previous build (updated in place)")
+    parser.add_argument("--snp_fasta", required=True, help="Core-SNP alignment of the tree (extended in place)")
+    parser.add_argument("--positions", required=True, help="SNP columns from 7_core_snps.py --positions")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--alignment", help="FASTA with the new whole-genome sequences (same coordinates)")
+    source.add_argument("--fasta_dir", help="Directory of per-sample <id>.fasta files (requires --ids)")
+    parser.add_argument("--ids", default=None, help="New isolate IDs, one per line (default: all in --alignment)")
+    parser.add_argument("--suffix", default=".fasta", help="Per-sample file suffix for --fasta_dir (default: .fasta)")
+    parser.add_argument("--drift_threshold", type=float, default=0.05,
+                        help="Rebuild when isolates placed since the last full build exceed this fraction "
+                             "of its tips (default: 0.05)")
+    parser.add_argument("--state", default=None,
+                        help="Placement history JSON (default: <tree>.placement.json; delete it after a rebuild)")
+    parser.add_argument("--report", default=None, help="Placement TSV (default: <tree>.placement.tsv)")
+    args = parser.parse_args()
+    if args.fasta_dir and not args.ids:
+        parser.error("--fasta_dir requires --ids")
+    state_path = args.state or args.tree + ".placement.json"
+    report_path = args.report or args.tree + ".placement.tsv"
+
+    ids = None
+    if args.ids:
+        with open(args.ids, 'r') as f:
+            ids = [line.strip() for line in f if line.strip()]
+    if args.fasta_dir:
+        paths = [os.path.join(args.fasta_dir, sid + args.suffix) for sid in ids]
+        paths = [p for p in paths if os.path.exists(p)]
+    else:
+        paths = [args.alignment]
+
+    try:
+        tree = Phylo.read(args.tree, "newick")
+        tip_names = {t.name for t in tree.get_terminals()}
+        state = load_state(state_path, len(tip_names))
+
+        new = core_snps.Alignment(paths, ids)
+        todo = [i for i, name in enumerate(new.names) if name not in tip_names]
+        if len(todo) < len(new.names):
+            print(f"Skipping {len(new.names) - len(todo)} isolates that are already in the tree")
+        if not todo:
+            print("No new isolates to place.")
+            return
+
+        drift = (len(state["placed"]) + len(todo)) / max(state["tips_at_rebuild"], 1)
+        if drift > args.drift_threshold:
+            print(f"Drift {drift:.3f} exceeds --drift_threshold {args.drift_threshold}: "
+                  f"{len(state['placed']) + len(todo)} isolates since the last full build of "
+                  f"{state['tips_at_rebuild']} tips. Run a full rebuild.")
+            sys.exit(REBUILD_EXIT_CODE)
+
+        columns = np.loadtxt(args.positions, dtype=np.int64, ndmin=1) - 1
+        rows = [new.row(i) for i in todo]
+        too_short = [new.names[i] for i, r in zip(todo, rows) if r.size <= columns.max()]
+        if too_short:
+            raise ValueError(f"Sequences shorter than the last SNP position ({columns.max() + 1}): {too_short[:5]}")
+        new_snps = np.stack([r[columns] for r in rows])
+        new_names = [new.names[i] for i in todo]
+
+        reference = core_snps.Alignment([args.snp_fasta])
+        index, p_dist, sites = nearest_tips(reference, new_snps)
+        reference_names = reference.names
+        reference.close()
+        new.close()
+
+        # Check every placement before changing anything; earlier isolates of the batch are
+        # candidates too and win when strictly closer than the nearest tree tip
+        batch_index, batch_p, batch_sites = nearest_in_batch(new_snps)
+        placements = []
+        for k, (name, j, p, n) in enumerate(zip(new_names, index, p_dist, sites)):
+            if batch_p[k] < p:
+                nearest, p, n = new_names[batch_index[k]], batch_p[k], batch_sites[k]
+            elif j < 0 or not np.isfinite(p):
+                raise ValueError(f"{name} shares no callable SNP sites with the tree")
+            else:
+                nearest = reference_names[j]
+                if nearest not in tip_names:
+                    raise ValueError(f"{nearest} is in {args.snp_fasta} but not in {args.tree}")
+            placements.append((name, nearest, float(p), int(n)))
+
+        parents = {child: parent for parent in tree.find_clades(order="level") for child in parent.clades}
+        # Exact-name lookup; find_clades(name=...) treats the name as a regular expression
+        tips = {c.name: c for c in tree.get_terminals()}
+        for name, nearest, p, n in placements:
+            attach(tree, parents, tips, nearest, name, p)
+            print(f"Placed {name} next to {nearest} (p-distance {p:.4g} over {n} SNP sites)")
+
+        # Write tree, extended SNP alignment, state and report; all are replaced together at the end
+        buffer = io.StringIO()
+        Phylo.write(tree, buffer, "newick", format_branch_length="%.8g")
+        with open(args.tree + ".tmp", 'w') as f:
+            f.write(buffer.getvalue())
+        with open(args.snp_fasta + ".tmp", 'wb') as f_out, open(args.snp_fasta, 'rb') as f_in:
+            copy_alignment(f_in, f_out)
+            for name, snps in zip(new_names, new_snps):
+                f_out.write(b'>' + name.encode() + b'\n' + snps.tobytes() + b'\n')
+        state["placed"].extend(new_names)
+        with open(state_path + ".tmp", 'w') as f:
+            json.dump(state, f, indent=1)
+        with open(report_path + ".tmp", 'w') as f_report:
+            if os.path.exists(report_path):
+                with open(report_path, 'r') as f_old:
+                    f_report.write(f_old.read())
+            if f_report.tell() == 0:
+                f_report.write("isolate\tnearest\tp_distance\tcompared_sites\n")
+            for name, nearest, p, n in placements:
+                f_report.write(f"{name}\t{nearest}\t{p:.6g}\t{n}\n")
+        os.replace(args.snp_fasta + ".tmp", args.snp_fasta)
+        os.replace(args.tree + ".tmp", args.tree)
+        os.replace(state_path + ".tmp", state_path)
+        os.replace(report_path + ".tmp", report_path)
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Placed {len(new_names)} isolates (drift {drift:.3f}); tree written to: {args.tree}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# All-pairs SNP distance matrix from a core-SNP alignment (e.g., 7_core_snps.py output or
+# 12-GWAS alignmentSub.temp).
+#
+# Each base is packed as two bits (A=00, C=01, G=10, T=11) spread over two bit planes, plus a
+# "callable" plane, so the differences between two isolates are
+# popcount(((hi_i ^ hi_j) | (lo_i ^ lo_j)) & callable_i & callable_j). Like snp-dists, only positions where both sequences have A/C/G/T are compared.
+# The matrix is filled tile by tile in a process pool and stored as a memory-mapped .npy
+# (<prefix>.npy) with the row/column order in <prefix>.samples.txt.
+#
+# Example:
+# python 7_snp_distance.py \
+#     --snp_fasta List_to_bulid_tree_snp-sites.fasta \
+#     --output_prefix WGS_snp_dist \
+#     --processes 16
+
+import argparse
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+core_snps = importlib.import_module("7_core_snps")
+
+# A/C/G/T -> 0..3; anything else is masked by the callable plane
+BASE_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    BASE_CODES[_base] = _code
+
+if hasattr(np, "bitwise_count"):
+    def popcount_rows(words):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount_rows(words):
+        return _POPCOUNT8[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def pack_alignment(alignment, packed_path, block_rows=256):
+    """
+    Write the (3, n_samples, n_words) uint64 bit planes (high bit, low bit, callable) to a .npy file.
+    """
+    n = len(alignment.names)
+    packed = None
+    for first, block in alignment.iter_blocks(block_rows):
+        if packed is None:
+            n_words = (block.shape[1] + 63) // 64
+            packed = np.lib.format.open_memmap(packed_path, mode='w+', dtype=np.uint64, shape=(3, n, n_words))
+        codes = BASE_CODES[block]
+        planes = [(codes >> 1).astype(bool), (codes & 1).astype(bool), core_snps.IS_ACGT[block]]
+        for p, plane in enumerate(planes):
+            bits = np.packbits(plane, axis=1, bitorder='little')
+            padded = np.zeros((len(block), packed.shape[2] * 8), dtype=np.uint8)
+            padded[:, :bits.shape[1]] = bits
+            packed[p, first:first + len(block)] = padded.view(np.uint64)
+    packed.flush()
+    return packed.shape[2] * 64
+
+
+def distance_tile(task):
+    """
+    Compute one tile of the matrix and write it (and its mirror) into the output memmap.
+    """
+    packed_path, out_path, i0, i1, j0, j1, proportion = task
+    packed = np.load(packed_path, mmap_mode='r')
+    out = np.load(out_path, mmap_mode='r+')
+    rows = np.asarray(packed[:, i0:i1])
+    cols = np.asarray(packed[:, j0:j1])
+    tile = np.empty((i1 - i0, j1 - j0), dtype=out.dtype)
+    for k in range(i1 - i0):
+        callable_ = rows[2, k] & cols[2]
+        diff = popcount_rows(((rows[0, k] ^ cols[0]) | (rows[1, k] ^ cols[1])) & callable_)
+        if proportion:
+            compared = popcount_rows(callable_)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                tile[k] = np.where(compared > 0, diff / compared, np.nan)
+        else:
+            tile[k] = diff
+    out[i0:i1, j0:j1] = tile
+    if i0 != j0:
+        out[j0:j1, i0:i1] = tile.T
+    out.flush()
+    return (i1 - i0) * (j1 - j0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pairwise SNP distance matrix (bit-packed popcount over blocked tiles, process pool)"
+    )
+    parser.add_argument("--snp_fasta", required=True, help="Core-SNP alignment FASTA")
+    parser.add_argument("--ids", default=None, help="Optional sample IDs to keep, one per line")
+    parser.add_argument("--output_prefix", required=True,
+                        help="Writes <prefix>.npy (n x n matrix) and <prefix>.samples.txt (row order)")
+    parser.add_argument("--proportion", action="store_true",
+                        help="Store float32 p-distances (differences / compared sites) instead of uint32 counts")
+    parser.add_argument("--tile", type=int, default=256, help="Tile size in samples (default: 256)")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes (default: 4)")
+    parser.add_argument("--tsv", default=None, help="Optional snp-dists style TSV copy (small sample sets only)")
+    args = parser.parse_args()
+
+    ids = None
+    if args.ids:
+        with open(args.ids, 'r') as f:
+            ids = [line.strip() for line in f if line.strip()]
+
+    out_path = args.output_prefix + ".npy"
+    packed_path = args.output_prefix + ".packed.tmp.npy"
+    try:
+        t0 = time.perf_counter()
+        alignment = core_snps.Alignment([args.snp_fasta], ids)
+        names = alignment.names
+        n = len(names)
+        n_bits = pack_alignment(alignment, packed_path)
+        alignment.close()
+        print(f"Packed {n} sequences ({n_bits // 64} 64-bit words per bit plane) in {time.perf_counter() - t0:.1f} s")
+
+        dtype = np.float32 if args.proportion else np.uint32
+        np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(n, n)).flush()
+
+        bounds = [(s, min(s + args.tile, n)) for s in range(0, n, args.tile)]
+        tasks = [(packed_path, out_path, i0, i1, j0, j1, args.proportion)
+                 for a, (i0, i1) in enumerate(bounds) for (j0, j1) in bounds[a:]]
+        t1 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max(1, args.processes)) as pool:
+            for k, _ in enumerate(pool.map(distance_tile, tasks), start=1):
+                if k % max(1, len(tasks) // 10) == 0 or k == len(tasks):
+                    print(f"Finished {k}/{len(tasks)} tiles")
+        print(f"Computed {n * (n - 1) // 2} pairs in {time.perf_counter() - t1:.1f} s")
+
+        with open(args.output_prefix + ".samples.txt", 'w') as f:
+            f.write('\n'.join(names) + '\n')
+
+        if args.tsv:
+            matrix = np.load(out_path, mmap_mode='r')
+            with open(args.tsv, 'w') as f:
+                f.write("snp-dists\t" + "\t".join(names) + "\n")
+                for name, row in zip(names, matrix):
+                    values = row.astype(str) if not args.proportion else np.char.mod("%.6g", row)
+                    f.write(name + "\t" + "\t".join(values) + "\n")
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if os.path.exists(packed_path):
+            os.remove(packed_path)
+
+    print(f"Distance matrix written to: {out_path} (sample order: {args.output_prefix}.samples.txt)")
+
+
+if __name__ == "__main__":
+    main()
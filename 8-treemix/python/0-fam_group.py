@@ -1,28 +1,16 @@
-import pandas as pd
-import shutil
-import sys
 import os
+import sys
 
-def main(pop_name, id_name, meta_file, fam_file, sheet_name=None):
-    # 读取meta信息
-    if meta_file.endswith('.xlsx') or meta_file.endswith('.xls'):
-        df_meta = pd.read_excel(meta_file, sheet_name=sheet_name or 0).loc[:, [pop_name, id_name]]
-    else:
-        df_meta = pd.read_csv(meta_file).loc[:, [pop_name, id_name]]
-    # ID转为字符串
-    df_meta[id_name] = df_meta[id_name].astype(str)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from relabel import load_mapping, relabel_file
 
-    # 读取fam文件
-    df_fam = pd.read_csv(fam_file, sep=' ', header=None, names=['ID1', 'ID2', 'P1', 'P2', 'P3', 'P4'])
-    df_fam_merge = df_fam.merge(df_meta, left_on='ID1', right_on=id_name, how='left')
-    df_fam_merge['ID1'] = df_fam_merge[pop_name]
-    out_file = f"{fam_file}_updated"
-    df_fam_merge.iloc[:, 0:6].to_csv(out_file, sep=' ', header=False, index=False)
 
-    # 备份原始fam文件
-    shutil.copy(fam_file, f"{fam_file}.bak")
-    # 替换原始fam文件
-    shutil.move(out_file, fam_file)
+def main(pop_name, id_name, meta_file, fam_file, sheet_name=None):
+    # 读取meta信息（只读取 ID 与群体两列）
+    mapping = load_mapping(meta_file, key=id_name, value=pop_name, sheet_name=sheet_name)
+    # 流式改写fam第一列（FID），原文件备份为 .bak，未匹配的ID保持不变
+    n_lines, n_unmapped = relabel_file(fam_file, "fam", mapping, backup=True)
+    print(f"已更新 {fam_file}（{n_lines} 行，{n_unmapped} 个ID未在meta中找到，保持原值）")
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Rewrite sample IDs/labels in .ids, .fam, .bim and FASTA files from one META mapping.
+#
+# The mapping (key column -> value column of a CSV/TSV/Excel sheet; only those two columns are read)
+# is loaded once into a dict. Every file is streamed line by line into <file>.tmp with buffered
+# writes and moved over the original with os.replace; files are processed concurrently.
+#
+#   .ids   (fineSTRUCTURE)  column 2 (population) <- mapping[column 1]       (like 10-fineSTRUCTURE/python/3_replace_ids.py)
+#   .fam   (PLINK)          column 1 (FID)        <- mapping[column 1]       (like 0-fam_group.py)
+#   .bim   (PLINK)          column 2 (SNP ID)     <- mapping[column 2], or column 4 with --bim_position_ids (like 1-bim-site.py)
+#   FASTA                   '>ID rest'            -> '>mapping[ID] rest'
+#
+# IDs missing from the mapping are left unchanged and counted.
+#
+# Examples:
+# python relabel.py --meta HP.xlsx --key ID --value population subset_WGS_filtered.fam
+# python relabel.py --meta META.csv --key ID --value Anchor --backup WGS_HP.ids CDS_HP.ids All_WGS.fasta
+# python relabel.py --bim_position_ids --backup filter_filtered.bim
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+FORMATS = ("ids", "fam", "bim", "fasta")
+FASTA_SUFFIXES = (".fa", ".fasta", ".fna", ".fas")
+WRITE_BATCH = 65536  # Lines joined per write
+
+
+def load_mapping(meta_file, key=None, value=None, sheet_name=None):
+    """
+    {key: value} from a META table; key/value are column names (default: the first two columns).
+
+    CSV/TSV files are read with the csv module; Excel sheets with only the two columns.
+    """
+    if meta_file.endswith(('.xlsx', '.xls')):
+        usecols = [key, value] if key and value else [0, 1]
+        df = pd.read_excel(meta_file, sheet_name=sheet_name or 0, usecols=usecols, dtype=str)
+        if key and value:
+            df = df[[key, value]]
+        df = df.dropna()
+        return dict(zip(df.iloc[:, 0].str.strip(), df.iloc[:, 1].str.strip()))
+
+    with open(meta_file, 'r', encoding='utf-8-sig', newline='') as f:
+        delimiter = '\t' if meta_file.endswith(('.tsv', '.txt')) else ','
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{meta_file} is empty")
+        header = [h.strip() for h in header]
+        try:
+            k = header.index(key) if key else 0
+            v = header.index(value) if value else 1
+        except ValueError:
+            raise ValueError(f"Columns {key!r}/{value!r} not found in {meta_file}; header: {header}")
+        mapping = {}
+        for row in reader:
+            if len(row) > max(k, v) and row[k].strip():
+                mapping[row[k].strip()] = row[v].strip()
+    return mapping
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in FASTA_SUFFIXES:
+        return "fasta"
+    if ext.lstrip('.') in FORMATS:
+        return ext.lstrip('.')
+    raise ValueError(f"Cannot tell the format of {path}; use --format")
+
+
+def rewrite_line(line, fmt, mapping, bim_position_ids):
+    """
+    One rewritten line and whether its ID was missing from the mapping.
+    """
+    if fmt == "fasta":
+        if not line.startswith('>'):
+            return line, False
+        body = line[1:].rstrip('\r\n')
+        sid = body.split(None, 1)[0] if body.strip() else ''
+        new = mapping.get(sid)
+        if new is None:
+            return line, True
+        return '>' + new + body[len(sid):] + '\n', False
+
+    stripped = line.rstrip('\r\n')
+    if not stripped.strip():
+        return line, False
+    if fmt == "bim":
+        parts = stripped.split('\t') if '\t' in stripped else stripped.split()
+        if len(parts) < 4:
+            return line, False
+        if bim_position_ids:
+            parts[1] = parts[3]
+            return '\t'.join(parts) + '\n', False
+        new = mapping.get(parts[1])
+        if new is None:
+            return line, True
+        parts[1] = new
+        return '\t'.join(parts) + '\n', False
+
+    parts = stripped.split()
+    target = 1 if fmt == "ids" else 0   # .ids: population column; .fam: FID
+    if len(parts) <= target:
+        return line, False
+    new = mapping.get(parts[0])
+    if new is None:
+        return line, True
+    parts[target] = new
+    return ' '.join(parts) + '\n', False
+
+
+def relabel_file(path, fmt, mapping, bim_position_ids=False, backup=False):
+    """
+    Stream one file through rewrite_line into <path>.tmp and replace the original.
+
+    Returns (lines read, IDs missing from the mapping).
+    """
+    tmp_path = path + ".tmp"
+    n_lines = n_unmapped = 0
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as fin, \
+                open(tmp_path, 'w', encoding='utf-8', newline='', buffering=1 << 20) as fout:
+            batch = []
+            for line in fin:
+                new, unmapped = rewrite_line(line, fmt, mapping, bim_position_ids)
+                batch.append(new)
+                n_lines += 1
+                n_unmapped += unmapped
+                if len(batch) >= WRITE_BATCH:
+                    fout.write(''.join(batch))
+                    batch = []
+            fout.write(''.join(batch))
+        shutil.copymode(path, tmp_path)
+        if backup:
+            bak_path = path + ".bak"
+            if os.path.exists(bak_path):
+                os.remove(bak_path)
+            try:
+                os.link(path, bak_path)
+            except OSError:
+                shutil.copy2(path, bak_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return n_lines, n_unmapped
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Relabel sample IDs in .ids/.fam/.bim/FASTA files from one META mapping (streaming, in place)"
+    )
+    parser.add_argument("files", nargs="+", help="Files to rewrite in place")
+    parser.add_argument("--meta", default=None, help="META table (csv/tsv/xlsx) with the ID mapping")
+    parser.add_argument("--key", default=None, help="Column with the current IDs (default: first column)")
+    parser.add_argument("--value", default=None, help="Column with the new labels (default: second column)")
+    parser.add_argument("--sheet_name", default=None, help="Sheet name when --meta is an Excel file")
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="Force the file format (default: from the extension)")
+    parser.add_argument("--bim_position_ids", action="store_true",
+                        help="For .bim files set the SNP ID (column 2) to the position (column 4); no --meta needed")
+    parser.add_argument("--backup", action="store_true", help="Keep the original as <file>.bak")
+    parser.add_argument("--threads", type=int, default=4, help="Files processed concurrently (default: 4)")
+    args = parser.parse_args()
+
+    try:
+        formats = [args.format or detect_format(p) for p in args.files]
+    except ValueError as e:
+        parser.error(str(e))
+    needs_mapping = any(f != "bim" or not args.bim_position_ids for f in formats)
+    if needs_mapping and not args.meta:
+        parser.error("--meta is required unless every file is a .bim with --bim_position_ids")
+    missing = [p for p in args.files if not os.path.isfile(p)]
+    if missing:
+        parser.error(f"Files not found: {missing}")
+
+    mapping = {}
+    if args.meta:
+        mapping = load_mapping(args.meta, args.key, args.value, args.sheet_name)
+        print(f"Loaded {len(mapping)} IDs from {args.meta}")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(args.threads, len(args.files)))) as pool:
+        futures = {
+            pool.submit(relabel_file, path, fmt, mapping, args.bim_position_ids, args.backup): path
+            for path, fmt in zip(args.files, formats)
+        }
+        for future, path in futures.items():
+            try:
+                n_lines, n_unmapped = future.result()
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+                failed += 1
+                continue
+            note = f"; {n_unmapped} IDs not in the mapping were kept" if n_unmapped else ""
+            print(f"Relabelled {path} ({n_lines} lines{note})")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
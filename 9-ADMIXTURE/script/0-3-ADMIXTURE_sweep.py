@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Concurrent ADMIXTURE K sweep (replaces the sequential loop of 0-2-ADMIXTURE.SH).
+#
+# Every (K, seed) pair is one job run in its own directory (output/runs/K<K>_s<seed>/), so runs of
+# the same K with different seeds never overwrite each other. Jobs start largest K first; each one
+# gets a share of the free cores (-j) and is only started when its estimated memory fits. A job
+# whose .Q, .P and log (with a CV error line) already exist is skipped, so an interrupted sweep can
+# simply be restarted; outputs of the old 0-2-ADMIXTURE.SH layout (<prefix>.K.Q and
+# <prefix>_K<K>.log in --output_dir) are picked up too.
+#
+# As each job finishes its log is parsed into <output_dir>/cv_results.csv (K, seed, CV, ...), and
+# the best-likelihood run of each K is copied to <output_dir>/<prefix>.K.Q/.P, the layout read by
+# 1-2-vis.sh and 1-1-K-vis.R.
+#
+# Example:
+# python 0-3-ADMIXTURE_sweep.py \
+#     --bfile merged_filtered \
+#     --output_dir output \
+#     --k_min 8 --k_max 20 \
+#     --seeds 12345,23456 \
+#     --cv 10 --bootstraps 100 \
+#     --threads 64
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from admixture_results import parse_log, write_cv_results
+
+
+def count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 24), b''))
+
+
+def available_memory_gb():
+    """
+    MemAvailable from /proc/meminfo; total physical memory where that is not available.
+    """
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024 ** 2
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+
+
+def estimate_memory_gb(n_samples, n_snps, K):
+    """
+    Rough ADMIXTURE footprint: the genotype matrix (one byte per call) plus a few double
+    copies of Q and P for the quasi-Newton updates, with 20% headroom.
+    """
+    return 1.2 * (n_samples * n_snps + 6 * 8 * K * (n_samples + n_snps)) / 1024 ** 3
+
+
+class Job:
+    """
+    One ADMIXTURE run for a (K, seed) pair.
+    """
+
+    def __init__(self, K, seed, run_dir, prefix):
+        self.K = K
+        self.seed = seed
+        self.run_dir = run_dir
+        self.q = os.path.join(run_dir, f"{prefix}.{K}.Q")
+        self.p = os.path.join(run_dir, f"{prefix}.{K}.P")
+        self.log = os.path.join(run_dir, f"{prefix}_K{K}.log")
+
+    def result(self):
+        """
+        Parsed log if the run is complete, else None.
+        """
+        if not (os.path.exists(self.q) and os.path.exists(self.p)):
+            return None
+        res = parse_log(self.log)
+        return res if res is not None and res["CV"] is not None else None
+
+
+def adopt_legacy_outputs(job, output_dir, prefix):
+    """
+    Copy a finished run of the old flat layout into the job directory if its seed matches.
+    """
+    legacy = Job(job.K, job.seed, output_dir, prefix)
+    res = legacy.result()
+    if res is None or res["seed"] not in (None, job.seed):
+        return False
+    os.makedirs(job.run_dir, exist_ok=True)
+    for src, dst in ((legacy.q, job.q), (legacy.p, job.p), (legacy.log, job.log)):
+        shutil.copyfile(src, dst)
+    return True
+
+
+def publish_best(K, jobs, results, output_dir, prefix):
+    """
+    Copy the highest-likelihood finished run of K to <output_dir>/<prefix>.K.Q/.P/_K<K>.log.
+    """
+    done = [j for j in jobs if j.K == K and (K, j.seed) in results]
+    if not done:
+        return
+    best = max(done, key=lambda j: results[(K, j.seed)]["loglikelihood"] or float("-inf"))
+    target = Job(K, best.seed, output_dir, prefix)
+    for src, dst in ((best.q, target.q), (best.p, target.p), (best.log, target.log)):
+        shutil.copyfile(src, dst + ".tmp")
+        os.replace(dst + ".tmp", dst)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run an ADMIXTURE K x seed sweep concurrently, resuming finished runs and "
+                    "collecting CV errors as jobs complete"
+    )
+    parser.add_argument("--bfile", required=True, help="PLINK prefix (<bfile>.bed/.bim/.fam)")
+    parser.add_argument("--output_dir", default="output", help="Output directory (default: output)")
+    parser.add_argument("--k_min", type=int, default=8, help="Smallest K (default: 8)")
+    parser.add_argument("--k_max", type=int, default=20, help="Largest K (default: 20)")
+    parser.add_argument("--seeds", default="12345", help="Comma-separated random seeds (default: 12345)")
+    parser.add_argument("--cv", type=int, default=10, help="Cross-validation folds (default: 10)")
+    parser.add_argument("--bootstraps", type=int, default=100, help="Bootstrap replicates, -B (default: 100)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(),
+                        help="Total cores shared by all jobs (default: all)")
+    parser.add_argument("--max_threads_per_job", type=int, default=16,
+                        help="Upper bound on -j for one job (default: 16)")
+    parser.add_argument("--memory_gb", type=float, default=None,
+                        help="Memory shared by all jobs (default: 90%% of MemAvailable)")
+    parser.add_argument("--job_memory_gb", type=float, default=None,
+                        help="Memory per job (default: estimated from the .fam/.bim sizes and K)")
+    parser.add_argument("--admixture", default="admixture", help="ADMIXTURE executable (default: admixture)")
+    parser.add_argument("--poll", type=float, default=10.0, help="Seconds between status checks (default: 10)")
+    args = parser.parse_args()
+    if args.cv < 2:
+        parser.error("--cv must be at least 2; the CV error is what the sweep collects")
+    if args.k_min < 1 or args.k_max < args.k_min:
+        parser.error("Need 1 <= --k_min <= --k_max")
+
+    bfile = os.path.abspath(args.bfile)
+    prefix = os.path.basename(bfile)
+    for ext in (".bed", ".bim", ".fam"):
+        if not os.path.exists(bfile + ext):
+            print(f"Error: {bfile + ext} does not exist")
+            sys.exit(1)
+    if shutil.which(args.admixture) is None:
+        print(f"Error: ADMIXTURE executable '{args.admixture}' not found")
+        sys.exit(1)
+
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    cv_path = os.path.join(output_dir, "cv_results.csv")
+    seeds = [int(s) for s in args.seeds.split(",") if s.strip()]
+    total_threads = max(1, args.threads)
+    memory_gb = args.memory_gb if args.memory_gb else 0.9 * available_memory_gb()
+    n_samples, n_snps = count_lines(bfile + ".fam"), count_lines(bfile + ".bim")
+    print(f"{n_samples} samples x {n_snps} SNPs; {total_threads} cores and {memory_gb:.1f} GB for the sweep")
+
+    # Resume: collect finished runs (including the old flat layout), queue the rest
+    jobs, pending, results = [], [], {}
+    for K in range(args.k_max, args.k_min - 1, -1):
+        for seed in seeds:
+            job = Job(K, seed, os.path.join(output_dir, "runs", f"K{K}_s{seed}"), prefix)
+            jobs.append(job)
+            res = job.result()
+            if res is None and adopt_legacy_outputs(job, output_dir, prefix):
+                res = job.result()
+            if res is not None:
+                res["seed"] = seed
+                results[(K, seed)] = res
+            else:
+                pending.append(job)
+    if results:
+        print(f"Resuming: {len(results)} finished runs found, {len(pending)} to go")
+        write_cv_results(cv_path, results.values())
+        for K in {k for k, _ in results}:
+            publish_best(K, jobs, results, output_dir, prefix)
+
+    job_memory_gb = {}
+    for K in sorted({job.K for job in pending}):
+        job_memory_gb[K] = args.job_memory_gb or estimate_memory_gb(n_samples, n_snps, K)
+        if job_memory_gb[K] > memory_gb:
+            print(f"Warning: K={K} needs ~{job_memory_gb[K]:.1f} GB, more than {memory_gb:.1f} GB; "
+                  f"it will run alone")
+            job_memory_gb[K] = memory_gb
+
+    running = {}  # Popen -> (job, threads, memory, start time, log handle)
+    free_threads, free_memory = total_threads, memory_gb
+    failed = []
+    try:
+        while pending or running:
+            # Start as many pending jobs as cores and memory allow, splitting the free cores evenly
+            while pending:
+                job = pending[0]
+                job_memory = job_memory_gb[job.K]
+                slots = min(len(pending), free_threads, int(free_memory // job_memory))
+                if slots < 1:
+                    break
+                threads = max(1, min(args.max_threads_per_job, free_threads // slots))
+                pending.pop(0)
+                os.makedirs(job.run_dir, exist_ok=True)
+                for stale in (job.q, job.p):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+                cmd = [args.admixture, f"--cv={args.cv}", f"-j{threads}", f"-s{job.seed}"]
+                if args.bootstraps > 0:
+                    cmd.append(f"-B{args.bootstraps}")
+                cmd += [bfile + ".bed", str(job.K)]
+                log = open(job.log, 'w')
+                proc = subprocess.Popen(cmd, cwd=job.run_dir, stdout=log, stderr=subprocess.STDOUT)
+                running[proc] = (job, threads, job_memory, time.time(), log)
+                free_threads -= threads
+                free_memory -= job_memory
+                print(f"=== Started K={job.K} seed={job.seed} with {threads} threads "
+                      f"({len(running)} running, {len(pending)} queued) ===")
+
+            time.sleep(args.poll)
+            for proc in [p for p in running if p.poll() is not None]:
+                job, threads, job_memory, start, log = running.pop(proc)
+                log.close()
+                free_threads += threads
+                free_memory += job_memory
+                res = job.result() if proc.returncode == 0 else None
+                if res is None:
+                    failed.append(job)
+                    print(f"Error: K={job.K} seed={job.seed} failed (exit {proc.returncode}); see {job.log}")
+                    continue
+                res["seed"] = job.seed
+                results[(job.K, job.seed)] = res
+                write_cv_results(cv_path, results.values())
+                publish_best(job.K, jobs, results, output_dir, prefix)
+                print(f"Finished K={job.K} seed={job.seed} in {(time.time() - start) / 3600:.2f} h: "
+                      f"CV error {res['CV']}")
+    except KeyboardInterrupt:
+        for proc in running:
+            proc.terminate()
+        print("Interrupted; finished runs are kept and will be skipped on restart.")
+        sys.exit(130)
+
+    print(f"All done. {len(results)} runs in {cv_path}; best run per K in {output_dir}/{prefix}.K.Q/.P")
+    if failed:
+        print(f"{len(failed)} runs failed: " + ", ".join(f"K={j.K} seed={j.seed}" for j in failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
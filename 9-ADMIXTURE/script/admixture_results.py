@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Load ADMIXTURE results once: log statistics and Q matrices with cluster labels aligned across K.
+#
+# Logs (<prefix>_K<K>.log, complete or not) are parsed into CV error, log-likelihood, iterations and
+# timings. The Q matrices (<prefix>.K.Q) are stacked column-wise into one float32 array, and the
+# clusters of each K are matched to those of the previous K by correlation (Hungarian assignment),
+# so "Pop0" is the same ancestry component in every panel. The aligned stack is cached next to the
+# Q files and only recomputed when a Q file changes.
+#
+# As a library:
+#   import admixture_results as ar
+#   logs = ar.read_logs("log")
+#   stack = ar.load_aligned("output", "merged_filtered")
+#   q8 = stack.q(8)              # (n_samples x 8), columns aligned to K=7
+#
+# As a script (cv_results.csv for 1-1-K-vis.R and aligned .Q files for 1-2-vis.sh):
+# python admixture_results.py \
+#     --log_dir log \
+#     --q_dir output \
+#     --prefix merged_filtered \
+#     --cv_csv log/cv_results.csv \
+#     --aligned_dir output/aligned
+
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+CV_RE = re.compile(r"CV error \(K=(\d+)\): ([-+0-9.eE]+)")
+LOGLIK_RE = re.compile(r"^Loglikelihood: ([-+0-9.eE]+)", re.M)
+CONVERGED_RE = re.compile(r"Converged in (\d+) iterations \(([0-9.]+) sec\)")
+ITERATION_RE = re.compile(r"^(\d+) \((?:EM|QN/Block)\)\s+Elapsed: ([0-9.]+)", re.M)
+SEED_RE = re.compile(r"Random seed: (\d+)")
+SIZE_RE = re.compile(r"Size of G: (\d+)x(\d+)")
+LOG_K_RE = re.compile(r"_K(\d+)\.log$")
+CV_FIELDS = ["K", "seed", "CV", "loglikelihood", "iterations", "seconds"]
+
+
+def parse_log(path):
+    """
+    Statistics of one ADMIXTURE log; fields the run has not reached yet are None.
+
+    Keys: K, seed, CV, loglikelihood, iterations, seconds (reported total), elapsed_seconds
+    (sum of the per-iteration timings, also for unfinished runs), converged, n_samples, n_snps, log.
+    Returns None when the file cannot be read or K cannot be determined.
+    """
+    try:
+        with open(path, 'r', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return None
+    cv = CV_RE.search(text)
+    name_k = LOG_K_RE.search(os.path.basename(path))
+    if cv is None and name_k is None:
+        return None
+    converged = CONVERGED_RE.search(text)
+    loglik = LOGLIK_RE.findall(text)
+    seed = SEED_RE.search(text)
+    size = SIZE_RE.search(text)
+    elapsed = [float(t) for _, t in ITERATION_RE.findall(text)]
+    return {
+        "K": int(cv.group(1)) if cv else int(name_k.group(1)),
+        "seed": int(seed.group(1)) if seed else None,
+        "CV": float(cv.group(2)) if cv else None,
+        "loglikelihood": float(loglik[-1]) if loglik and converged else None,
+        "iterations": int(converged.group(1)) if converged else None,
+        "seconds": float(converged.group(2)) if converged else None,
+        "elapsed_seconds": sum(elapsed) if elapsed else None,
+        "converged": converged is not None,
+        "n_samples": int(size.group(1)) if size else None,
+        "n_snps": int(size.group(2)) if size else None,
+        "log": path,
+    }
+
+
+def read_logs(log_dir, pattern="*.log"):
+    """
+    DataFrame with one row per log in log_dir, sorted by K and seed.
+    """
+    rows = [r for r in (parse_log(p) for p in glob.glob(os.path.join(log_dir, pattern))) if r is not None]
+    columns = ["K", "seed", "CV", "loglikelihood", "iterations", "seconds", "elapsed_seconds",
+               "converged", "n_samples", "n_snps", "log"]
+    df = pd.DataFrame(rows, columns=columns)
+    df = df.astype({"seed": "Int64", "iterations": "Int64", "n_samples": "Int64", "n_snps": "Int64"})
+    return df.sort_values(["K", "seed"], na_position="first").reset_index(drop=True)
+
+
+def write_cv_results(path, results):
+    """
+    Write CV_FIELDS rows (dicts, e.g. from parse_log) sorted by K and seed through a temporary file.
+    """
+    rows = sorted(results, key=lambda r: (r["K"], -1 if pd.isna(r["seed"]) else r["seed"]))
+    with open(path + ".tmp", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: ("" if pd.isna(row.get(k)) else row[k]) for k in CV_FIELDS})
+    os.replace(path + ".tmp", path)
+
+
+class QStack:
+    """
+    Q matrices of several K in one (n_samples x sum(K)) float32 array.
+
+    Columns offsets[i]:offsets[i] + Ks[i] hold the matrix of Ks[i]; q(K) returns a view.
+    """
+
+    def __init__(self, Ks, values):
+        self.Ks = [int(k) for k in Ks]
+        self.values = values
+        self.offsets = np.concatenate([[0], np.cumsum(self.Ks)[:-1]]).astype(np.int64)
+
+    def q(self, K):
+        i = self.Ks.index(K)
+        return self.values[:, self.offsets[i]:self.offsets[i] + K]
+
+
+def q_files(q_dir, prefix):
+    """
+    {K: path} of the <prefix>.K.Q files in q_dir.
+    """
+    pattern = re.compile(re.escape(prefix) + r"\.(\d+)\.Q$")
+    found = {}
+    for name in os.listdir(q_dir):
+        m = pattern.match(name)
+        if m:
+            found[int(m.group(1))] = os.path.join(q_dir, name)
+    if not found:
+        raise ValueError(f"No {prefix}.K.Q files in {q_dir}")
+    return dict(sorted(found.items()))
+
+
+def read_q(path, K):
+    """
+    One Q matrix as float32 (n_samples x K).
+    """
+    values = np.fromfile(path, dtype=np.float32, sep=' ')
+    if values.size % K:
+        raise ValueError(f"{path}: {values.size} values is not a multiple of K={K}")
+    return values.reshape(-1, K)
+
+
+def load_q(q_dir, prefix):
+    """
+    Stack all <prefix>.K.Q matrices of q_dir in increasing K.
+    """
+    files = q_files(q_dir, prefix)
+    matrices = [read_q(path, K) for K, path in files.items()]
+    n = {m.shape[0] for m in matrices}
+    if len(n) != 1:
+        raise ValueError(f"Q files in {q_dir} have different sample counts: {sorted(n)}")
+    return QStack(list(files), np.hstack(matrices))
+
+
+def match_columns(ref, q):
+    """
+    Column order of q that best matches the columns of ref (ref has no more columns than q).
+
+    Pearson correlations between all column pairs come from one matrix product; the assignment
+    maximizing their sum is solved with the Hungarian algorithm. Unmatched columns of q (the
+    new clusters) go last, in their original order.
+    """
+    def standardized(m):
+        m = m.astype(np.float64) - m.mean(axis=0)
+        norm = np.linalg.norm(m, axis=0)
+        return np.divide(m, norm, out=np.zeros_like(m), where=norm > 0)
+
+    corr = standardized(ref).T @ standardized(q)
+    rows, cols = linear_sum_assignment(corr, maximize=True)
+    matched = cols[np.argsort(rows)]
+    rest = np.setdiff1d(np.arange(q.shape[1]), matched)
+    return np.concatenate([matched, rest])
+
+
+def align(stack):
+    """
+    Align every K to the already aligned previous K. Returns (aligned QStack, {K: column order}).
+    """
+    values = np.empty_like(stack.values)
+    orders = {}
+    prev = None
+    for K, offset in zip(stack.Ks, stack.offsets):
+        q = stack.values[:, offset:offset + K]
+        order = np.arange(K) if prev is None else match_columns(prev, q)
+        values[:, offset:offset + K] = q[:, order]
+        orders[K] = order
+        prev = values[:, offset:offset + K]
+    return QStack(stack.Ks, values), orders
+
+
+def _signature(files):
+    return json.dumps([[K, os.path.basename(p), os.stat(p).st_size, os.stat(p).st_mtime_ns]
+                       for K, p in files.items()])
+
+
+def load_aligned(q_dir, prefix, cache=True):
+    """
+    Aligned QStack for <prefix>.K.Q in q_dir.
+
+    The result is cached in <q_dir>/<prefix>.aligned_cache.npz together with the names, sizes and
+    modification times of the Q files, and reused while they are unchanged.
+    """
+    files = q_files(q_dir, prefix)
+    signature = _signature(files)
+    cache_path = os.path.join(q_dir, prefix + ".aligned_cache.npz")
+    if cache and os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if str(cached["signature"]) == signature:
+                return QStack(cached["Ks"].tolist(), cached["values"])
+
+    aligned, _ = align(load_q(q_dir, prefix))
+    if cache:
+        with open(cache_path + ".tmp", 'wb') as f:
+            np.savez(f, signature=np.array(signature), Ks=np.array(aligned.Ks), values=aligned.values)
+        os.replace(cache_path + ".tmp", cache_path)
+    return aligned
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize ADMIXTURE logs and align Q-matrix clusters across K (cached)"
+    )
+    parser.add_argument("--log_dir", default=None, help="Directory with the ADMIXTURE logs")
+    parser.add_argument("--cv_csv", default=None,
+                        help="Write K/seed/CV/... of the logs with a CV error here (requires --log_dir)")
+    parser.add_argument("--q_dir", default=None, help="Directory with the <prefix>.K.Q files")
+    parser.add_argument("--prefix", default=None, help="Q file prefix, e.g. merged_filtered")
+    parser.add_argument("--aligned_dir", default=None,
+                        help="Write the aligned Q matrices here as <prefix>.K.Q (requires --q_dir/--prefix)")
+    parser.add_argument("--no_cache", action="store_true", help="Ignore and do not write the alignment cache")
+    args = parser.parse_args()
+    if args.cv_csv and not args.log_dir:
+        parser.error("--cv_csv requires --log_dir")
+    if bool(args.q_dir) != bool(args.prefix):
+        parser.error("--q_dir and --prefix must be given together")
+    if args.aligned_dir and not args.q_dir:
+        parser.error("--aligned_dir requires --q_dir and --prefix")
+
+    try:
+        if args.log_dir:
+            logs = read_logs(args.log_dir)
+            print(logs.drop(columns="log").to_string(index=False))
+            unfinished = logs.loc[~logs["converged"], "K"].tolist()
+            if unfinished:
+                print(f"Warning: runs without a final summary (unfinished?): K={unfinished}")
+            if args.cv_csv:
+                done = logs[logs["CV"].notna()]
+                write_cv_results(args.cv_csv, done.to_dict("records"))
+                print(f"CV results of {len(done)} runs written to: {args.cv_csv}")
+
+        if args.q_dir:
+            stack = load_aligned(args.q_dir, args.prefix, cache=not args.no_cache)
+            print(f"Aligned Q matrices for K={stack.Ks} ({stack.values.shape[0]} samples)")
+            if args.aligned_dir:
+                os.makedirs(args.aligned_dir, exist_ok=True)
+                for K in stack.Ks:
+                    path = os.path.join(args.aligned_dir, f"{args.prefix}.{K}.Q")
+                    np.savetxt(path, stack.q(K), fmt="%.6f", delimiter=" ")
+                print(f"Aligned Q files written to: {args.aligned_dir}")
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()